@@ -1,15 +1,75 @@
-from flask import Flask, render_template, request, jsonify
-from ai_engine import MediAI
-from medical_db import analyze_symptoms
+import json
+import time
+
+from startup_timing import mark, report, timed
+
+with timed("import flask"):
+    from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
+with timed("import app modules"):
+    from admission import AdmissionController, priority_for
+    from ai_engine import MediAI
+    from chat_batch import iter_results, parse_batch_request, summary
+    from hospital_finder import find_hospitals, parse_hospital_query
+    from lazy_engine import LazyEngine
+    from llm_transport import MediAIError
+    from medical_db import current_kb, kb_stats
+    import metrics
+    from response_cache import ResponseCache
+    from router import ROUTE_LLM, ROUTE_LOCAL_REFINE, route_message
+    from session_store import SessionStore
 
 app = Flask(__name__)
 
-ai = MediAI()  # uses OPENAI_API_KEY environment variable
+# Shared on-disk tier so every gunicorn worker benefits from the others' answers
+cache = ResponseCache.from_env()
+
+# Built on the first chat request, so workers start serving immediately
+ai = LazyEngine("MediAI", lambda: MediAI(cache=cache))  # uses OPENAI_API_KEY environment variable
+
+# Conversation history per session_id, so follow-up questions keep their context
+sessions = SessionStore.from_env()
+
+# LLM calls at once per worker; emergencies go first and have reserved slots
+admission = AdmissionController.from_env(default_capacity=16)
+
+metrics.CallbackGauge("medibot_cache_hit_ratio", "Response cache hit ratio.", lambda: cache.stats()["hit_ratio"])
+metrics.CallbackGauge("medibot_circuit_open", "1 while the OpenAI circuit breaker is open.",
+                      lambda: int(ai.transport.breaker.state == "open") if ai.is_ready else None)
+metrics.CallbackGauge("medibot_sessions", "Conversation sessions held in memory.", lambda: sessions.stats()["sessions"])
+metrics.CallbackGauge("medibot_admission_queue", "Chats waiting for an LLM slot.", admission.queue_depth, "priority")
+
+# ---------- REQUEST METRICS ----------
+@app.before_request
+def _start_timer():
+    g.metrics_t0 = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or "unknown"
+    metrics.INFLIGHT.inc(endpoint=g.metrics_endpoint)
+
+@app.after_request
+def _record_request(response):
+    # For streamed responses this is the time to the first byte
+    metrics.REQUESTS.inc(endpoint=g.metrics_endpoint, status=response.status_code)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_t0, endpoint=g.metrics_endpoint)
+    g.metrics_counted = True
+    return response
+
+@app.teardown_request
+def _finish_request(exc):
+    # Runs after a streamed body is done, so in-flight covers the whole stream
+    if "metrics_endpoint" not in g:
+        return
+    if exc is not None:
+        # The 500 page usually went through _record_request already
+        if not g.get("metrics_counted"):
+            metrics.REQUESTS.inc(endpoint=g.metrics_endpoint, status=500)
+        metrics.ERRORS.inc(kind="exception")
+    metrics.INFLIGHT.dec(endpoint=g.metrics_endpoint)
 
 @app.route("/")
 def index():
     # Render our mobile-friendly web UI
-    return render_template("index.html")
+    with metrics.stage("render_index"):
+        return render_template("index.html")
 
 @app.route("/api/chat", methods=["POST"])
 def chat():
@@ -17,16 +77,168 @@ def chat():
     message = (data.get("message") or "").strip()
     language = (data.get("language") or "English").strip() or "English"
 
+    # "refine": true asks for the LLM answer after a local+refine reply
+    refine = bool(data.get("refine"))
+    # Send back the returned session_id to continue the same conversation
+    session_id = SessionStore.normalize_id(data.get("session_id"))
+
     if not message:
-        return jsonify({"reply": "Please type something.", "offline": ""})
+        return jsonify({"reply": "Please type something.", "offline": "", "session_id": session_id,
+                        "kb_version": current_kb().version})
+
+    t0 = time.perf_counter()
+    route = route_message(message, language)
 
-    offline_info = analyze_symptoms(message) or ""
-    reply = ai.get_response(message, language)
+    error = None
+    if refine or route.tier == ROUTE_LLM:
+        try:
+            with admission.slot(priority_for(route, refine)):
+                reply = ai.get_response(message, language, sessions.history(session_id), route)
+        except MediAIError as e:
+            # The offline block, if any, is still in the response
+            error = e
+            reply = str(e)
+    else:
+        reply = route.local_reply
+    if error is None:
+        sessions.record(session_id, message, reply)
 
-    return jsonify({
+    payload = {
         "reply": reply,
-        "offline": offline_info
-    })
+        "offline": "" if refine else route.offline_html,
+        "refine": route.tier == ROUTE_LOCAL_REFINE and not refine,
+        "route": dict(route.to_dict(), total_ms=round((time.perf_counter() - t0) * 1000, 1)),
+        "session_id": session_id,
+        "kb_version": route.kb_version,
+    }
+    if error is not None:
+        payload["error"] = error.to_dict()
+        return jsonify(payload), error.http_status
+    return jsonify(payload)
+
+def _sse(event, payload):
+    return "event: %s\ndata: %s\n\n" % (event, json.dumps(payload))
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Server-Sent-Events variant of /api/chat.
+    Events: "offline" (KB block, always first), "route" (routing decision),
+    "token" (reply chunks), "error" (MediAIError.to_dict(), if the LLM
+    failed), "done" (with total latency and the session_id to send next time).
+    A local+refine route streams the local reply first, then the LLM's.
+    """
+    data = request.get_json() or {}
+    message = (data.get("message") or "").strip()
+    language = (data.get("language") or "English").strip() or "English"
+    session_id = SessionStore.normalize_id(data.get("session_id"))
+
+    def generate():
+        if not message:
+            yield _sse("offline", {"html": ""})
+            yield _sse("token", {"text": "Please type something."})
+            yield _sse("done", {"session_id": session_id})
+            return
+
+        t0 = time.perf_counter()
+        route = route_message(message, language)
+        yield _sse("offline", {"html": route.offline_html})
+        yield _sse("route", route.to_dict())
+
+        parts = []
+        if route.local_reply:
+            parts.append(route.local_reply)
+            yield _sse("token", {"text": route.local_reply})
+        if route.needs_llm:
+            if route.local_reply:
+                parts.append("\n\n")
+                yield _sse("token", {"text": "\n\n"})
+            history = sessions.history(session_id)
+            try:
+                with admission.slot(priority_for(route)):
+                    for chunk in ai.stream_response(message, language, history, route):
+                        parts.append(chunk)
+                        yield _sse("token", {"text": chunk})
+            except MediAIError as e:
+                parts = []
+                yield _sse("error", e.to_dict())
+        # Nothing is recorded when the LLM failed, so the turn can simply be retried
+        sessions.record(session_id, message, "".join(parts).strip())
+
+        yield _sse("done", {"total_ms": round((time.perf_counter() - t0) * 1000, 1), "session_id": session_id})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/api/chat/batch", methods=["POST"])
+def chat_batch():
+    """Many messages in one request; see chat_batch.py for the format."""
+    try:
+        items, concurrency, stream = parse_batch_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    t0 = time.perf_counter()
+
+    if stream:
+        def generate():
+            errors = 0
+            for row in iter_results(ai, items, concurrency, admission):
+                errors += row["error"] is not None
+                yield json.dumps(row) + "\n"
+            yield json.dumps(dict(summary(len(items), errors, t0), done=True)) + "\n"
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    rows = sorted(iter_results(ai, items, concurrency, admission), key=lambda row: row["index"])
+    errors = sum(row["error"] is not None for row in rows)
+    return jsonify(dict(summary(len(items), errors, t0), results=rows))
+
+@app.route("/api/hospitals")
+def hospitals():
+    """Nearest hospitals: ?q=<city or pincode> or ?lat=..&lon=.., plus optional k, max_km."""
+    try:
+        result = find_hospitals(**parse_hospital_query(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify(result)
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify(cache.stats())
+
+@app.route("/api/sessions/stats")
+def session_stats():
+    return jsonify(sessions.stats())
+
+@app.route("/api/kb/stats")
+def kb_stats_route():
+    return jsonify(kb_stats())
+
+@app.route("/api/admission/stats")
+def admission_stats():
+    return jsonify(admission.stats())
+
+@app.route("/api/llm/stats")
+def llm_stats():
+    # Model tiers, tokens and latency per request (model_policy.py); {} until the engine is built
+    return jsonify(ai.policy.stats() if ai.is_ready else {})
+
+mark("app ready")
+report()
 
 if __name__ == "__main__":
     # Local run
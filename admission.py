@@ -0,0 +1,301 @@
+# admission.py
+"""
+Admission control for LLM calls: a bounded priority queue in front of a
+fixed number of slots, with a lane reserved for emergencies.
+
+Every chat that needs the LLM asks for a slot with a priority:
+    EMERGENCY  the router's emergency classifier fired (the user has already
+               been shown the local emergency reply); may also use the
+               `reserved` slots nobody else can take
+    NORMAL     no local answer, the LLM is the answer
+    LOW        a local answer was already shown (local+refine, refine follow-ups)
+Waiting chats are served by priority, then in arrival order.
+
+Under load, low-priority work is shed first and fails fast instead of
+queueing behind everything else:
+    - once the oldest waiting chat has waited `shed_wait` seconds, new LOW
+      requests are turned away, and queued ones give up after that long;
+    - when the queue is full, a more urgent request takes the place of the
+      newest least urgent one;
+    - nobody waits longer than `max_wait`.
+A chat that is turned away gets MediAIError("overloaded") (HTTP 503); the
+offline block is still shown.
+
+Works from threads (acquire/release, slot()) and coroutines (acquire_async),
+like rate_limiter.RateLimiter. Limits are per process.
+
+Settings (environment variables):
+    MEDIBOT_MAX_INFLIGHT       LLM calls at once, incl. the emergency lane
+    MEDIBOT_EMERGENCY_RESERVE  slots only emergencies may use (default 10% of MEDIBOT_MAX_INFLIGHT, at least 1)
+    MEDIBOT_MAX_QUEUE          chats that may wait for a slot (default 4x MEDIBOT_MAX_INFLIGHT)
+    MEDIBOT_SHED_WAIT          queue wait in seconds past which LOW requests are shed (default 1)
+    MEDIBOT_QUEUE_TIMEOUT      longest wait for a slot, in seconds (default 5)
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+from llm_transport import OVERLOADED, MediAIError
+from router import ROUTE_LOCAL_REFINE
+
+EMERGENCY, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = ("emergency", "normal", "low")
+
+ADMISSION_WAIT = metrics.Histogram("medibot_admission_wait_seconds", "Time chats waited for an LLM slot.",
+                                   ("priority",))
+ADMISSIONS = metrics.Counter("medibot_admissions_total", "Admission decisions for LLM calls.",
+                             ("priority", "outcome"))
+
+# Recent waits kept per priority for stats()
+WAIT_SAMPLES = 1024
+
+# Waiter states
+_WAITING, _GRANTED, _SHED, _GONE = range(4)
+
+
+def priority_for(route, refine: bool = False) -> int:
+    """Queue priority of a routed chat (see router.route_message)."""
+    if route.reason == "emergency":
+        return EMERGENCY
+    if refine or route.tier == ROUTE_LOCAL_REFINE:
+        return LOW
+    return NORMAL
+
+
+class _Waiter:
+    __slots__ = ("priority", "enqueued", "state", "wake", "reason")
+
+    def __init__(self, priority, wake):
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.state = _WAITING
+        self.wake = wake
+        self.reason = ""
+
+
+class AdmissionController:
+    def __init__(self, capacity: int = 16, reserved: int = None, max_queue: int = None,
+                 shed_wait: float = 1.0, max_wait: float = 5.0):
+        """
+        capacity: LLM calls at once, including the `reserved` emergency-only slots.
+        max_queue: chats that may wait for a slot.
+        shed_wait: queue wait (seconds) past which LOW requests are shed.
+        max_wait: longest anyone waits for a slot.
+        """
+        self.capacity = max(1, capacity)
+        if reserved is None:
+            reserved = max(1, self.capacity // 10)
+        # At least one slot stays open to everyone
+        self.reserved = max(0, min(reserved, self.capacity - 1))
+        self.max_queue = 4 * self.capacity if max_queue is None else max(0, max_queue)
+        self.shed_wait = shed_wait
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._heap = []                 # (priority, seq, waiter); served ones are skipped lazily
+        self._arrivals = deque()        # waiters in arrival order, for the oldest wait
+        self._waiting = [0, 0, 0]       # live waiters per priority
+        self._seq = itertools.count()
+        self._counts = {}               # (outcome, priority name) -> n
+        self._waits = [deque(maxlen=WAIT_SAMPLES) for _ in PRIORITY_NAMES]  # seconds
+
+    @classmethod
+    def from_env(cls, default_capacity: int = 16):
+        capacity = int(os.getenv("MEDIBOT_MAX_INFLIGHT", str(default_capacity)))
+        reserved = os.getenv("MEDIBOT_EMERGENCY_RESERVE")
+        max_queue = os.getenv("MEDIBOT_MAX_QUEUE")
+        return cls(
+            capacity=capacity,
+            reserved=int(reserved) if reserved else None,
+            max_queue=int(max_queue) if max_queue else None,
+            shed_wait=float(os.getenv("MEDIBOT_SHED_WAIT", "1")),
+            max_wait=float(os.getenv("MEDIBOT_QUEUE_TIMEOUT", "5")),
+        )
+
+    # ---------- QUEUE (callers hold self._lock) ----------
+    def _limit(self, priority):
+        return self.capacity if priority == EMERGENCY else self.capacity - self.reserved
+
+    def _count(self, outcome, priority):
+        key = (outcome, PRIORITY_NAMES[priority])
+        self._counts[key] = self._counts.get(key, 0) + 1
+        ADMISSIONS.inc(priority=PRIORITY_NAMES[priority], outcome=outcome)
+
+    def _oldest_wait(self, now):
+        while self._arrivals and self._arrivals[0].state != _WAITING:
+            self._arrivals.popleft()
+        return now - self._arrivals[0].enqueued if self._arrivals else 0.0
+
+    def _enter(self, priority, wake):
+        """A granted, waiting or shed waiter for a new request."""
+        waiter = _Waiter(priority, wake)
+        ahead = sum(self._waiting[:priority + 1])
+        if not ahead and self._in_use < self._limit(priority):
+            waiter.state = _GRANTED
+            self._in_use += 1
+            return waiter
+
+        if priority == LOW and self._oldest_wait(waiter.enqueued) > self.shed_wait:
+            return self._shed(waiter, "queue wait above %.1fs" % self.shed_wait)
+        if sum(self._waiting) >= self.max_queue:
+            victim = self._least_urgent()
+            if victim is None or victim.priority <= priority:
+                return self._shed(waiter, "queue full")
+            self._shed(victim, "displaced by a more urgent request")
+            self._waiting[victim.priority] -= 1
+            victim.wake()
+
+        heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+        self._arrivals.append(waiter)
+        self._waiting[priority] += 1
+        return waiter
+
+    def _shed(self, waiter, reason):
+        waiter.state = _SHED
+        waiter.reason = reason
+        self._count("shed", waiter.priority)
+        return waiter
+
+    def _least_urgent(self):
+        live = [(p, seq, w) for p, seq, w in self._heap if w.state == _WAITING]
+        return max(live)[2] if live else None
+
+    def _dispatch(self):
+        while self._heap:
+            priority, _, waiter = self._heap[0]
+            if waiter.state != _WAITING:
+                heapq.heappop(self._heap)
+                continue
+            if self._in_use >= self._limit(priority):
+                break
+            heapq.heappop(self._heap)
+            self._waiting[priority] -= 1
+            waiter.state = _GRANTED
+            self._in_use += 1
+            waiter.wake()
+
+    def _give_up(self, waiter):
+        """After a timeout or cancellation. True if the slot was granted meanwhile."""
+        if waiter.state == _GRANTED:
+            return True
+        if waiter.state == _WAITING:
+            self._waiting[waiter.priority] -= 1
+            waiter.state = _GONE
+            if waiter.priority == LOW:
+                waiter.reason = "waited %.1fs" % self._timeout(LOW)
+                self._count("shed", LOW)
+            else:
+                self._count("timeout", waiter.priority)
+            self._dispatch()
+        return False
+
+    def _admitted(self, waiter):
+        wait = time.monotonic() - waiter.enqueued
+        with self._lock:
+            self._count("admitted", waiter.priority)
+            self._waits[waiter.priority].append(wait)
+        ADMISSION_WAIT.observe(wait, priority=PRIORITY_NAMES[waiter.priority])
+        return wait
+
+    def _timeout(self, priority):
+        return min(self.shed_wait, self.max_wait) if priority == LOW else self.max_wait
+
+    @staticmethod
+    def _overloaded(waiter):
+        return MediAIError(OVERLOADED, "%s request %s" % (PRIORITY_NAMES[waiter.priority], waiter.reason or "timed out"))
+
+    # ---------- THREADS ----------
+    def acquire(self, priority: int = NORMAL) -> float:
+        """Waits for a slot; returns the wait in seconds. Raises MediAIError("overloaded") if turned away."""
+        event = threading.Event()
+        with self._lock:
+            waiter = self._enter(priority, event.set)
+        if waiter.state == _WAITING:
+            event.wait(self._timeout(priority))
+            with self._lock:
+                if not self._give_up(waiter) and waiter.state == _GONE:
+                    raise self._overloaded(waiter)
+        if waiter.state == _SHED:
+            raise self._overloaded(waiter)
+        return self._admitted(waiter)
+
+    def release(self):
+        with self._lock:
+            self._in_use -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: int = NORMAL):
+        """`with admission.slot(priority):` around one LLM call."""
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    # ---------- COROUTINES ----------
+    async def acquire_async(self, priority: int = NORMAL) -> float:
+        """acquire() for coroutines; release() afterwards as usual."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        with self._lock:
+            waiter = self._enter(priority, wake)
+        if waiter.state == _WAITING:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), self._timeout(priority))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # The client went away: hand back a slot granted meanwhile
+                with self._lock:
+                    if self._give_up(waiter):
+                        self._in_use -= 1
+                        self._dispatch()
+                raise
+            with self._lock:
+                if not self._give_up(waiter) and waiter.state == _GONE:
+                    raise self._overloaded(waiter)
+        if waiter.state == _SHED:
+            raise self._overloaded(waiter)
+        return self._admitted(waiter)
+
+    # ---------- STATS ----------
+    def queue_depth(self) -> dict:
+        with self._lock:
+            return dict(zip(PRIORITY_NAMES, self._waiting))
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {
+                "capacity": self.capacity,
+                "reserved": self.reserved,
+                "in_use": self._in_use,
+                "queued": dict(zip(PRIORITY_NAMES, self._waiting)),
+                "max_queue": self.max_queue,
+                "oldest_wait_ms": round(self._oldest_wait(time.monotonic()) * 1000, 1),
+                "shed_wait_ms": round(self.shed_wait * 1000, 1),
+            }
+            for (outcome, name), n in sorted(self._counts.items()):
+                result.setdefault(outcome, {})[name] = n
+            waits = [sorted(w) for w in self._waits]
+        # Over the last WAIT_SAMPLES admissions of each priority
+        result["wait_ms"] = {
+            name: {
+                "p50": round(w[len(w) // 2] * 1000, 2),
+                "p95": round(w[min(len(w) - 1, len(w) * 95 // 100)] * 1000, 2),
+                "max": round(w[-1] * 1000, 2),
+            }
+            for name, w in zip(PRIORITY_NAMES, waits) if w
+        }
+        return result
@@ -1,5 +1,12 @@
+import asyncio
 import os
-from openai import OpenAI
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from llm_transport import AUTH, MediAIError, TIMEOUT, UPSTREAM, Transport, classify
+from metrics import STAGE_SECONDS, record_usage, stage
+from model_policy import ModelPolicy
+from response_cache import make_key
 
 # Get API key from environment variable in cloud
 API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
@@ -19,37 +26,401 @@ Rules:
 """
 
 class MediAI:
-    def __init__(self, api_key=None, model="gpt-4.1-mini"):
+    """
+    OpenAI-backed answers. Calls go through a Transport (llm_transport.py)
+    for deadlines, retries, hedging and the circuit breaker; failures are
+    raised as MediAIError. A ModelPolicy (model_policy.py) picks the model
+    and output budget of each request and records what it cost.
+    """
+
+    def __init__(self, api_key=None, model=None, cache=None, transport=None, policy=None):
+        """
+        model: one model for every request; by default the policy picks per request.
+        Raises MediAIError("auth") without a usable API key, so a lazily built
+        engine fails its first chat like any other LLM error.
+        """
         key = (api_key or API_KEY).strip()
         if not key or "sk-" not in key:
-            raise ValueError(
-                "❌ OpenAI API key is missing. "
-                "Set environment variable OPENAI_API_KEY on the server."
+            raise MediAIError(
+                AUTH, "OpenAI API key is missing. Set environment variable OPENAI_API_KEY on the server."
             )
 
         print("✅ MediAI: Initializing OpenAI client...")
-        self.client = OpenAI(api_key=key)
-        self.model = model
+        self.client = self._make_client(key)
+        self.cache = cache  # optional ResponseCache
+        self.transport = transport or Transport.from_env()
+        self.policy = policy or ModelPolicy.from_env(default_model=model)
         print("✅ MediAI: Ready.")
 
-    def get_response(self, user_text, language_name="English"):
+    def _make_client(self, key):
+        # Imported here: the openai package is slow to import and only
+        # needed once the first question is asked.
+        # Retries are the Transport's job, so the client's own are off.
+        from openai import OpenAI
+        return OpenAI(api_key=key, max_retries=0)
+
+    def _build_messages(self, user_text, language_name, history=None, plan=None):
+        # history: earlier turns of the conversation, from SessionStore.history()
+        user_prompt = (
+            f"User preferred language: {language_name}.\n"
+            f"Answer ONLY in this language.\n"
+            f"User question: {user_text}"
+        )
+        if plan is not None and plan.words:
+            user_prompt += f"\nKeep the answer under {plan.words} words."
+        return [{"role": "system", "content": SYSTEM_PROMPT}] + list(history or []) + [
+            {"role": "user", "content": user_prompt},
+        ]
+
+    @staticmethod
+    def _model_args(plan):
+        args = {"model": plan.model}
+        if plan.max_tokens:
+            args["max_completion_tokens"] = plan.max_tokens
+        return args
+
+    def _plan(self, user_text, language_name, history=None, route=None, conditions=None):
+        return self.policy.plan(user_text, language_name, history, route, conditions)
+
+    def _record(self, plan, chat):
+        """(answer text, cut off at the output budget?) of a completed call."""
+        choice = chat.choices[0]
+        usage = getattr(chat, "usage", None)
+        text = (choice.message.content or "").strip()
+        if not text:
+            self.policy.record(plan, usage, error=UPSTREAM)
+            raise MediAIError(UPSTREAM, "no answer text (finish_reason=%s)" % choice.finish_reason)
+        truncated = choice.finish_reason == "length"
+        self.policy.record(plan, usage, truncated=truncated)
+        return text, truncated
+
+    def _complete(self, user_text, language_name, history=None, plan=None):
+        plan = plan or self._plan(user_text, language_name, history)
+        messages = self._build_messages(user_text, language_name, history, plan)
+
+        def attempt(timeout):
+            chat = self.client.chat.completions.create(
+                messages=messages,
+                timeout=timeout,
+                **self._model_args(plan),
+            )
+            record_usage(getattr(chat, "usage", None))
+            return chat
+
+        with stage("llm"):
+            try:
+                chat = self.transport.call(attempt)
+            except Exception as e:
+                self.policy.record(plan, error=classify(e).kind)
+                raise
+        return self._record(plan, chat)
+
+    def _answer(self, user_text, language_name, history=None, route=None, plan=None, looked_up=False):
+        # looked_up: the caller already missed in the cache (see batch_response)
+        plan = plan or self._plan(user_text, language_name, history, route)
+        # An answer that depends on earlier turns is not reusable, so skip the cache
+        if self.cache is None or history:
+            return self._complete(user_text, language_name, history, plan)[0]
+
+        # An answer cut off at the output budget is served once but not cached
+        truncated = []
+
+        def compute():
+            text, cut = self._complete(user_text, language_name, plan=plan)
+            if cut:
+                truncated.append(text)
+            return text
+
+        key = make_key(user_text, language_name, plan.model)
+        return self.cache.get_or_compute(key, compute, cacheable=lambda text: not truncated,
+                                         lookup=not looked_up)
+
+    def _lookup(self, user_text, language_name, plan):
+        """The cached answer, or None."""
+        if self.cache is None:
+            return None
+        return self.cache.get(make_key(user_text, language_name, plan.model))
+
+    def _batch_item(self, item):
+        """(user_text, language_name, plan) of a batch item; see batch_response."""
+        user_text, language_name = item[:2]
+        conditions = item[2] if len(item) > 2 else None
+        return user_text, language_name, self._plan(user_text, language_name, conditions=conditions)
+
+    def get_response(self, user_text, language_name="English", history=None, route=None):
+        """
+        The answer text. Raises MediAIError if there is none.
+        history: earlier turns as chat messages (see session_store.py).
+        route: the message's router.Route, if it was routed, for the model policy.
+        """
+        try:
+            return self._answer(user_text, language_name, history, route)
+        except Exception as e:
+            raise classify(e)
+
+    def batch_response(self, items, concurrency=8, rate_limiter=None, admission=None, priority=None):
+        """
+        Answers many (user_text, language_name[, conditions]) items, with at most
+        `concurrency` upstream calls in flight and no faster than
+        `rate_limiter` (a RateLimiter) allows; cached answers skip both.
+        With `admission` (an AdmissionController) every upstream call also
+        takes one of its slots at `priority`, like a chat. `conditions`, the
+        item's KB match count from a bulk pass, spares the model policy from
+        matching each message again.
+        Generator: yields (index, reply, error) as each item completes;
+        for an item that failed, reply is None and error a MediAIError.
+        """
+        def one(item):
+            user_text, language_name, plan = self._batch_item(item)
+            cached = self._lookup(user_text, language_name, plan)
+            if cached is not None:
+                return cached
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            if admission is None:
+                return self._answer(user_text, language_name, plan=plan, looked_up=True)
+            with admission.slot(priority):
+                return self._answer(user_text, language_name, plan=plan, looked_up=True)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="medibot-batch")
         try:
-            user_prompt = (
-                f"User preferred language: {language_name}.\n"
-                f"Answer ONLY in this language.\n"
-                f"User question: {user_text}"
+            futures = {pool.submit(one, item): i for i, item in enumerate(items)}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, classify(e)
+        finally:
+            # Also reached when the consumer stops early: drop queued items
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stream_response(self, user_text, language_name="English", history=None, route=None):
+        """
+        Generator version of get_response: yields the answer in chunks as the
+        model produces them. A cached answer is yielded in one piece, and a
+        completed stream is stored in the cache (unless it had history or
+        was cut off at the output budget).
+
+        Opening the stream is retried like any call; once text has been
+        yielded a failure can no longer be retried and MediAIError is raised.
+        """
+        plan = self._plan(user_text, language_name, history, route)
+        key = None
+        if self.cache is not None and not history:
+            key = make_key(user_text, language_name, plan.model)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        t0 = time.perf_counter()
+        messages = self._build_messages(user_text, language_name, history, plan)
+        try:
+            stream = self.transport.call(
+                lambda timeout: self.client.chat.completions.create(
+                    messages=messages, stream=True, timeout=timeout,
+                    stream_options={"include_usage": True}, **self._model_args(plan),
+                ),
+                hedge=False,
             )
+        except Exception as e:
+            self.policy.record(plan, error=classify(e).kind)
+            raise
 
-            chat = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt},
-                ],
+        parts = []
+        usage = finish = None
+        try:
+            for event in stream:
+                if not event.choices:
+                    usage = getattr(event, "usage", None)  # the last event
+                    record_usage(usage)
+                    continue
+                finish = event.choices[0].finish_reason or finish
+                delta = event.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm_first_token")
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            err = classify(e)
+            print("❌ Stream interrupted:", err.detail)
+            self.policy.record(plan, usage, error=err.kind)
+            raise err
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm")
+        self.policy.record(plan, usage, truncated=finish == "length")
+
+        if key is not None and parts and finish != "length":
+            self.cache.set(key, "".join(parts).strip())
+
+
+class AsyncMediAI(MediAI):
+    """
+    MediAI on top of AsyncOpenAI, for the async server (async_app.py).
+    get_response / stream_response are coroutines here, so one event loop
+    can keep hundreds of upstream calls in flight.
+    """
+
+    def __init__(self, api_key=None, model=None, cache=None, transport=None, policy=None):
+        super().__init__(api_key=api_key, model=model, cache=cache, transport=transport, policy=policy)
+        self._inflight = {}  # cache key -> asyncio.Future, for coalescing misses
+
+    def _make_client(self, key):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=key, max_retries=0)
+
+    async def _complete(self, user_text, language_name, history=None, plan=None):
+        plan = plan or self._plan(user_text, language_name, history)
+        messages = self._build_messages(user_text, language_name, history, plan)
+
+        async def attempt(timeout):
+            chat = await self.client.chat.completions.create(
+                messages=messages,
+                timeout=timeout,
+                **self._model_args(plan),
             )
+            record_usage(getattr(chat, "usage", None))
+            return chat
 
-            return chat.choices[0].message.content.strip()
+        with stage("llm"):
+            try:
+                chat = await self.transport.call_async(attempt)
+            except Exception as e:
+                self.policy.record(plan, error=classify(e).kind)
+                raise
+        return self._record(plan, chat)
 
+    async def _cached_complete(self, user_text, language_name, plan, lookup=True):
+        key = make_key(user_text, language_name, plan.model)
+        if lookup:
+            # The SQLite tier blocks, so keep it off the event loop
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value, truncated = await self._complete(user_text, language_name, plan=plan)
+            if not truncated:
+                await asyncio.to_thread(self.cache.set, key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # The leader hit its deadline; waiters should not be cancelled with it
+            future.set_exception(MediAIError(TIMEOUT, "upstream call was cancelled"))
+            future.exception()  # mark as retrieved when nobody is waiting
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _answer(self, user_text, language_name, history=None, route=None, plan=None, looked_up=False):
+        plan = plan or self._plan(user_text, language_name, history, route)
+        if self.cache is None or history:
+            return (await self._complete(user_text, language_name, history, plan))[0]
+        return await self._cached_complete(user_text, language_name, plan, lookup=not looked_up)
+
+    async def get_response(self, user_text, language_name="English", history=None, route=None):
+        try:
+            return await self._answer(user_text, language_name, history, route)
         except Exception as e:
-            print("❌ Error:", e)
-            return f"Error: {e}"
+            raise classify(e)
+
+    async def batch_response(self, items, concurrency=8, rate_limiter=None, timeout=None,
+                             admission=None, priority=None):
+        """
+        Async generator version of MediAI.batch_response; `timeout` is a
+        deadline in seconds for each item's answer.
+        """
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def answer(item):
+            user_text, language_name, plan = await asyncio.to_thread(self._batch_item, item)
+            cached = await asyncio.to_thread(self._lookup, user_text, language_name, plan)
+            if cached is not None:
+                return cached
+            if rate_limiter is not None:
+                await rate_limiter.acquire_async()
+            if admission is None:
+                return await asyncio.wait_for(self._answer(user_text, language_name, plan=plan, looked_up=True), timeout)
+            await admission.acquire_async(priority)
+            try:
+                return await asyncio.wait_for(self._answer(user_text, language_name, plan=plan, looked_up=True), timeout)
+            finally:
+                admission.release()
+
+        async def one(index, item):
+            async with slots:
+                try:
+                    return index, await answer(item), None
+                except asyncio.TimeoutError:
+                    return index, None, MediAIError(TIMEOUT, "batch item deadline of %gs" % timeout)
+                except Exception as e:
+                    return index, None, classify(e)
+
+        tasks = [asyncio.ensure_future(one(i, item)) for i, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_response(self, user_text, language_name="English", history=None, route=None):
+        """Async generator version of MediAI.stream_response."""
+        plan = self._plan(user_text, language_name, history, route)
+        key = None
+        if self.cache is not None and not history:
+            key = make_key(user_text, language_name, plan.model)
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                yield cached
+                return
+
+        t0 = time.perf_counter()
+        messages = self._build_messages(user_text, language_name, history, plan)
+        try:
+            stream = await self.transport.call_async(
+                lambda timeout: self.client.chat.completions.create(
+                    messages=messages, stream=True, timeout=timeout,
+                    stream_options={"include_usage": True}, **self._model_args(plan),
+                ),
+                hedge=False,
+            )
+        except Exception as e:
+            self.policy.record(plan, error=classify(e).kind)
+            raise
+
+        parts = []
+        usage = finish = None
+        try:
+            async for event in stream:
+                if not event.choices:
+                    usage = getattr(event, "usage", None)
+                    record_usage(usage)
+                    continue
+                finish = event.choices[0].finish_reason or finish
+                delta = event.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm_first_token")
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            err = classify(e)
+            print("❌ Stream interrupted:", err.detail)
+            self.policy.record(plan, usage, error=err.kind)
+            raise err
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm")
+        self.policy.record(plan, usage, truncated=finish == "length")
+
+        if key is not None and parts and finish != "length":
+            await asyncio.to_thread(self.cache.set, key, "".join(parts).strip())
@@ -0,0 +1,310 @@
+# async_app.py
+"""
+Async serving mode for the web app.
+
+Same routes as App.py, but the chat handlers are coroutines on top of
+AsyncMediAI, so one process keeps many OpenAI round trips in flight instead of
+one per gunicorn sync worker. Messages the router answers locally (see
+router.py) never take a concurrency slot; the others queue for one by
+priority, emergencies first (see admission.py).
+
+Run with any ASGI server, e.g.:
+    uvicorn async_app:app --host 0.0.0.0 --port 5000
+
+Settings (environment variables):
+    MEDIBOT_MAX_INFLIGHT     chats processed at once (default 200)
+    MEDIBOT_QUEUE_TIMEOUT    seconds a chat may wait for a free slot (default 5)
+    MEDIBOT_REQUEST_TIMEOUT  deadline for one chat, in seconds (default 30)
+    (queue size, emergency lane and shedding: see admission.py)
+"""
+import asyncio
+import json
+import os
+import time
+
+from quart import Quart, Response, g, jsonify, render_template, request
+
+from admission import AdmissionController, priority_for
+from ai_engine import AsyncMediAI
+from chat_batch import aiter_results, parse_batch_request, summary
+from hospital_finder import find_hospitals, parse_hospital_query
+from lazy_engine import LazyEngine
+from llm_transport import TIMEOUT, MediAIError
+from medical_db import current_kb, kb_stats
+import metrics
+from response_cache import ResponseCache
+from router import ROUTE_LLM, ROUTE_LOCAL_REFINE, route_message
+from session_store import SessionStore
+
+REQUEST_TIMEOUT = float(os.getenv("MEDIBOT_REQUEST_TIMEOUT", "30"))
+
+app = Quart(__name__)
+
+cache = ResponseCache.from_env()
+ai = LazyEngine("AsyncMediAI", lambda: AsyncMediAI(cache=cache))  # uses OPENAI_API_KEY environment variable
+sessions = SessionStore.from_env()
+admission = AdmissionController.from_env(default_capacity=200)
+
+
+async def _read_chat_request():
+    data = await request.get_json(silent=True) or {}
+    message = (data.get("message") or "").strip()
+    language = (data.get("language") or "English").strip() or "English"
+    session_id = SessionStore.normalize_id(data.get("session_id"))
+    return message, language, bool(data.get("refine")), session_id
+
+
+def _chat_payload(reply, route, refine, t0, session_id, error=None):
+    payload = {
+        "reply": reply,
+        "offline": "" if refine else route.offline_html,
+        "refine": route.tier == ROUTE_LOCAL_REFINE and not refine,
+        "route": dict(route.to_dict(), total_ms=round((time.perf_counter() - t0) * 1000, 1)),
+        "session_id": session_id,
+        "kb_version": route.kb_version,
+    }
+    if error is not None:
+        payload["error"] = error.to_dict()
+    return payload
+
+
+def _deadline_error():
+    """The MediAIError for a chat that ran past REQUEST_TIMEOUT."""
+    return MediAIError(TIMEOUT, "request deadline of %gs" % REQUEST_TIMEOUT)
+
+
+@app.before_serving
+async def _warm_engine():
+    # Built in a background thread at startup, not on the event loop by the first chat
+    ai.warm()
+
+
+metrics.CallbackGauge("medibot_cache_hit_ratio", "Response cache hit ratio.", lambda: cache.stats()["hit_ratio"])
+metrics.CallbackGauge("medibot_circuit_open", "1 while the OpenAI circuit breaker is open.",
+                      lambda: int(ai.transport.breaker.state == "open") if ai.is_ready else None)
+metrics.CallbackGauge("medibot_sessions", "Conversation sessions held in memory.", lambda: sessions.stats()["sessions"])
+metrics.CallbackGauge("medibot_admission_queue", "Chats waiting for an LLM slot.", admission.queue_depth, "priority")
+
+
+# ---------- REQUEST METRICS ----------
+@app.before_request
+async def _start_timer():
+    g.metrics_t0 = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or "unknown"
+    metrics.INFLIGHT.inc(endpoint=g.metrics_endpoint)
+
+
+@app.after_request
+async def _record_request(response):
+    metrics.REQUESTS.inc(endpoint=g.metrics_endpoint, status=response.status_code)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_t0, endpoint=g.metrics_endpoint)
+    g.metrics_counted = True
+    return response
+
+
+@app.teardown_request
+async def _finish_request(exc):
+    if "metrics_endpoint" not in g:
+        return
+    if exc is not None:
+        # The 500 page usually went through _record_request already
+        if not g.get("metrics_counted"):
+            metrics.REQUESTS.inc(endpoint=g.metrics_endpoint, status=500)
+        metrics.ERRORS.inc(kind="exception")
+    metrics.INFLIGHT.dec(endpoint=g.metrics_endpoint)
+
+
+@app.route("/")
+async def index():
+    with metrics.stage("render_index"):
+        return await render_template("index.html")
+
+
+@app.route("/api/chat", methods=["POST"])
+async def chat():
+    message, language, refine, session_id = await _read_chat_request()
+
+    if not message:
+        return jsonify({"reply": "Please type something.", "offline": "", "session_id": session_id,
+                        "kb_version": current_kb().version})
+
+    t0 = time.perf_counter()
+    route = route_message(message, language)  # local KB only; microseconds
+    if not (refine or route.tier == ROUTE_LLM):
+        sessions.record(session_id, message, route.local_reply)
+        return jsonify(_chat_payload(route.local_reply, route, refine, t0, session_id))
+
+    try:
+        await admission.acquire_async(priority_for(route, refine))
+    except MediAIError as e:
+        return jsonify(_chat_payload(str(e), route, refine, t0, session_id, e)), e.http_status
+
+    try:
+        engine = await ai.aget()
+        reply = await asyncio.wait_for(
+            engine.get_response(message, language, sessions.history(session_id), route), REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        e = _deadline_error()
+        return jsonify(_chat_payload(str(e), route, refine, t0, session_id, e)), e.http_status
+    except MediAIError as e:
+        return jsonify(_chat_payload(str(e), route, refine, t0, session_id, e)), e.http_status
+    finally:
+        admission.release()
+
+    sessions.record(session_id, message, reply)
+    return jsonify(_chat_payload(reply, route, refine, t0, session_id))
+
+
+def _sse(event, payload):
+    return "event: %s\ndata: %s\n\n" % (event, json.dumps(payload))
+
+
+@app.route("/api/chat/stream", methods=["POST"])
+async def chat_stream():
+    """Async twin of App.chat_stream; same event sequence."""
+    message, language, _, session_id = await _read_chat_request()
+
+    async def generate():
+        if not message:
+            yield _sse("offline", {"html": ""})
+            yield _sse("token", {"text": "Please type something."})
+            yield _sse("done", {"session_id": session_id})
+            return
+
+        t0 = time.perf_counter()
+        route = route_message(message, language)
+        yield _sse("offline", {"html": route.offline_html})
+        yield _sse("route", route.to_dict())
+
+        parts = []
+        if route.local_reply:
+            parts.append(route.local_reply)
+            yield _sse("token", {"text": route.local_reply})
+        if not route.needs_llm:
+            sessions.record(session_id, message, route.local_reply)
+            yield _sse("done", {"total_ms": round((time.perf_counter() - t0) * 1000, 1), "session_id": session_id})
+            return
+        if route.local_reply:
+            parts.append("\n\n")
+            yield _sse("token", {"text": "\n\n"})
+
+        try:
+            await admission.acquire_async(priority_for(route))
+        except MediAIError as e:
+            yield _sse("error", e.to_dict())
+            yield _sse("done", {"total_ms": round((time.perf_counter() - t0) * 1000, 1), "session_id": session_id})
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + REQUEST_TIMEOUT
+        chunks = None
+        completed = False
+        try:
+            # Inside the try: building the engine may fail (no API key)
+            chunks = (await ai.aget()).stream_response(message, language, sessions.history(session_id), route)
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                except StopAsyncIteration:
+                    completed = True
+                    break
+                parts.append(chunk)
+                yield _sse("token", {"text": chunk})
+        except asyncio.TimeoutError:
+            yield _sse("error", _deadline_error().to_dict())
+        except MediAIError as e:
+            yield _sse("error", e.to_dict())
+        finally:
+            if chunks is not None:
+                await chunks.aclose()
+            admission.release()
+
+        # Only complete answers become history; a failed turn can simply be retried
+        if completed:
+            sessions.record(session_id, message, "".join(parts).strip())
+        yield _sse("done", {"total_ms": round((time.perf_counter() - t0) * 1000, 1), "session_id": session_id})
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/chat/batch", methods=["POST"])
+async def chat_batch():
+    """Many messages in one request; see chat_batch.py for the format."""
+    try:
+        items, concurrency, stream = parse_batch_request(await request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    t0 = time.perf_counter()
+
+    if stream:
+        async def generate():
+            errors = 0
+            async for row in aiter_results(ai, items, concurrency, REQUEST_TIMEOUT, admission):
+                errors += row["error"] is not None
+                yield json.dumps(row) + "\n"
+            yield json.dumps(dict(summary(len(items), errors, t0), done=True)) + "\n"
+
+        response = Response(generate(), mimetype="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        response.timeout = None  # the batch may outlive Quart's default response timeout
+        return response
+
+    rows = [row async for row in aiter_results(ai, items, concurrency, REQUEST_TIMEOUT, admission)]
+    rows.sort(key=lambda row: row["index"])
+    errors = sum(row["error"] is not None for row in rows)
+    return jsonify(dict(summary(len(items), errors, t0), results=rows))
+
+
+@app.route("/api/hospitals")
+async def hospitals():
+    """Nearest hospitals: ?q=<city or pincode> or ?lat=..&lon=.., plus optional k, max_km."""
+    try:
+        result = find_hospitals(**parse_hospital_query(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify(result)
+
+
+@app.route("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route("/api/cache/stats")
+async def cache_stats():
+    return jsonify(cache.stats())
+
+
+@app.route("/api/sessions/stats")
+async def session_stats():
+    return jsonify(sessions.stats())
+
+
+@app.route("/api/kb/stats")
+async def kb_stats_route():
+    return jsonify(kb_stats())
+
+
+@app.route("/api/admission/stats")
+async def admission_stats():
+    return jsonify(admission.stats())
+
+@app.route("/api/llm/stats")
+async def llm_stats():
+    # Model tiers, tokens and latency per request (model_policy.py); {} until the engine is built
+    return jsonify(ai.policy.stats() if ai.is_ready else {})
+
+
+if __name__ == "__main__":
+    # Local run (Quart's built-in server)
+    app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,292 @@
+# audio_cache.py
+"""
+Pre-synthesized speech for VoiceEngine.
+
+Most of what the desktop app says is fixed text: the welcome message,
+"Language set to ...", the canned local replies and the KB's first-aid and
+see-a-doctor advice. Synthesizing a sentence keeps SAPI busy for a moment
+before the first sound; playing a rendered clip starts at once.
+
+Clips are rendered per sentence (the unit VoiceEngine speaks) to
+<cache dir>/<key>.wav, the key being a hash of the text, the voice id and
+the speaking rate, so another voice or rate gets its own clips rather than
+the wrong ones. Clips come from:
+    - pre-rendering: every static text (router.spoken_texts) with each
+      language's voice, up front with `python audio_cache.py`, or in the
+      background while the speech thread has nothing to say;
+    - repeats: a sentence synthesized live RENDER_AFTER times (e.g. a stock
+      LLM sentence) is rendered for next time, also while idle.
+The directory is bounded: past MEDIBOT_TTS_CACHE_MB the least recently
+played clips are deleted. Play times are kept as file mtimes, so the order
+survives restarts.
+
+Clips are played with winsound on Windows and afplay / paplay / aplay
+elsewhere; without a player the cache is off and speech is synthesized live.
+
+Usage:
+    python audio_cache.py                          # every language in the KB
+    python audio_cache.py --languages English Hindi
+
+Settings (environment variables):
+    MEDIBOT_TTS_CACHE      0 turns the cache off (default on)
+    MEDIBOT_TTS_CACHE_DIR  where clips are kept (default %LOCALAPPDATA%\\MediBot\\tts, or ~/.cache/MediBot/tts)
+    MEDIBOT_TTS_CACHE_MB   size bound of that directory in MB (default 200)
+"""
+import argparse
+import functools
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import wave
+from collections import OrderedDict
+
+try:
+    import winsound
+except ImportError:  # not Windows: play clips with an external player
+    winsound = None
+
+import metrics
+
+AUDIO_EXT = ".aiff" if sys.platform == "darwin" else ".wav"  # what pyttsx3's driver writes
+TEMP_SUFFIX = ".tmp" + AUDIO_EXT
+
+# Live syntheses of the same sentence before it is rendered for next time
+RENDER_AFTER = 2
+# Sentences counted for that; the oldest are forgotten first
+MISS_MEMORY = 4096
+
+TTS_CACHE = metrics.Counter("medibot_tts_cache_total",
+                            "Sentences played from a rendered clip (hit) or synthesized live (miss).",
+                            ("result",))
+
+
+def default_directory() -> str:
+    base = os.getenv("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "MediBot", "tts")
+
+
+def clip_key(text: str, voice: str, rate: int) -> str:
+    raw = "\x00".join([voice or "default", str(rate), text])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+# ---------- PLAYBACK ----------
+class _WinsoundPlayback:
+    """Asynchronous PlaySound; it cannot be asked whether it is done, so the clip length is."""
+
+    def __init__(self, path):
+        with wave.open(path, "rb") as w:
+            duration = w.getnframes() / float(w.getframerate())
+        winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC | winsound.SND_NODEFAULT)
+        self._end = time.monotonic() + duration
+
+    def playing(self) -> bool:
+        return time.monotonic() < self._end
+
+    def stop(self):
+        winsound.PlaySound(None, 0)
+
+
+class _ProcessPlayback:
+    def __init__(self, command, path):
+        self._proc = subprocess.Popen(command + [path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def playing(self) -> bool:
+        return self._proc.poll() is None
+
+    def stop(self):
+        if self.playing():
+            self._proc.terminate()
+        try:
+            self._proc.wait(1)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+
+
+def find_player():
+    """A callable that starts playing a clip file and returns its playback, or None."""
+    if winsound is not None:
+        return _WinsoundPlayback
+    for command in (["afplay"], ["paplay"], ["aplay", "-q"]):
+        if shutil.which(command[0]):
+            return functools.partial(_ProcessPlayback, command)
+    return None
+
+
+# ---------- CACHE ----------
+class AudioCache:
+    def __init__(self, directory: str, max_bytes: int = 200 * 2 ** 20, player=None):
+        """
+        directory: where clips are kept (created if missing).
+        max_bytes: size bound; least recently played clips are deleted past it.
+        player: find_player() result; by default the platform's.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._player = player or find_player()
+
+        self._lock = threading.Lock()
+        self._clips = OrderedDict()    # key -> bytes, least recently played first
+        self._bytes = 0
+        self._misses = OrderedDict()   # key -> live syntheses so far
+        self._stats = {"hits": 0, "misses": 0, "rendered": 0, "evicted": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @classmethod
+    def from_env(cls):
+        """The configured cache, or None if it is turned off or nothing can play clips."""
+        if os.getenv("MEDIBOT_TTS_CACHE", "1") == "0":
+            return None
+        player = find_player()
+        if player is None:
+            print("⚠ No audio player found; speech is synthesized live")
+            return None
+        return cls(
+            directory=os.getenv("MEDIBOT_TTS_CACHE_DIR") or default_directory(),
+            max_bytes=int(float(os.getenv("MEDIBOT_TTS_CACHE_MB", "200")) * 2 ** 20),
+            player=player,
+        )
+
+    def _scan(self):
+        clips = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(TEMP_SUFFIX):
+                # Left over from an interrupted render
+                self._remove(entry.path)
+            elif entry.name.endswith(AUDIO_EXT):
+                st = entry.stat()
+                clips.append((st.st_mtime, entry.name[:-len(AUDIO_EXT)], st.st_size))
+        for _, key, size in sorted(clips):
+            self._clips[key] = size
+            self._bytes += size
+        self._evict()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def key(self, text: str, voice: str, rate: int) -> str:
+        return clip_key(text, voice, rate)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + AUDIO_EXT)
+
+    def temp_path(self, key: str) -> str:
+        """Where to render a clip before add()."""
+        return os.path.join(self.directory, key + TEMP_SUFFIX)
+
+    def __contains__(self, key):
+        return key in self._clips
+
+    def __len__(self):
+        return len(self._clips)
+
+    # ---------- LOOKUP ----------
+    def lookup(self, key: str):
+        """Path of the clip for `key`, or None; a hit makes it the most recently played."""
+        with self._lock:
+            found = key in self._clips
+            if found:
+                self._clips.move_to_end(key)
+            self._stats["hits" if found else "misses"] += 1
+        TTS_CACHE.inc(result="hit" if found else "miss")
+        if not found:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            # Deleted behind our back (e.g. the directory was cleared)
+            with self._lock:
+                self._bytes -= self._clips.pop(key, 0)
+            return None
+        return path
+
+    def play(self, path: str):
+        """Starts playing a clip; the result has playing() and stop()."""
+        return self._player(path)
+
+    def note_miss(self, key: str) -> bool:
+        """Counts a live synthesis of `key`; True once it is worth rendering."""
+        with self._lock:
+            seen = self._misses.pop(key, 0) + 1
+            if seen >= RENDER_AFTER:
+                return True
+            self._misses[key] = seen
+            if len(self._misses) > MISS_MEMORY:
+                self._misses.popitem(last=False)
+            return False
+
+    # ---------- STORE ----------
+    def discard(self, rendered: str):
+        """Drops an unfinished render."""
+        self._remove(rendered)
+
+    def add(self, key: str, rendered: str) -> bool:
+        """Moves a clip rendered to temp_path(key) into the cache. False if the render came out empty."""
+        try:
+            size = os.path.getsize(rendered)
+        except OSError:
+            return False
+        if size <= 44:  # a bare WAV header: the driver said nothing
+            self.discard(rendered)
+            return False
+        os.replace(rendered, self.path(key))
+        with self._lock:
+            self._bytes += size - self._clips.pop(key, 0)
+            self._clips[key] = size
+            self._stats["rendered"] += 1
+            self._evict()
+        return True
+
+    def _evict(self):
+        # The newest clip stays even if it alone is over the bound
+        while self._bytes > self.max_bytes and len(self._clips) > 1:
+            key, size = self._clips.popitem(last=False)
+            self._bytes -= size
+            self._stats["evicted"] += 1
+            self._remove(self.path(key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, clips=len(self._clips), bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-renders every static text the desktop app speaks.")
+    parser.add_argument("--languages", nargs="+", help="default: every language in the KB")
+    args = parser.parse_args()
+
+    cache = AudioCache.from_env()
+    if cache is None:
+        print("❌ Audio cache is off (MEDIBOT_TTS_CACHE=0 or no audio player)")
+        sys.exit(1)
+
+    from medical_db import current_kb
+    from router import spoken_texts
+    from voice_engine import VoiceEngine
+
+    kb = current_kb()
+    engine = VoiceEngine(cache=cache)
+    t0 = time.perf_counter()
+    for language in args.languages or kb.languages:
+        engine.prerender(spoken_texts(language, kb), language)
+    engine.wait_rendered()
+
+    stats = cache.stats()
+    print("✅ %d clips rendered in %.1f s; %d cached in %s (%.1f of %.0f MB)" % (
+        stats["rendered"], time.perf_counter() - t0, stats["clips"], cache.directory,
+        stats["bytes"] / 2 ** 20, cache.max_bytes / 2 ** 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_admission.py
+"""
+Queue wait per priority under overload (admission.AdmissionController), with
+simulated LLM calls, no server needed.
+
+Clients arrive at --load times what the slots can serve; each call holds a
+slot for --work-ms. A share of them are emergencies and a share are LOW
+(local+refine). Emergency waits should stay near zero while LOW work is shed.
+
+Run from the repository root:
+    python -m benchmarks.bench_admission
+    python -m benchmarks.bench_admission --capacity 16 --load 1 2 4 --json out.json
+"""
+import argparse
+import random
+import threading
+import time
+
+from admission import EMERGENCY, LOW, NORMAL, PRIORITY_NAMES, AdmissionController
+from benchmarks.common import percentiles, write_results
+from llm_transport import MediAIError
+
+
+def run_load(capacity, load, requests, work_ms, emergency_share, low_share, seed=7):
+    admission = AdmissionController(capacity=capacity)
+    rnd = random.Random(seed)
+    waits = {name: [] for name in PRIORITY_NAMES}
+    refused = {name: 0 for name in PRIORITY_NAMES}
+    lock = threading.Lock()
+
+    def client(priority):
+        t0 = time.perf_counter()
+        try:
+            with admission.slot(priority):
+                wait = time.perf_counter() - t0
+                time.sleep(work_ms / 1000)
+        except MediAIError:
+            with lock:
+                refused[PRIORITY_NAMES[priority]] += 1
+            return
+        with lock:
+            waits[PRIORITY_NAMES[priority]].append(wait * 1000)
+
+    # Arrival interval for `load` times the rate all the slots can serve
+    interval = work_ms / 1000 / (capacity * load)
+    threads = []
+    t0 = time.perf_counter()
+    for _ in range(requests):
+        r = rnd.random()
+        priority = EMERGENCY if r < emergency_share else LOW if r < emergency_share + low_share else NORMAL
+        thread = threading.Thread(target=client, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(interval)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+
+    rows = []
+    for name in PRIORITY_NAMES:
+        pct = percentiles(waits[name])
+        rows.append({
+            "case": "%gx/%s" % (load, name),  # row key for benchmarks.compare
+            "load": load,
+            "priority": name,
+            "admitted": len(waits[name]),
+            "refused": refused[name],
+            "wait_p50_ms": round(pct["p50"], 1) if waits[name] else None,
+            "wait_p95_ms": round(pct["p95"], 1) if waits[name] else None,
+            "wait_p99_ms": round(pct["p99"], 1) if waits[name] else None,
+            "throughput_per_s": round(len(waits[name]) / elapsed, 1),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--load", type=float, nargs="+", default=[0.5, 1.5, 3.0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--work-ms", type=float, default=100)
+    parser.add_argument("--emergency-share", type=float, default=0.05)
+    parser.add_argument("--low-share", type=float, default=0.4)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = []
+    for load in args.load:
+        rows += run_load(args.capacity, load, args.requests, args.work_ms, args.emergency_share, args.low_share)
+
+    print("%5s %10s %9s %8s %8s %8s %8s" % ("load", "priority", "admitted", "refused", "p50 ms", "p95 ms", "p99 ms"))
+    for r in rows:
+        print("%5.1f %10s %9d %8d %8s %8s %8s" % (
+            r["load"], r["priority"], r["admitted"], r["refused"],
+            r["wait_p50_ms"], r["wait_p95_ms"], r["wait_p99_ms"]))
+
+    if args.json:
+        write_results(args.json, "admission", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
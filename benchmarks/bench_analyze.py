@@ -0,0 +1,87 @@
+# benchmarks/bench_analyze.py
+"""
+End-to-end cost of analyze_symptoms (match + rank + format) per message as
+the KB grows, with latency percentiles.
+
+Each size is compiled to a temporary KB file and swapped into medical_db
+for the run, so the numbers include everything a chat request pays.
+
+Run from the repository root:
+    python -m benchmarks.bench_analyze
+    python -m benchmarks.bench_analyze --sizes 100 10000 50000 --repeat 500 --json out.json
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import medical_db
+from benchmarks.common import MESSAGES, percentiles, write_results, write_synthetic_kb
+from kb_store import KnowledgeBase
+
+
+def use_kb(kb):
+    """Points medical_db at another KnowledgeBase; returns what it replaced."""
+    previous = medical_db.KB
+    medical_db._swap(kb)
+    return previous
+
+
+def restore_kb(previous):
+    medical_db._swap(previous)
+
+
+def run(sizes, repeat: int):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, "kb_%d.kb" % size)
+            write_synthetic_kb(size, path)
+            kb = KnowledgeBase(path)
+            previous = use_kb(kb)
+            try:
+                t0 = time.perf_counter()
+                medical_db.get_ranker()
+                rank_build_ms = (time.perf_counter() - t0) * 1000
+
+                samples = []
+                for _ in range(repeat):
+                    for msg in MESSAGES:
+                        t0 = time.perf_counter()
+                        medical_db.analyze_symptoms(msg)
+                        samples.append((time.perf_counter() - t0) * 1e6)
+            finally:
+                restore_kb(previous)
+
+            pct = percentiles(samples)
+            rows.append({
+                "conditions": len(kb),
+                "rank_build_ms": round(rank_build_ms, 1),
+                "mean_us": round(sum(samples) / len(samples), 2),
+                "p50_us": round(pct["p50"], 2),
+                "p95_us": round(pct["p95"], 2),
+                "p99_us": round(pct["p99"], 2),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.repeat)
+
+    print("%10s %14s %9s %9s %9s %9s" % ("conditions", "rank build ms", "mean us", "p50 us", "p95 us", "p99 us"))
+    for r in rows:
+        print("%10d %14.1f %9.1f %9.1f %9.1f %9.1f" % (
+            r["conditions"], r["rank_build_ms"], r["mean_us"], r["p50_us"], r["p95_us"], r["p99_us"]))
+
+    if args.json:
+        write_results(args.json, "analyze", rows, {"sizes": args.sizes, "repeat": args.repeat})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/bench_fuzzy.py
+"""
+Typo correction cost (medical_db.correct_spelling) per message as the KB
+grows. With the symmetric-delete index it should stay flat. The index's
+lookup cache is cleared before every message, so these are cold lookups. The index's
+lookup cache is cleared before every message, so these are cold lookups.
+
+Run from the repository root:
+    python -m benchmarks.bench_fuzzy
+    python -m benchmarks.bench_fuzzy --sizes 100 10000 50000 --repeat 500 --json out.json
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import medical_db
+from benchmarks.bench_analyze import restore_kb, use_kb
+from benchmarks.common import percentiles, write_results, write_synthetic_kb
+from kb_store import KnowledgeBase
+
+TYPO_MESSAGES = [
+    "I have hedache and fevr since yesterday",
+    "my child has diarhea and vomitting",
+    "acidty and hartburn after every meal",
+    "coughng with phlegm and sneezng at night",
+    "what is the right dose of paracetamol for an adult",
+]
+
+
+def run(sizes, repeat: int):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, "kb_%d.kb" % size)
+            t0 = time.perf_counter()
+            write_synthetic_kb(size, path)
+            compile_ms = (time.perf_counter() - t0) * 1000
+            kb = KnowledgeBase(path)
+            index = kb.fuzzy_for()
+            previous = use_kb(kb)
+            try:
+                samples = []
+                corrected = 0
+                for _ in range(repeat):
+                    for msg in TYPO_MESSAGES:
+                        index.clear_cache()
+                        t0 = time.perf_counter()
+                        _, corrections = medical_db.correct_spelling(msg)
+                        samples.append((time.perf_counter() - t0) * 1e6)
+                        corrected += len(corrections)
+            finally:
+                restore_kb(previous)
+
+            pct = percentiles(samples)
+            rows.append({
+                "conditions": len(kb),
+                "fuzzy_words": len(index),
+                "compile_ms": round(compile_ms, 1),
+                "corrections_per_msg": round(corrected / len(samples), 2),
+                "mean_us": round(sum(samples) / len(samples), 2),
+                "p50_us": round(pct["p50"], 2),
+                "p95_us": round(pct["p95"], 2),
+                "p99_us": round(pct["p99"], 2),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.repeat)
+
+    print("%10s %8s %11s %9s %9s %9s %9s %9s" % (
+        "conditions", "words", "compile ms", "fixes", "mean us", "p50 us", "p95 us", "p99 us"))
+    for r in rows:
+        print("%10d %8d %11.1f %9.2f %9.1f %9.1f %9.1f %9.1f" % (
+            r["conditions"], r["fuzzy_words"], r["compile_ms"], r["corrections_per_msg"],
+            r["mean_us"], r["p50_us"], r["p95_us"], r["p99_us"]))
+
+    if args.json:
+        write_results(args.json, "fuzzy", rows, {"sizes": args.sizes, "repeat": args.repeat})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_kb_load.py
+"""
+Time to open the compiled KB, and its size, as the number of conditions grows.
+
+Opening should stay flat: the file is memory-mapped and nothing is decoded
+until a condition is looked at.
+
+Run from the repository root:
+    python -m benchmarks.bench_kb_load
+    python -m benchmarks.bench_kb_load --sizes 1000 10000 50000 --json out.json
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import write_results, write_synthetic_kb
+from kb_store import KnowledgeBase
+
+
+def run(sizes, repeat: int):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, "kb_%d.kb" % size)
+            t0 = time.perf_counter()
+            kb = write_synthetic_kb(size, path)
+            compile_ms = (time.perf_counter() - t0) * 1000
+
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                KnowledgeBase(path)
+            open_us = (time.perf_counter() - t0) / repeat * 1e6
+
+            loaded = KnowledgeBase(path)
+            t0 = time.perf_counter()
+            loaded.match("I have fever and headache with dry mouth")
+            first_match_us = (time.perf_counter() - t0) * 1e6
+
+            rows.append({
+                "conditions": len(kb),
+                "file_kb": round(os.path.getsize(path) / 1024, 1),
+                "compile_ms": round(compile_ms, 1),
+                "open_us": round(open_us, 1),
+                "first_match_us": round(first_match_us, 1),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.repeat)
+
+    print("%10s %10s %11s %9s %15s" % ("conditions", "file KiB", "compile ms", "open us", "first match us"))
+    for r in rows:
+        print("%10d %10.1f %11.1f %9.1f %15.1f" % (
+            r["conditions"], r["file_kb"], r["compile_ms"], r["open_us"], r["first_match_us"]))
+
+    if args.json:
+        write_results(args.json, "kb_load", rows, {"sizes": args.sizes, "repeat": args.repeat})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_kb_reload.py
+"""
+Cost of picking up a KB edit while running (kb_reloader.KBReloader.reload:
+recompile, map, build the ranker, swap), as the KB grows.
+
+    full_ms              first compile of the source, nothing to reuse
+    text_edit_ms         one condition's first-aid text changed: nothing is re-indexed
+    keyword_edit_ms      one English keyword added: only that condition is re-indexed (patch indexes)
+    keyword_edit_warm_ms a second keyword on the same condition
+
+Run from the repository root:
+    python -m benchmarks.bench_kb_reload
+    python -m benchmarks.bench_kb_reload --sizes 100 10000 --json out.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.common import complete_synthetic_kb, write_results
+from kb_reloader import KBReloader
+from ranker import Ranker
+
+
+def write_source(path, conditions):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"format": 1, "conditions": conditions}, f, ensure_ascii=False)
+
+
+def timed_edit(reloader, conditions, edit):
+    """Applies `edit` to the source and reloads; returns milliseconds."""
+    edit(conditions)
+    write_source(reloader.source, conditions)
+    # Make sure the source looks newer than the artifact, whatever the mtime resolution
+    stamp = os.path.getmtime(reloader.path) + 1
+    os.utime(reloader.source, (stamp, stamp))
+    t0 = time.perf_counter()
+    if not reloader.reload():
+        raise RuntimeError("KB did not reload: %s" % reloader.last_error)
+    return (time.perf_counter() - t0) * 1000
+
+
+def run(sizes):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            source = os.path.join(tmp, "kb_%d.json" % size)
+            path = os.path.join(tmp, "kb_%d.kb" % size)
+            conditions = complete_synthetic_kb(size)
+            write_source(source, conditions)
+
+            t0 = time.perf_counter()
+            reloader = KBReloader(path, source, interval=0, prepare=lambda kb: Ranker(kb.conditions))
+            Ranker(reloader.kb.conditions)
+            full_ms = (time.perf_counter() - t0) * 1000
+
+            last = len(conditions) - 1
+            text_ms = timed_edit(reloader, conditions,
+                                 lambda c: c[last].update(first_aid="Edited first-aid text."))
+            keyword_ms = timed_edit(reloader, conditions, lambda c: c[last]["keywords"].append("zzkeyworda"))
+            warm_ms = timed_edit(reloader, conditions, lambda c: c[last]["keywords"].append("zzkeywordb"))
+
+            rows.append({
+                "conditions": len(reloader.kb),
+                "full_ms": round(full_ms, 1),
+                "text_edit_ms": round(text_ms, 1),
+                "keyword_edit_ms": round(keyword_ms, 1),
+                "keyword_edit_warm_ms": round(warm_ms, 1),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.sizes)
+
+    print("%10s %9s %13s %16s %16s" % ("conditions", "full ms", "text edit ms", "keyword edit ms", "warm keyword ms"))
+    for r in rows:
+        print("%10d %9.1f %13.1f %16.1f %16.1f" % (
+            r["conditions"], r["full_ms"], r["text_edit_ms"], r["keyword_edit_ms"], r["keyword_edit_warm_ms"]))
+
+    if args.json:
+        write_results(args.json, "kb_reload", rows, {"sizes": args.sizes})
+
+
+if __name__ == "__main__":
+    main()
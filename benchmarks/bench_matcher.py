@@ -0,0 +1,90 @@
+# benchmarks/bench_matcher.py
+"""
+Per-message latency of the offline symptom matcher as the KB grows.
+
+Compares the old per-keyword substring loop with the compiled KeywordMatcher
+(in-memory automaton) and TableMatcher (the same automaton as flat tables,
+as used from the memory-mapped KB) over synthetic knowledge bases of
+increasing size.
+
+Run from the repository root:
+    python -m benchmarks.bench_matcher
+    python -m benchmarks.bench_matcher --sizes 100 1000 10000 50000 --json out.json
+"""
+import argparse
+import time
+
+from benchmarks.common import MESSAGES, synthetic_kb, write_results
+from symptom_matcher import KeywordMatcher, TableMatcher
+
+def naive_match(conditions, text):
+    text = text.lower()
+    results = []
+    for cond in conditions:
+        for kw in cond["keywords"]:
+            if kw in text:
+                results.append(cond)
+                break
+    return results
+
+
+def time_per_message(fn, repeat: int) -> float:
+    """Mean microseconds per message."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for msg in MESSAGES:
+            fn(msg)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(MESSAGES)) * 1e6
+
+
+def run(sizes, repeat: int):
+    rows = []
+    for size in sizes:
+        kb = synthetic_kb(size)
+        keywords = sum(len(c["keywords"]) for c in kb)
+
+        t0 = time.perf_counter()
+        matcher = KeywordMatcher.from_conditions(kb)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        tables, blob = matcher.to_tables()
+        mapped = TableMatcher(
+            {name: memoryview(arr.tobytes()).cast("I") for name, arr in tables.items()},
+            memoryview(blob),
+        )
+
+        # Keep the slow path affordable on big KBs.
+        naive_repeat = max(1, repeat * 100 // max(size, 100))
+        rows.append({
+            "conditions": len(kb),
+            "keywords": keywords,
+            "build_ms": round(build_ms, 2),
+            "compiled_us": round(time_per_message(matcher.match, repeat), 2),
+            "mapped_us": round(time_per_message(mapped.match, repeat), 2),
+            "naive_us": round(time_per_message(lambda m: naive_match(kb, m), naive_repeat), 2),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.repeat)
+
+    print("%10s %10s %10s %16s %14s %13s" % (
+        "conditions", "keywords", "build ms", "compiled us/msg", "mapped us/msg", "naive us/msg"))
+    for r in rows:
+        print("%10d %10d %10.1f %16.1f %14.1f %13.1f" % (
+            r["conditions"], r["keywords"], r["build_ms"], r["compiled_us"], r["mapped_us"], r["naive_us"]))
+
+    if args.json:
+        write_results(args.json, "matcher", rows, {"sizes": args.sizes, "repeat": args.repeat})
+
+
+if __name__ == "__main__":
+    main()
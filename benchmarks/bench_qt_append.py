@@ -0,0 +1,111 @@
+# benchmarks/bench_qt_append.py
+"""
+Cost of MediBotUI.append_message as the chat history grows.
+
+Runs the real window headless (QT_QPA_PLATFORM=offscreen) with dummy
+engines, fills the chat box up to each checkpoint and times a batch of
+appends there, so any growth with the length of the conversation shows up
+as a rising p50/p95.
+
+Run from the repository root:
+    python -m benchmarks.bench_qt_append
+    python -m benchmarks.bench_qt_append --checkpoints 100 1000 5000 20000 --samples 200 --json out.json
+"""
+import argparse
+import os
+import time
+
+try:
+    import resource  # peak memory; not on Windows
+except ImportError:
+    resource = None
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+from benchmarks.common import MESSAGES, percentiles, write_results
+from medical_db import analyze_symptoms
+
+REPLY = ("<b>Possible condition:</b> Common cold<br>"
+         "Rest, drink plenty of fluids and see a doctor if symptoms get worse.")
+
+
+OFFLINE_HTML = analyze_symptoms("fever headache cough and body pain")
+
+class _DummyEngine:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def _append(ui, n):
+    # A symptom message is followed by the offline KB block and a reply
+    if n % 3 == 0:
+        ui.append_message("You", MESSAGES[n % len(MESSAGES)])
+    elif n % 3 == 1:
+        ui.append_message("MediBot Pro (Offline DB)", OFFLINE_HTML)
+    else:
+        ui.append_message("MediBot Pro", REPLY)
+
+
+def run(checkpoints, samples: int):
+    app = QApplication.instance() or QApplication([])
+    from medi_ui import MediBotUI
+
+    ui = MediBotUI(_DummyEngine(), _DummyEngine())
+    ui.show()
+    app.processEvents()
+
+    rows = []
+    count = 0
+    for checkpoint in sorted(checkpoints):
+        while count < checkpoint:
+            _append(ui, count)
+            count += 1
+            if count % 500 == 0:
+                app.processEvents()
+        app.processEvents()
+
+        times = []
+        for _ in range(samples):
+            t0 = time.perf_counter()
+            _append(ui, count)
+            app.processEvents()  # include layout and repaint, as the user sees it
+            times.append((time.perf_counter() - t0) * 1e6)
+            count += 1
+
+        pct = percentiles(times)
+        rows.append({
+            "messages": checkpoint,
+            "mean_us": round(sum(times) / len(times), 1),
+            "p50_us": round(pct["p50"], 1),
+            "p95_us": round(pct["p95"], 1),
+            "p99_us": round(pct["p99"], 1),
+            "rows_in_memory": ui.chat_view.model().rowCount(),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+        })
+    ui.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=[100, 1000, 5000, 20000])
+    parser.add_argument("--samples", type=int, default=100, help="timed appends per checkpoint")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.checkpoints, args.samples)
+
+    print("%9s %10s %10s %10s %10s %8s %9s" % ("messages", "mean us", "p50 us", "p95 us", "p99 us", "rows", "peak MB"))
+    for r in rows:
+        print("%9d %10.1f %10.1f %10.1f %10.1f %8d %9s" % (
+            r["messages"], r["mean_us"], r["p50_us"], r["p95_us"], r["p99_us"], r["rows_in_memory"],
+            r["peak_rss_mb"] if r["peak_rss_mb"] is not None else "-"))
+
+    if args.json:
+        write_results(args.json, "qt_append", rows, {"checkpoints": args.checkpoints, "samples": args.samples})
+
+
+if __name__ == "__main__":
+    main()
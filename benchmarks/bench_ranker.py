@@ -0,0 +1,66 @@
+# benchmarks/bench_ranker.py
+"""
+BM25 ranking cost as the KB grows: one message at a time vs. batch mode.
+
+Run from the repository root:
+    python -m benchmarks.bench_ranker
+    python -m benchmarks.bench_ranker --sizes 100 10000 50000 --messages 5000 --json out.json
+"""
+import argparse
+import time
+
+from benchmarks.common import MESSAGES, synthetic_kb, write_results
+from ranker import Ranker
+
+
+def run(sizes, n_messages: int):
+    messages = (MESSAGES * (n_messages // len(MESSAGES) + 1))[:n_messages]
+    rows = []
+    for size in sizes:
+        kb = synthetic_kb(size)
+
+        t0 = time.perf_counter()
+        ranker = Ranker(kb)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        # The per-message path is slow on purpose; a few hundred calls are enough
+        single = messages[:min(len(messages), 300)]
+        t0 = time.perf_counter()
+        for msg in single:
+            ranker.top_k(msg, 3)
+        single_us = (time.perf_counter() - t0) / len(single) * 1e6
+
+        t0 = time.perf_counter()
+        ranker.top_k_batch(messages, 3)
+        batch_us = (time.perf_counter() - t0) / len(messages) * 1e6
+
+        rows.append({
+            "conditions": len(kb),
+            "terms": len(ranker.vocab),
+            "build_ms": round(build_ms, 2),
+            "single_us": round(single_us, 2),
+            "batch_us": round(batch_us, 2),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000, 50000])
+    parser.add_argument("--messages", type=int, default=3000)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.messages)
+
+    print("%10s %10s %10s %14s %13s" % ("conditions", "terms", "build ms", "single us/msg", "batch us/msg"))
+    for r in rows:
+        print("%10d %10d %10.1f %14.1f %13.1f" % (
+            r["conditions"], r["terms"], r["build_ms"], r["single_us"], r["batch_us"]))
+
+    if args.json:
+        write_results(args.json, "ranker", rows, {"sizes": args.sizes, "messages": args.messages})
+
+
+if __name__ == "__main__":
+    main()
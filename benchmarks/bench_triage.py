@@ -0,0 +1,66 @@
+# benchmarks/bench_triage.py
+"""
+Bulk triage throughput (bulk_triage.run): records per second from a JSONL
+file to a JSONL file, by worker count and chunk size.
+
+Run from the repository root:
+    python -m benchmarks.bench_triage
+    python -m benchmarks.bench_triage --records 500000 --workers 1 4 8 --json out.json
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+
+from benchmarks.common import MESSAGES, write_results
+from bulk_triage import run
+
+EXTRA = ["बुखार और सिर दर्द", "thanks", "my knee hurts when I climb stairs", "hedache and vomitting"]
+
+
+def write_input(path, records, seed=7):
+    rnd = random.Random(seed)
+    texts = MESSAGES + EXTRA
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(records):
+            row = {"id": "m%d" % i, "message": rnd.choice(texts), "language": rnd.choice(["English", "Hindi"])}
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--chunk", type=int, nargs="+", default=[500, 2000])
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "in.jsonl")
+        output = os.path.join(tmp, "out.jsonl")
+        write_input(source, args.records)
+        for workers in sorted(set(args.workers)):
+            for chunk in args.chunk:
+                summary = run(source, output, workers=workers, chunk=chunk, progress=0)
+                rows.append({
+                    "case": "w%d/c%d" % (workers, chunk),  # row key for benchmarks.compare
+                    "workers": workers,
+                    "chunk": chunk,
+                    "records": summary["records"],
+                    "elapsed_s": summary["elapsed_s"],
+                    "records_per_s": summary["records_per_s"],
+                    "output_mb": round(os.path.getsize(output) / 2 ** 20, 1),
+                })
+
+    print("%8s %7s %9s %10s %10s" % ("workers", "chunk", "records", "elapsed s", "records/s"))
+    for r in rows:
+        print("%8d %7d %9d %10.2f %10.0f" % (r["workers"], r["chunk"], r["records"], r["elapsed_s"], r["records_per_s"]))
+
+    if args.json:
+        write_results(args.json, "triage", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
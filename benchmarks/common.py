@@ -0,0 +1,102 @@
+# benchmarks/common.py
+"""
+Helpers shared by the benchmarks: percentiles, synthetic KB files and the
+JSON result format.
+
+Every benchmark's --json file looks like:
+    {"benchmark": "...", "time": "...", "commit": "...", "python": "...",
+     "platform": "...", "params": {...}, "results": [{...}, ...]}
+so runs can be compared with `python -m benchmarks.compare OLD.json NEW.json`.
+"""
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+
+from kb_compiler import build_sections, write_artifact
+from medical_db import CONDITIONS
+
+MESSAGES = [
+    "I have fever and headache since yesterday",
+    "my child is vomiting and has loose motion, dry mouth",
+    "acidity and heartburn after every meal",
+    "cough with phlegm and shortness of breath at night",
+    "what is the right dose of paracetamol for an adult",
+    "sneezing and runny nose, feeling cold all the time",
+]
+
+
+def synthetic_kb(size: int, seed: int = 42):
+    """The real CONDITIONS plus `size` made-up conditions with random keywords."""
+    rnd = random.Random(seed)
+
+    def word():
+        return "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(5, 10)))
+
+    kb = list(CONDITIONS)
+    for i in range(size):
+        keywords = [word() for _ in range(rnd.randint(2, 6))]
+        if rnd.random() < 0.3:
+            keywords.append(word() + " " + word())
+        kb.append({"name": "Synthetic condition %d" % i, "keywords": keywords})
+    return kb
+
+
+def percentiles(samples, points=(50, 95, 99)) -> dict:
+    """{"p50": ..., "p95": ..., "p99": ...} by nearest rank; empty samples give None."""
+    ordered = sorted(samples)
+    result = {}
+    for p in points:
+        if not ordered:
+            result["p%d" % p] = None
+            continue
+        rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+        result["p%d" % p] = ordered[rank]
+    return result
+
+
+def complete_synthetic_kb(size: int):
+    """synthetic_kb(size) with every field kb_compiler requires."""
+    kb = synthetic_kb(size)
+    for i, cond in enumerate(kb):
+        cond = kb[i] = dict(cond)
+        cond.setdefault("id", "cond_%d" % i)
+        for field in ("symptoms", "first_aid", "see_doctor"):
+            cond.setdefault(field, "Synthetic %s text for condition %d. " % (field, i) * 8)
+    return kb
+
+
+def write_synthetic_kb(size: int, path: str):
+    """Compiles complete_synthetic_kb(size) to `path`."""
+    kb = complete_synthetic_kb(size)
+    write_artifact(path, build_sections(kb, "bench"))
+    return kb
+
+
+def _git_commit():
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path: str, benchmark: str, results, params=None):
+    data = {
+        "benchmark": benchmark,
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": params or {},
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
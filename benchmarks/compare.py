@@ -0,0 +1,87 @@
+# benchmarks/compare.py
+"""
+Compares two --json result files of the same benchmark and flags
+regressions.
+
+Rows are matched on their first field (conditions, messages, mode...);
+latency fields (*_us, *_ms) are worse when higher, throughput fields
+(*_rps, *_per_s) when lower. Exit status is 1 if any field got worse by
+more than --threshold percent, so this can gate CI.
+
+Run from the repository root:
+    python -m benchmarks.compare baseline.json new.json
+    python -m benchmarks.compare baseline.json new.json --threshold 15
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("_us", "_ms")
+HIGHER_IS_BETTER = ("_rps", "_per_s")
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def row_key(row):
+    """First field identifies the row; load_chat rows also need concurrency."""
+    keys = list(row)
+    key = [row[keys[0]]]
+    if "concurrency" in row and keys[0] != "concurrency":
+        key.append(row["concurrency"])
+    return tuple(key)
+
+
+def compare(old, new, threshold: float):
+    """List of (row key, field, old, new, change %, regressed)."""
+    changes = []
+    old_rows = {row_key(r): r for r in old["results"]}
+    for row in new["results"]:
+        base = old_rows.get(row_key(row))
+        if base is None:
+            continue
+        for field, value in row.items():
+            if not isinstance(value, (int, float)) or not isinstance(base.get(field), (int, float)):
+                continue
+            if field.endswith(LOWER_IS_BETTER):
+                worse_sign = 1
+            elif field.endswith(HIGHER_IS_BETTER):
+                worse_sign = -1
+            else:
+                continue
+            if not base[field]:
+                continue
+            change = (value - base[field]) / base[field] * 100
+            changes.append((row_key(row), field, base[field], value, change, change * worse_sign > threshold))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    if old.get("benchmark") != new.get("benchmark"):
+        print("❌ Different benchmarks: %s vs %s" % (old.get("benchmark"), new.get("benchmark")))
+        sys.exit(2)
+
+    print("📊 %s: %s -> %s" % (new["benchmark"], old.get("commit") or "?", new.get("commit") or "?"))
+    changes = compare(old, new, args.threshold)
+    for key, field, before, after, change, regressed in changes:
+        print("%s %-24s %-16s %12.2f -> %12.2f  %+7.1f%%" % (
+            "❌" if regressed else "  ", "/".join(str(k) for k in key), field, before, after, change))
+
+    regressions = sum(1 for c in changes if c[-1])
+    if regressions:
+        print("❌ %d regression(s) above %.0f%%" % (regressions, args.threshold))
+        sys.exit(1)
+    print("✅ No regressions above %.0f%%" % args.threshold)
+
+
+if __name__ == "__main__":
+    main()
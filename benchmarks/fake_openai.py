@@ -0,0 +1,167 @@
+# benchmarks/fake_openai.py
+"""
+Local stand-in for the OpenAI chat completions API, for load tests.
+
+Answers POST /v1/chat/completions (plain and streamed) after a configurable
+delay, with usage numbers, so the app can be load-tested without a key,
+cost or rate limits.
+
+Run on its own:
+    python -m benchmarks.fake_openai --port 8001 --latency 300 --jitter 100 --tokens 120 --token-ms 5
+then start the app against it:
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=sk-fake python App.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("rest drink plenty of fluids and see a doctor if symptoms get worse "
+         "this is general information only").split()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=300.0, jitter_ms=0.0, tokens=100, token_ms=0.0, error_rate=0.0):
+        super().__init__(address, _Handler)
+        self.latency_ms = latency_ms    # before the first token
+        self.jitter_ms = jitter_ms      # +/- uniform jitter on latency_ms
+        self.tokens = tokens            # completion length
+        self.token_ms = token_ms        # time per generated token
+        self.error_rate = error_rate    # share of requests answered with HTTP 500
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return "http://%s:%d/v1" % (host, port)
+
+    def first_token_delay(self):
+        jitter = random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeOpenAIServer
+
+    def log_message(self, format, *args):
+        pass  # keep load-test output readable
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        with server._lock:
+            server.requests += 1
+
+        time.sleep(server.first_token_delay())
+        if server.error_rate and random.random() < server.error_rate:
+            self._json(500, {"error": {"message": "fake upstream error", "type": "server_error"}})
+            return
+
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        words = [WORDS[i % len(WORDS)] for i in range(server.tokens)]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+        completion_id = "chatcmpl-" + uuid.uuid4().hex[:12]
+        model = body.get("model", "fake")
+
+        if body.get("stream"):
+            self._stream(completion_id, model, words, usage,
+                         (body.get("stream_options") or {}).get("include_usage"))
+            return
+
+        time.sleep(server.token_ms * len(words) / 1000)
+        self._json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": " ".join(words)}}],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id, model, words, usage, include_usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def chunk(delta, finish=None, chunk_usage=None, choices=True):
+            data = {"id": completion_id, "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if choices else []}
+            if chunk_usage is not None:
+                data["usage"] = chunk_usage
+            self.wfile.write(b"data: " + json.dumps(data).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(words):
+                if i and self.server.token_ms:
+                    time.sleep(self.server.token_ms / 1000)
+                chunk({"content": word if i == 0 else " " + word})
+            chunk({}, finish="stop")
+            if include_usage:
+                chunk(None, chunk_usage=usage, choices=False)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up
+
+    def _json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start(host="127.0.0.1", port=0, **settings) -> FakeOpenAIServer:
+    """Starts the server in a background thread (port 0: any free port)."""
+    server = FakeOpenAIServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", type=float, default=300.0, help="ms before the first token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- ms on --latency")
+    parser.add_argument("--tokens", type=int, default=100, help="tokens per answer")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="ms per generated token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500 answers")
+
+
+def settings_from_args(args) -> dict:
+    return {"latency_ms": args.latency, "jitter_ms": args.jitter, "tokens": args.tokens,
+            "token_ms": args.token_ms, "error_rate": args.error_rate}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer((args.host, args.port), **settings_from_args(args))
+    print("✅ Fake OpenAI API on %s" % server.base_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# benchmarks/load_chat.py
+"""
+Load test for /api/chat and /api/chat/stream against a fake OpenAI server.
+
+By default this starts benchmarks.fake_openai and App.py (Flask, threaded
+server) in this process, then drives them with N concurrent clients and
+reports throughput and p50/p95/p99 latency (and time to first token for
+the stream endpoint). Every message is unique and matches nothing in the
+offline KB, so each request really goes to the (fake) LLM.
+
+Run from the repository root:
+    python -m benchmarks.load_chat
+    python -m benchmarks.load_chat --concurrency 1 8 32 --requests 200 --latency 300 --token-ms 5 --json out.json
+
+Against a server you started yourself (e.g. uvicorn async_app:app, with
+OPENAI_BASE_URL pointing at `python -m benchmarks.fake_openai`):
+    python -m benchmarks.load_chat --url http://127.0.0.1:5000
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fake_openai
+from benchmarks.common import percentiles, write_results
+
+QUESTIONS = [
+    "How many hours of sleep does an adult need",
+    "Is it fine to exercise every day",
+    "What is a balanced diet for a teenager",
+    "How often should I get a general health check up",
+]
+
+_counter = itertools.count()
+
+
+def next_message():
+    n = next(_counter)
+    # Unique text so the response cache never answers for the LLM
+    return "%s? (load test %d)" % (QUESTIONS[n % len(QUESTIONS)], n)
+
+
+def start_app(openai_base_url: str, cache_db: str) -> str:
+    """Serves App.py on a free local port; returns its base URL."""
+    os.environ["OPENAI_BASE_URL"] = openai_base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake-load-test")
+    os.environ["MEDIBOT_CACHE_DB"] = cache_db
+    os.environ["MEDIBOT_BATCH_RATE"] = "0"
+
+    from werkzeug.serving import make_server
+    import App
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log per request
+
+    server = make_server("127.0.0.1", 0, App.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app", daemon=True).start()
+    return "http://127.0.0.1:%d" % server.server_port
+
+
+def _post(url, payload, timeout):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def chat_once(base_url, timeout):
+    """(ok, latency seconds, None)"""
+    t0 = time.perf_counter()
+    try:
+        with _post(base_url + "/api/chat", {"message": next_message(), "language": "English"}, timeout) as resp:
+            data = json.loads(resp.read())
+            ok = resp.status == 200 and "error" not in data
+    except (urllib.error.URLError, OSError, ValueError):
+        ok = False
+    return ok, time.perf_counter() - t0, None
+
+
+def stream_once(base_url, timeout):
+    """(ok, latency seconds, time to first token seconds)"""
+    t0 = time.perf_counter()
+    first_token = None
+    ok = False
+    try:
+        with _post(base_url + "/api/chat/stream", {"message": next_message(), "language": "English"}, timeout) as resp:
+            event = None
+            for raw in resp:
+                line = raw.decode("utf-8").rstrip("\n")
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                    if event == "token" and first_token is None:
+                        first_token = time.perf_counter() - t0
+                    elif event == "done":
+                        ok = True
+                    elif event == "error":
+                        ok = False
+                        break
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return ok, time.perf_counter() - t0, first_token
+
+
+def run_level(fn, base_url, concurrency, requests, timeout):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda _: fn(base_url, timeout), range(requests)))
+    elapsed = time.perf_counter() - t0
+
+    latencies = [lat * 1000 for ok, lat, _ in outcomes if ok]
+    ttfts = [ttft * 1000 for ok, _, ttft in outcomes if ok and ttft is not None]
+    pct = percentiles(latencies)
+    row = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for ok, _, _ in outcomes if not ok),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": _round(pct["p50"]),
+        "p95_ms": _round(pct["p95"]),
+        "p99_ms": _round(pct["p99"]),
+    }
+    if ttfts:
+        ttft_pct = percentiles(ttfts, (50, 95))
+        row["ttft_p50_ms"] = _round(ttft_pct["p50"])
+        row["ttft_p95_ms"] = _round(ttft_pct["p95"])
+    return row
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="test this running server instead of starting App.py")
+    parser.add_argument("--mode", choices=["chat", "stream", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="also write results to this file")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args()
+
+    base_url = args.url
+    tmp = None
+    if not base_url:
+        fake = fake_openai.start(**fake_openai.settings_from_args(args))
+        tmp = tempfile.TemporaryDirectory()
+        base_url = start_app(fake.base_url, os.path.join(tmp.name, "cache.sqlite3"))
+        print("✅ Fake OpenAI on %s, app on %s" % (fake.base_url, base_url))
+
+    modes = ["chat", "stream"] if args.mode == "both" else [args.mode]
+    rows = []
+    try:
+        for mode in modes:
+            fn = chat_once if mode == "chat" else stream_once
+            fn(base_url, args.timeout)  # warm-up: builds the engine, opens the KB
+            for concurrency in args.concurrency:
+                row = dict(mode=mode, **run_level(fn, base_url, concurrency, args.requests, args.timeout))
+                rows.append(row)
+                print("%-6s c=%-4d %7.1f req/s  p50 %7.1f  p95 %7.1f  p99 %7.1f ms%s  errors %d" % (
+                    mode, concurrency, row["throughput_rps"], row["p50_ms"] or 0, row["p95_ms"] or 0,
+                    row["p99_ms"] or 0,
+                    "  ttft p50 %.1f ms" % row["ttft_p50_ms"] if "ttft_p50_ms" in row else "",
+                    row["errors"]))
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    if args.json:
+        params = dict(vars(args))
+        params.pop("json")
+        write_results(args.json, "load_chat", rows, params)
+
+
+if __name__ == "__main__":
+    main()
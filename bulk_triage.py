@@ -0,0 +1,287 @@
+# bulk_triage.py
+"""
+Offline symptom check over large message exports, for retrospective triage
+analysis: no LLM, no HTML, one JSON line per input record.
+
+Usage:
+    python bulk_triage.py messages.jsonl -o triage.jsonl
+    python bulk_triage.py export.csv.gz -o triage.jsonl --workers 8 --text-field body
+    python bulk_triage.py messages.jsonl -o triage.jsonl --resume    # after an interruption
+
+Input is JSONL (one object per line) or CSV with a header row, optionally
+gzipped, or "-" for JSONL on stdin. Each record needs a text field
+(--text-field, default "message"); --language-field ("language", default
+English) and --id-field ("id") are optional.
+
+Output lines are in input order:
+    {"offset": 0, "id": "...", "language": "English",
+     "matches": [{"id": "fever", "keywords": ["fever"], "score": 2.34}, ...],
+     "corrections": {"hedache": "headache"}}
+best match first (see medical_db.triage_batch). A record that cannot be
+read gets {"offset": ..., "error": "..."} instead. "offset" is the record's
+line (JSONL) or row (CSV) number in the input, counting from 0.
+
+Records are read as a stream and matched `--chunk` at a time on a pool of
+`--workers` processes; at most two chunks per worker are in flight, so
+memory stays flat however big the input is. Workers map the compiled KB
+file, so they share one copy of the indexes, and the KB is not reloaded
+during a run. Progress and throughput go to stderr.
+
+--resume continues an interrupted run: the output's last complete line
+says where it stopped, a half-written line after it is cut off, and new
+lines are appended. --start N skips the first N records instead.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_CHUNK = 2000
+PROGRESS_INTERVAL = 5.0
+
+# The run uses one KB version throughout; set before medical_db is imported
+os.environ.setdefault("MEDIBOT_KB_CHECK_INTERVAL", "0")
+
+
+# ---------- INPUT ----------
+def _open_text(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def input_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.lower().endswith(".csv") else "jsonl"
+
+
+def read_records(path: str, fmt: str = None, start: int = 0):
+    """
+    (offset, record) for every record from `start` on. JSONL records are
+    the raw lines (workers decode them); CSV records are row dicts.
+    """
+    fmt = fmt or input_format(path)
+    with _open_text(path) as f:
+        if fmt == "csv":
+            for offset, row in enumerate(csv.DictReader(f)):
+                if offset >= start:
+                    yield offset, row
+        else:
+            for offset, line in enumerate(f):
+                if offset >= start and line.strip():
+                    yield offset, line
+
+
+# ---------- WORKERS ----------
+def _field(record, name, default=None):
+    value = record.get(name) if name else None
+    return default if value is None or value == "" else value
+
+
+def triage_chunk(records, fields, top_k=None):
+    """
+    Runs in a worker: [(offset, record)] -> (output lines, records, matched, errors).
+    fields: (text field, language field, id field).
+    """
+    from medical_db import triage_batch
+
+    text_field, language_field, id_field = fields
+    rows, items = [], []
+    errors = 0
+    for offset, record in records:
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            if not isinstance(record, dict):
+                raise ValueError("not an object")
+            text = _field(record, text_field)
+            if not isinstance(text, str):
+                raise ValueError("no %r text" % text_field)
+        except ValueError as e:
+            rows.append({"offset": offset, "error": str(e)})
+            errors += 1
+            continue
+        row = {
+            "offset": offset,
+            "id": _field(record, id_field),
+            "language": str(_field(record, language_field, "English")),
+        }
+        rows.append(row)
+        items.append((row, text))
+
+    matched = 0
+    results = triage_batch([(text, row["language"]) for row, text in items], top_k)
+    for (row, _), result in zip(items, results):
+        row.update(result)
+        matched += bool(result["matches"])
+
+    out = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    return out, len(rows), matched, errors
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------- OUTPUT ----------
+def resume_offset(path: str) -> int:
+    """
+    Input offset after the last complete line of an earlier run's output
+    (0 if there is none). A half-written line after it is cut off.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r+b") as f:
+        end = pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        # Read back until the last complete line is in `tail`
+        while pos > 0 and tail.count(b"\n") < 2:
+            step = min(1 << 16, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+        lines = tail.split(b"\n")
+        partial = lines.pop()
+        if partial:
+            f.truncate(end - len(partial))
+        last = lines[-1] if lines and (len(lines) > 1 or pos == 0) else b""
+    if not last.strip():
+        return 0
+    try:
+        return json.loads(last)["offset"] + 1
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("%s: last line is not bulk_triage output, cannot resume" % path)
+
+
+class _Progress:
+    def __init__(self, start, interval):
+        self.start = start
+        self.interval = interval
+        self.t0 = time.perf_counter()
+        self.next_report = self.t0 + interval
+        self.records = self.matched = self.errors = 0
+        self.offset = start
+
+    def add(self, records, matched, errors, offset):
+        self.records += records
+        self.matched += matched
+        self.errors += errors
+        self.offset = offset
+        now = time.perf_counter()
+        if self.interval and now >= self.next_report:
+            self.next_report = now + self.interval
+            print("📊 %d records, %.0f/s, %d errors, at offset %d" % (
+                self.records, self.records / (now - self.t0), self.errors, offset), file=sys.stderr)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.t0
+        return {
+            "records": self.records,
+            "matched": self.matched,
+            "errors": self.errors,
+            "start_offset": self.start,
+            "next_offset": self.offset,
+            "elapsed_s": round(elapsed, 3),
+            "records_per_s": round(self.records / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+# ---------- RUN ----------
+def run(input_path: str, output_path: str, workers: int = None, chunk: int = DEFAULT_CHUNK,
+        start: int = 0, resume: bool = False, fmt: str = None, fields=("message", "language", "id"),
+        top_k: int = None, progress: float = PROGRESS_INTERVAL) -> dict:
+    """
+    Triage every record of `input_path` into `output_path` ("-" for stdout).
+    workers: processes (default: CPU count); 1 runs in this process.
+    Returns counts, offsets and throughput.
+    """
+    workers = workers or os.cpu_count() or 1
+    if resume and output_path != "-":
+        start = max(start, resume_offset(output_path))
+
+    from medical_db import current_kb
+    kb_version = current_kb().version
+
+    if output_path == "-":
+        out = sys.stdout
+    else:
+        out = open(output_path, "a" if resume else "w", encoding="utf-8", newline="\n")
+    stats = _Progress(start, progress)
+    chunks = _chunks(read_records(input_path, fmt, start), chunk)
+    try:
+        if workers == 1:
+            for part in chunks:
+                text, records, matched, errors = triage_chunk(part, fields, top_k)
+                out.write(text)
+                stats.add(records, matched, errors, part[-1][0] + 1)
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                pending = deque()
+                for part in chunks:
+                    pending.append((pool.submit(triage_chunk, part, fields, top_k), part[-1][0] + 1))
+                    # Bounded memory: wait for the oldest chunk before reading further
+                    while len(pending) >= 2 * workers:
+                        _write(out, stats, *pending.popleft())
+                while pending:
+                    _write(out, stats, *pending.popleft())
+    finally:
+        out.flush()
+        if out is not sys.stdout:
+            out.close()
+
+    return dict(stats.summary(), workers=workers, chunk=chunk, kb_version=kb_version)
+
+
+def _write(out, stats, future, next_offset):
+    text, records, matched, errors = future.result()
+    out.write(text)
+    stats.add(records, matched, errors, next_offset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline symptom check over a JSONL/CSV export, to JSONL.")
+    parser.add_argument("input", help='JSONL or CSV file (.gz ok), or "-" for JSONL on stdin')
+    parser.add_argument("-o", "--output", default="-", help="JSONL output (default: stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="input format (default: from the file name)")
+    parser.add_argument("--workers", type=int, help="processes (default: CPU count)")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="records per task")
+    parser.add_argument("--top-k", type=int, default=0, help="matches kept per record (default: all)")
+    parser.add_argument("--text-field", default="message")
+    parser.add_argument("--language-field", default="language")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--start", type=int, default=0, help="skip the first N records")
+    parser.add_argument("--resume", action="store_true", help="continue after the output's last line")
+    parser.add_argument("--progress", type=float, default=PROGRESS_INTERVAL,
+                        help="seconds between progress lines, 0 for none")
+    args = parser.parse_args()
+
+    try:
+        summary = run(args.input, args.output, args.workers, max(1, args.chunk), args.start, args.resume,
+                      args.format, (args.text_field, args.language_field, args.id_field),
+                      args.top_k or None, args.progress)
+    except (OSError, ValueError) as e:
+        print("❌", e, file=sys.stderr)
+        sys.exit(1)
+
+    print("✅ %d records in %.1f s (%.0f/s, %d workers), %d matched, %d errors; next offset %d" % (
+        summary["records"], summary["elapsed_s"], summary["records_per_s"], summary["workers"],
+        summary["matched"], summary["errors"], summary["next_offset"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# chat_batch.py
+"""
+/api/chat/batch, shared by App.py (Flask) and async_app.py (Quart).
+
+Request body:
+    {"items": [{"message": "...", "language": "Hindi", "id": "optional"}, ...],
+     "concurrency": 4,     optional, capped at MEDIBOT_BATCH_CONCURRENCY
+     "stream": true}       optional, see below
+
+Every item gets a result:
+    {"index": 0, "id": ..., "reply": "...", "offline": "...", "error": null}
+When an item failed, "reply" is null and "error" says why, e.g.
+{"kind": "timeout", "message": "...", "retryable": true, "attempts": 3}
+(see llm_transport.MediAIError); the rest of the batch is unaffected.
+
+Without "stream" the response is {"results": [...in request order...],
+"count", "errors", "total_ms"}. With "stream": true it is NDJSON: one result
+line per item as soon as it completes (use "index" to put them back in
+order), then a final {"done": true, "count", "errors", "total_ms"} line.
+
+The offline check runs over the whole batch at once; LLM calls fan out with
+at most `concurrency` in flight, and no faster than MEDIBOT_BATCH_RATE calls
+per second across all batches in this process. Each call also takes a LOW
+admission slot (see admission.py), so a batch never crowds out live chats.
+
+Settings (environment variables):
+    MEDIBOT_BATCH_MAX_ITEMS    items per request (default 500)
+    MEDIBOT_BATCH_CONCURRENCY  LLM calls in flight per batch (default 8)
+    MEDIBOT_BATCH_RATE         LLM calls per second, 0 for no limit (default 10)
+"""
+import asyncio
+import os
+import time
+
+from admission import LOW
+from llm_transport import BAD_REQUEST, MediAIError
+from medical_db import analyze_symptoms_batch
+from rate_limiter import RateLimiter
+
+MAX_ITEMS = int(os.getenv("MEDIBOT_BATCH_MAX_ITEMS", "500"))
+MAX_CONCURRENCY = int(os.getenv("MEDIBOT_BATCH_CONCURRENCY", "8"))
+RATE = float(os.getenv("MEDIBOT_BATCH_RATE", "10"))
+
+EMPTY_MESSAGE = MediAIError(BAD_REQUEST, "empty message", message="Empty message.")
+
+# Shared by every batch in this process
+rate_limiter = RateLimiter(RATE)
+
+
+def parse_batch_request(data):
+    """Returns (items, concurrency, stream). Raises ValueError for a bad request."""
+    if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+        raise ValueError('Expected a JSON object with an "items" list.')
+    if not data["items"]:
+        raise ValueError("No items.")
+    if len(data["items"]) > MAX_ITEMS:
+        raise ValueError("Too many items (max %d)." % MAX_ITEMS)
+
+    items = []
+    for raw in data["items"]:
+        if isinstance(raw, str):
+            raw = {"message": raw}
+        if not isinstance(raw, dict):
+            raise ValueError("Each item must be a string or an object.")
+        items.append({
+            "id": raw.get("id"),
+            "message": str(raw.get("message") or "").strip(),
+            "language": str(raw.get("language") or "English").strip() or "English",
+        })
+
+    try:
+        concurrency = int(data.get("concurrency") or MAX_CONCURRENCY)
+    except (TypeError, ValueError):
+        raise ValueError('"concurrency" must be a number.')
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    return items, concurrency, bool(data.get("stream"))
+
+
+def _call_engine(ai_call):
+    """The engine's batch_response, or the MediAIError building the engine raised (no API key)."""
+    try:
+        return ai_call(), None
+    except MediAIError as e:
+        return None, e
+
+
+def _result(index, item, offline, reply, error):
+    return {
+        "index": index,
+        "id": item["id"],
+        "reply": reply,
+        "offline": offline,
+        "error": error.to_dict() if error is not None else None,
+    }
+
+
+def summary(count, errors, t0):
+    return {"count": count, "errors": errors, "total_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def iter_results(ai, items, concurrency, admission=None):
+    """
+    Yields one result per item, in completion order (for MediAI).
+    admission: the app's AdmissionController; LLM calls queue there as LOW.
+    """
+    offline, matches = analyze_symptoms_batch([(it["message"], it["language"]) for it in items], with_counts=True)
+    todo = [i for i, it in enumerate(items) if it["message"]]
+    for i, item in enumerate(items):
+        if not item["message"]:
+            yield _result(i, item, offline[i], None, EMPTY_MESSAGE)
+
+    answers, error = _call_engine(lambda: ai.batch_response(
+        # The match counts spare the model policy from matching each message again
+        [(items[i]["message"], items[i]["language"], matches[i]) for i in todo],
+        concurrency=concurrency, rate_limiter=rate_limiter, admission=admission, priority=LOW,
+    ))
+    if error is not None:
+        for i in todo:
+            yield _result(i, items[i], offline[i], None, error)
+        return
+    try:
+        for j, reply, error in answers:
+            i = todo[j]
+            yield _result(i, items[i], offline[i], reply, error)
+    finally:
+        answers.close()  # client went away: drop the calls not started yet
+
+
+async def aiter_results(ai, items, concurrency, timeout=None, admission=None):
+    """
+    Async version of iter_results, for a LazyEngine of AsyncMediAI; `timeout`
+    is per item. The engine is built in a worker thread if it is not yet.
+    """
+    offline, matches = await asyncio.to_thread(
+        analyze_symptoms_batch, [(it["message"], it["language"]) for it in items], with_counts=True
+    )
+    todo = [i for i, it in enumerate(items) if it["message"]]
+    for i, item in enumerate(items):
+        if not item["message"]:
+            yield _result(i, item, offline[i], None, EMPTY_MESSAGE)
+
+    answers, error = None, None
+    try:
+        engine = await ai.aget()
+        answers = engine.batch_response(
+            [(items[i]["message"], items[i]["language"], matches[i]) for i in todo],
+            concurrency=concurrency, rate_limiter=rate_limiter, timeout=timeout,
+            admission=admission, priority=LOW,
+        )
+    except MediAIError as e:
+        error = e
+    if error is not None:
+        for i in todo:
+            yield _result(i, items[i], offline[i], None, error)
+        return
+    try:
+        async for j, reply, error in answers:
+            i = todo[j]
+            yield _result(i, items[i], offline[i], reply, error)
+    finally:
+        await answers.aclose()
@@ -0,0 +1,402 @@
+# chat_view.py
+"""
+Chat history for the desktop UI, as a model/view list.
+
+A QTextEdit keeps every message of a session in one document, so appends,
+scrolling and memory all grow with the conversation. Here each message is a
+row in ChatModel, drawn by ChatDelegate, and QListView only paints the rows
+on screen. At most MEDIBOT_CHAT_MAX_MESSAGES rows stay in memory; older ones
+are written to a JSON-lines archive on disk and read back a page at a time
+when the user scrolls to the top. Scrolling further back drops the newest
+rows the same way, and they are read back when the user scrolls down again.
+
+Settings (environment variables):
+    MEDIBOT_CHAT_MAX_MESSAGES  messages kept in memory (default 300)
+    MEDIBOT_CHAT_PAGE          messages reloaded per scroll to the top (default 50)
+    MEDIBOT_CHAT_ARCHIVE       archive file to keep; by default a temporary
+                               file that is deleted on exit
+"""
+import atexit
+import html
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSize, Qt, QTimer
+from PyQt5.QtGui import QTextDocument
+from PyQt5.QtWidgets import QAbstractItemView, QApplication, QListView, QMenu, QStyle, QStyledItemDelegate
+
+MessageRole = Qt.UserRole + 1
+
+# Laid-out documents kept by the delegate; enough for several screens
+DOCUMENT_CACHE_SIZE = 256
+# Lower bound for the in-memory cap, so a streaming reply is never archived
+MIN_MESSAGES = 20
+
+
+class ChatMessage:
+    """
+    One row: "<sender_html> <body_html><plain>". `plain` is streamed text,
+    escaped when drawn; while `placeholder` is set, the first write replaces it.
+    """
+    __slots__ = ("id", "sender_html", "body_html", "plain", "placeholder", "version", "height")
+
+    def __init__(self, sender_html, body_html="", plain="", placeholder=False):
+        self.id = -1          # position in the whole conversation, set by ChatModel
+        self.sender_html = sender_html
+        self.body_html = body_html
+        self.plain = plain
+        self.placeholder = placeholder
+        self.version = 0      # bumped on every change, for the delegate's cache
+        self.height = None    # (version, width, pixels), cached by the delegate
+
+    def to_html(self):
+        plain = html.escape(self.plain).replace("\n", "<br>")
+        return "<p>%s %s%s</p>" % (self.sender_html, self.body_html, plain)
+
+    def to_dict(self):
+        return {"sender_html": self.sender_html, "body_html": self.body_html, "plain": self.plain}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["sender_html"], data["body_html"], data["plain"])
+
+
+class ChatArchive:
+    """Append-only JSON-lines file of messages, readable by position."""
+
+    def __init__(self, path=None):
+        self.temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="medibot_chat_", suffix=".jsonl")
+            os.close(fd)
+            atexit.register(self.close)
+        self.path = path
+        self._file = open(path, "w+b")
+        self._offsets = []  # byte offset of each message
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def append(self, messages):
+        self._file.seek(0, os.SEEK_END)
+        for msg in messages:
+            self._offsets.append(self._file.tell())
+            self._file.write(json.dumps(msg.to_dict(), ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.flush()
+
+    def read(self, start, stop):
+        """Messages start..stop-1."""
+        if start >= stop:
+            return []
+        self._file.seek(self._offsets[start])
+        return [ChatMessage.from_dict(json.loads(self._file.readline())) for _ in range(stop - start)]
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.temporary:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class ChatModel(QAbstractListModel):
+    """
+    A window of the conversation: messages `start`.. are in memory, all
+    earlier ones are in the archive (which may also hold some in memory).
+    While the window is scrolled back from the newest messages, the ones
+    after it are in the archive, except the newest few, which wait in
+    `_live` (a reply may still be streaming into them).
+    """
+
+    def __init__(self, max_messages=300, page=50, archive_path=None, parent=None):
+        super().__init__(parent)
+        self.max_messages = max(MIN_MESSAGES, max_messages)
+        self.page = max(1, page)
+        self.archive = ChatArchive(archive_path)
+        self.start = 0        # id of the first row in memory
+        self._rows = []
+        self._live = []       # newest messages, while the window ends before them
+        self._next_id = 0
+
+    @classmethod
+    def from_env(cls, parent=None):
+        return cls(
+            max_messages=int(os.getenv("MEDIBOT_CHAT_MAX_MESSAGES", "300")),
+            page=int(os.getenv("MEDIBOT_CHAT_PAGE", "50")),
+            archive_path=os.getenv("MEDIBOT_CHAT_ARCHIVE") or None,
+            parent=parent,
+        )
+
+    # ---------- QAbstractListModel ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        msg = self._rows[index.row()]
+        if role == MessageRole:
+            return msg
+        if role == Qt.DisplayRole:
+            return to_plain_text(msg.to_html())
+        return None
+
+    # ---------- MESSAGES ----------
+    def message(self, row):
+        return self._rows[row]
+
+    @property
+    def has_older(self):
+        return self.start > 0
+
+    @property
+    def has_newer(self):
+        return bool(self._live)
+
+    @property
+    def _limit(self):
+        return self.max_messages + self.page
+
+    def append(self, msg):
+        row = len(self._rows)
+        msg.id = self._next_id
+        self._next_id += 1
+        if self._live:
+            # Not on screen until the window is back at the newest messages
+            self._live.append(msg)
+            extra = len(self._live) - MIN_MESSAGES
+            if extra > 0:
+                self.archive.append(self._live[:extra])
+                del self._live[:extra]
+            return msg
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.append(msg)
+        self.endInsertRows()
+        if len(self._rows) > self._limit:
+            self.trim()
+        return msg
+
+    def write(self, msg, text):
+        """Streams text into msg; returns its index, or None if it is no longer in memory."""
+        if msg.placeholder:
+            msg.plain, msg.placeholder = text, False
+        else:
+            msg.plain += text
+        msg.version += 1
+        row = msg.id - self.start
+        if not 0 <= row < len(self._rows) or self._rows[row] is not msg:
+            return None
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return index
+
+    def trim(self):
+        """Moves the oldest rows out of memory, down to max_messages."""
+        drop = len(self._rows) - self.max_messages
+        if drop <= 0:
+            return
+        # Rows reloaded from the archive are already there
+        first_new = len(self.archive) - self.start
+        if first_new < drop:
+            self.archive.append(self._rows[max(0, first_new):drop])
+        self.beginRemoveRows(QModelIndex(), 0, drop - 1)
+        del self._rows[:drop]
+        self.start += drop
+        self.endRemoveRows()
+
+    def load_older(self):
+        """Reads the previous page back from the archive; returns how many rows were added."""
+        count = min(self.page, self.start)
+        if not count:
+            return 0
+        older = self.archive.read(self.start - count, self.start)
+        for i, msg in enumerate(older):
+            msg.id = self.start - count + i
+        self.beginInsertRows(QModelIndex(), 0, count - 1)
+        self._rows[:0] = older
+        self.start -= count
+        self.endInsertRows()
+        if len(self._rows) > self._limit:
+            self._drop_newest(len(self._rows) - self.max_messages)
+        return count
+
+    def _drop_newest(self, count):
+        keep = len(self._rows) - count
+        if not self._live:
+            # Leaving the newest messages: archive what is not there yet,
+            # except the newest few, which wait in memory
+            first_new = len(self.archive) - self.start
+            live_from = max(keep, len(self._rows) - MIN_MESSAGES, first_new)
+            if first_new < live_from:
+                self.archive.append(self._rows[max(0, first_new):live_from])
+            self._live = self._rows[live_from:]
+        self.beginRemoveRows(QModelIndex(), keep, len(self._rows) - 1)
+        del self._rows[keep:]
+        self.endRemoveRows()
+
+    def load_newer(self):
+        """Reads the next page back after the window; returns how many rows were added."""
+        if not self._live:
+            return 0
+        end = self.start + len(self._rows)
+        count = min(self.page, self._live[0].id - end)
+        if count:
+            newer = self.archive.read(end, end + count)
+            for i, msg in enumerate(newer):
+                msg.id = end + i
+        else:
+            # Back at the newest messages
+            newer, self._live = self._live, []
+        row = len(self._rows)
+        self.beginInsertRows(QModelIndex(), row, row + len(newer) - 1)
+        self._rows.extend(newer)
+        self.endInsertRows()
+        if len(self._rows) > self._limit:
+            self.trim()
+        return len(newer)
+
+
+def to_plain_text(markup):
+    doc = QTextDocument()
+    doc.setHtml(markup)
+    return doc.toPlainText()
+
+
+class ChatDelegate(QStyledItemDelegate):
+    """Draws a message as rich text, wrapped to the view's width."""
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self._documents = OrderedDict()  # message id -> (version, width, QTextDocument)
+
+    def _document(self, msg, width):
+        cached = self._documents.get(msg.id)
+        if cached is not None and cached[0] == msg.version and cached[1] == width:
+            self._documents.move_to_end(msg.id)
+            return cached[2]
+        doc = QTextDocument()
+        doc.setDefaultFont(self.view.font())
+        doc.setDocumentMargin(6)
+        doc.setHtml(msg.to_html())
+        doc.setTextWidth(width)
+        self._documents[msg.id] = (msg.version, width, doc)
+        self._documents.move_to_end(msg.id)
+        if len(self._documents) > DOCUMENT_CACHE_SIZE:
+            self._documents.popitem(last=False)
+        return doc
+
+    def sizeHint(self, option, index):
+        # Called for every row on each layout, so the height is kept on the
+        # message and the model is read directly rather than through data()
+        msg = self.view.chat_model.message(index.row())
+        width = self.view.content_width
+        height = msg.height
+        if height is None or height[0] != msg.version or height[1] != width:
+            height = msg.height = (msg.version, width, int(self._document(msg, width).size().height()))
+        return QSize(width, height[2])
+
+    def paint(self, painter, option, index):
+        doc = self._document(index.data(MessageRole), self.view.content_width)
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.alternateBase())
+        painter.translate(option.rect.topLeft())
+        painter.setClipRect(0, 0, option.rect.width(), option.rect.height())
+        doc.drawContents(painter)
+        painter.restore()
+
+
+class ChatView(QListView):
+    """
+    The chat list. Follows new messages while scrolled to the bottom, and
+    reloads archived messages when scrolled to the top.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.chat_model = ChatModel.from_env(self)
+        self.delegate = ChatDelegate(self)
+        self.setModel(self.chat_model)
+        self.setItemDelegate(self.delegate)
+
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust)   # re-wrap messages on resize
+        self.setUniformItemSizes(False)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setWordWrap(True)
+        self.setSpacing(2)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._context_menu)
+
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+        # scrollToBottom() lays out all rows at once, so it runs at most once per event loop pass
+        self._scroll_pending = False
+        self.content_width = 50  # wrap width for messages; kept up to date in resizeEvent
+
+    def add_message(self, msg):
+        follow = self._following()
+        self.chat_model.append(msg)
+        if follow:
+            self._scroll_to_bottom_later()
+        return msg
+
+    def write(self, msg, text):
+        follow = self._following()
+        index = self.chat_model.write(msg, text)
+        if index is not None:
+            # Its height may have changed: lay the rows out again
+            self.delegate.sizeHintChanged.emit(index)
+            if follow:
+                self._scroll_to_bottom_later()
+
+    def _following(self):
+        """Showing the newest messages? Then new text scrolls into view; otherwise the view stays put."""
+        return (self._at_bottom() or self._scroll_pending) and not self.chat_model.has_newer
+
+    def _scroll_to_bottom_later(self):
+        if not self._scroll_pending:
+            self._scroll_pending = True
+            QTimer.singleShot(0, self._scroll_to_bottom)
+
+    def _scroll_to_bottom(self):
+        self._scroll_pending = False
+        self.scrollToBottom()
+
+    def resizeEvent(self, event):
+        self.content_width = max(50, self.viewport().width() - 2 * self.spacing())
+        super().resizeEvent(event)
+
+    def _at_bottom(self):
+        bar = self.verticalScrollBar()
+        return bar.value() >= bar.maximum() - 4
+
+    def _on_scroll(self, value):
+        bar = self.verticalScrollBar()
+        model = self.chat_model
+        if value == bar.minimum() and model.has_older:
+            added = model.load_older()
+            if added:
+                # Keep the message that was at the top where it was
+                self.scrollTo(model.index(added), QAbstractItemView.PositionAtTop)
+        elif value == bar.maximum() and model.has_newer and model.rowCount():
+            last = model.message(model.rowCount() - 1)
+            if model.load_newer():
+                # Keep the message that was at the bottom where it was
+                self.scrollTo(model.index(last.id - model.start), QAbstractItemView.PositionAtBottom)
+
+    def _context_menu(self, pos):
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return
+        menu = QMenu(self)
+        menu.addAction("Copy", lambda: QApplication.clipboard().setText(index.data(Qt.DisplayRole)))
+        menu.exec_(self.viewport().mapToGlobal(pos))
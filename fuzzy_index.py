@@ -0,0 +1,283 @@
+# fuzzy_index.py
+"""
+Typo-tolerant lookup of KB keyword words ("diarhea" -> "diarrhea").
+
+Symmetric-delete index: every keyword word is stored under each string
+obtainable by deleting up to N of its characters. A typed word is looked up
+under its own deletions, and any two words within edit distance N share
+one of them, so a lookup is a few dozen hash probes whatever the size of
+the KB. Candidates are then checked with the real edit distance. Since a
+correction must keep the first letter (below), the first letter is never
+deleted, which keeps both the index and the probes smaller.
+
+The tables are built by kb_compiler and read from the mapped KB file:
+    fz.word_start  uint32[n + 1]  offsets into fz.words (UTF-8)
+    fz.keys        uint32         crc32 of each deletion, sorted
+    fz.vals        uint32         word id for each key
+
+How far a word may be from what was typed depends on its length, so short
+words are not "corrected" into other short words:
+    fewer than MIN_WORD_LEN characters   exact only
+    fewer than LONG_WORD_LEN characters  1 edit
+    longer                               2 edits (MAX_DISTANCE)
+and the first letter must match ("fevr" -> "fever", but not "dose" -> "nose").
+"""
+import zlib
+from array import array
+from bisect import bisect_left
+
+from symptom_matcher import is_word_char
+
+MAX_DISTANCE = 2
+MIN_WORD_LEN = 4
+LONG_WORD_LEN = 8
+
+TABLE_NAMES = ("fz.word_start", "fz.keys", "fz.vals")
+
+# Looked-up tokens remembered per index; users keep typing the same words
+LOOKUP_CACHE_SIZE = 4096
+
+# Everyday words that sit one edit away from symptom words ("fewer"/"fever")
+COMMON_WORDS = frozenset("""
+have having feel feeling felt fewer getting since with from very some also this that these those
+after before could would should does doing done been being were there their they them then
+than what when where which while will just like much more most only over same such take
+taking today yesterday night morning days week weeks month still every
+""".split())
+
+
+def allowed_distance(length: int, max_distance: int = MAX_DISTANCE) -> int:
+    if length < MIN_WORD_LEN:
+        return 0
+    return min(max_distance, 1 if length < LONG_WORD_LEN else 2)
+
+
+def deletes(word: str, depth: int):
+    """`word` and every string made by deleting up to `depth` (<= 2) characters after the first."""
+    found = {word}
+    n = len(word)
+    if depth >= 1 and n > 1:
+        found.update([word[:i] + word[i + 1:] for i in range(1, n)])
+    if depth >= 2 and n > 2:
+        found.update([word[:i] + word[i + 1:j] + word[j + 1:] for i in range(1, n) for j in range(i + 1, n)])
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (a swap counts as 1); limit + 1 if above limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        cur = [i] * (len(b) + 1)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            d = prev[j - 1] if ca == b[j - 1] else prev[j - 1] + 1
+            if prev[j] + 1 < d:
+                d = prev[j] + 1
+            if cur[j - 1] + 1 < d:
+                d = cur[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1] and prev2[j - 2] + 1 < d:
+                d = prev2[j - 2] + 1
+            cur[j] = d
+            if d < row_min:
+                row_min = d
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return min(prev[-1], limit + 1)
+
+
+def _hash(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def split_words(text: str):
+    """(start, end) of each run of word characters."""
+    spans = []
+    start = None
+    for i, ch in enumerate(text):
+        if is_word_char(ch):
+            if start is None:
+                start = i
+        elif start is not None:
+            spans.append((start, i))
+            start = None
+    if start is not None:
+        spans.append((start, len(text)))
+    return spans
+
+
+def delete_hashes(word: str, max_distance: int = MAX_DISTANCE):
+    """The index keys of one word."""
+    return array("I", [_hash(v) for v in deletes(word, allowed_distance(len(word), max_distance))])
+
+
+def build_tables(words, max_distance: int = MAX_DISTANCE, memo=None):
+    """
+    Index over `words`. Returns (tables, word_blob) for FuzzyIndex.
+    memo: optional {word: delete_hashes(word)} dict, filled in and reused
+    between builds with the same max_distance (hashing is most of the cost).
+    """
+    words = sorted({w.lower() for w in words if w})
+    if memo is None:
+        memo = {}
+    # key << 32 | word id, so one integer sort orders keys and their postings
+    entries = []
+    for word_id, word in enumerate(words):
+        hashes = memo.get(word)
+        if hashes is None:
+            hashes = memo[word] = delete_hashes(word, max_distance)
+        entries.extend([h << 32 | word_id for h in hashes])
+    entries.sort()
+
+    tables = {name: array("I") for name in TABLE_NAMES}
+    blob = bytearray()
+    for word in words:
+        tables["fz.word_start"].append(len(blob))
+        blob += word.encode("utf-8")
+    tables["fz.word_start"].append(len(blob))
+    tables["fz.keys"].extend([e >> 32 for e in entries])
+    tables["fz.vals"].extend([e & 0xFFFFFFFF for e in entries])
+    return tables, bytes(blob)
+
+
+class FuzzyIndex:
+    """
+    Lookup over build_tables() output. Tables can be any uint32 sequences,
+    typically memoryviews over the mapped KB file. Words in `exclude` are
+    never returned.
+    """
+
+    def __init__(self, tables, word_blob, exclude=frozenset()):
+        self._word_start = tables["fz.word_start"]
+        self._keys = tables["fz.keys"]
+        self._vals = tables["fz.vals"]
+        self._blob = word_blob
+        self._exclude = exclude
+        self._lookups = {}  # (token, max_distance) -> lookup() result
+
+    @classmethod
+    def from_words(cls, words, max_distance: int = MAX_DISTANCE):
+        return cls(*build_tables(words, max_distance))
+
+    def __len__(self):
+        return len(self._word_start) - 1
+
+    def word(self, word_id: int) -> str:
+        a, b = self._word_start[word_id], self._word_start[word_id + 1]
+        return bytes(self._blob[a:b]).decode("utf-8")
+
+    def _candidates(self, variant):
+        keys, vals = self._keys, self._vals
+        key = _hash(variant)
+        j = bisect_left(keys, key)
+        n = len(keys)
+        found = []
+        while j < n and keys[j] == key:
+            found.append(vals[j])
+            j += 1
+        return found
+
+    def clear_cache(self):
+        self._lookups.clear()
+
+    def lookup(self, token: str, max_distance: int = MAX_DISTANCE):
+        """(closest word, distance) for a lower-case token, or None."""
+        if len(token) < MIN_WORD_LEN:
+            return None
+        key = (token, max_distance)
+        try:
+            return self._lookups[key]
+        except KeyError:
+            pass
+        found = self._lookup(token, max_distance)
+        if len(self._lookups) >= LOOKUP_CACHE_SIZE:
+            self._lookups.clear()
+        self._lookups[key] = found
+        return found
+
+    def _lookup(self, token, max_distance):
+        if token not in self._exclude:
+            for word_id in self._candidates(token):
+                if self.word(word_id) == token:
+                    return token, 0
+        # Words within reach are at most max_distance longer than the token
+        depth = allowed_distance(len(token) + max_distance, max_distance)
+        best = None
+        seen = set()
+        for variant in deletes(token, depth):
+            for word_id in self._candidates(variant):
+                if word_id in seen:
+                    continue
+                seen.add(word_id)
+                word = self.word(word_id)
+                if word[0] != token[0] or word in self._exclude:
+                    continue
+                limit = allowed_distance(len(word), max_distance)
+                distance = edit_distance(token, word, limit)
+                if distance > limit:
+                    continue
+                if distance == 0:
+                    return word, 0
+                if best is None or (distance, word) < (best[1], best[0]):
+                    best = (word, distance)
+        return best
+
+    def correct(self, text: str, max_distance: int = MAX_DISTANCE):
+        """
+        (corrected lower-case text, {typed word: correction}). Words that are
+        exact keyword words, everyday words, or too short are left alone.
+        """
+        text = text.lower()
+        if max_distance <= 0:
+            return text, {}
+        corrections = {}
+        parts = []
+        last = 0
+        for start, end in split_words(text):
+            token = text[start:end]
+            if len(token) < MIN_WORD_LEN or token in COMMON_WORDS or any(ch.isdigit() for ch in token):
+                continue
+            fix = corrections.get(token)
+            if fix is None:
+                found = self.lookup(token, max_distance)
+                if found is None or found[1] == 0:
+                    continue
+                fix = corrections[token] = found[0]
+            parts.append(text[last:start])
+            parts.append(fix)
+            last = end
+        if not corrections:
+            return text, {}
+        parts.append(text[last:])
+        return "".join(parts), corrections
+
+
+class StackedFuzzyIndex(FuzzyIndex):
+    """
+    Lookup over several FuzzyIndexes at once (a KB's base index and its
+    patch), with the same result as one index over all of their words.
+    """
+
+    def __init__(self, indexes):
+        self._indexes = list(indexes)
+        self._lookups = {}
+
+    def __len__(self):
+        return sum(len(index) for index in self._indexes)
+
+    def clear_cache(self):
+        self._lookups.clear()
+        for index in self._indexes:
+            index.clear_cache()
+
+    def _lookup(self, token, max_distance):
+        best = None
+        for index in self._indexes:
+            found = index.lookup(token, max_distance)
+            if found is not None and (best is None or (found[1], found[0]) < (best[1], best[0])):
+                best = found
+        return best
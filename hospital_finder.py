@@ -1,39 +1,306 @@
 # hospital_finder.py
+"""
+Finds hospitals near the user.
+
+The hospital list (geo/hospitals.csv) is loaded into a KD-tree
+(spatial_index.py), so the k nearest hospitals to any point are found in
+well under a millisecond, offline. A place table (geo/places.csv) turns a
+city name or pincode into coordinates, and IP geolocation (ipinfo.io) is
+cached for MEDIBOT_GEOIP_TTL seconds so repeated clicks do not go back to
+the network.
+
+Searches reach MEDIBOT_HOSPITAL_MAX_KM (default 100 km) unless the caller
+gives another max_km; with nothing that close, the result says how far the
+nearest known hospital is instead of listing hospitals hours away.
+
+The bundled lists are a starting set with approximate coordinates; point
+MEDIBOT_HOSPITALS_CSV / MEDIBOT_PLACES_CSV at fuller files with the same
+columns.
+"""
+import csv
+import html
+import os
+import sys
+import threading
+import time
 import webbrowser
-import requests
+
+from spatial_index import KDTree
 
 IPINFO_URL = "https://ipinfo.io/json"
 
-def open_hospitals_near(location: str) -> str:
+_BASE_DIR = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+HOSPITALS_CSV = os.getenv("MEDIBOT_HOSPITALS_CSV", os.path.join(_BASE_DIR, "geo", "hospitals.csv"))
+PLACES_CSV = os.getenv("MEDIBOT_PLACES_CSV", os.path.join(_BASE_DIR, "geo", "places.csv"))
+
+GEOIP_TTL = float(os.getenv("MEDIBOT_GEOIP_TTL", "3600"))
+GEOIP_FAILURE_TTL = 60.0  # don't retry a failed lookup on every click
+
+DEFAULT_K = 5
+DEFAULT_MAX_KM = float(os.getenv("MEDIBOT_HOSPITAL_MAX_KM", "100"))
+
+
+class HospitalIndex:
+    def __init__(self, hospitals):
+        self.hospitals = hospitals
+        self._tree = KDTree([(h["lat"], h["lon"]) for h in hospitals])
+
+    @classmethod
+    def from_csv(cls, path: str):
+        """Columns: name, lat, lon, city, state, pincode, emergency (yes/no)."""
+        hospitals = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                hospitals.append({
+                    "name": row["name"],
+                    "lat": float(row["lat"]),
+                    "lon": float(row["lon"]),
+                    "city": row.get("city", ""),
+                    "state": row.get("state", ""),
+                    "pincode": row.get("pincode", ""),
+                    "emergency": row.get("emergency", "").strip().lower() in ("yes", "true", "1"),
+                })
+        return cls(hospitals)
+
+    def __len__(self):
+        return len(self.hospitals)
+
+    def nearest(self, lat: float, lon: float, k: int = DEFAULT_K, max_km: float = None):
+        """The k closest hospitals, each a copy with "distance_km" added."""
+        return [
+            dict(self.hospitals[idx], distance_km=round(km, 2))
+            for idx, km in self._tree.nearest(lat, lon, k, max_km)
+        ]
+
+
+class PlaceTable:
+    """City name / pincode -> coordinates."""
+
+    def __init__(self, places):
+        self._places = places  # key -> (lat, lon, state)
+        # Approximate unknown pincodes by their 3-digit sorting district
+        districts = {}
+        for key, (lat, lon, _) in places.items():
+            if key.isdigit() and len(key) == 6:
+                districts.setdefault(key[:3], []).append((lat, lon))
+        self._districts = {
+            prefix: (sum(p[0] for p in pts) / len(pts), sum(p[1] for p in pts) / len(pts))
+            for prefix, pts in districts.items()
+        }
+
+    @classmethod
+    def from_csv(cls, path: str):
+        """Columns: place (city name or pincode), lat, lon, state."""
+        places = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                places[row["place"].strip().lower()] = (float(row["lat"]), float(row["lon"]), row.get("state", ""))
+        return cls(places)
+
+    def lookup(self, query: str):
+        """(lat, lon) for a city or pincode, or None. "Chennai, Tamil Nadu" works too."""
+        text = " ".join(query.strip().lower().split())
+        if not text:
+            return None
+        digits = text.replace(" ", "")
+        if digits.isdigit() and len(digits) == 6:
+            if digits in self._places:
+                return self._places[digits][:2]
+            return self._districts.get(digits[:3])
+        for candidate in (text, text.split(",")[0].strip()):
+            if candidate in self._places:
+                return self._places[candidate][:2]
+        return None
+
+
+_index = None
+_places = None
+_load_lock = threading.Lock()
+
+
+def get_index() -> HospitalIndex:
+    """The hospital index, loaded on first use."""
+    global _index
+    if _index is None:
+        with _load_lock:
+            if _index is None:
+                _index = HospitalIndex.from_csv(HOSPITALS_CSV)
+    return _index
+
+
+def get_places() -> PlaceTable:
+    global _places
+    if _places is None:
+        with _load_lock:
+            if _places is None:
+                _places = PlaceTable.from_csv(PLACES_CSV)
+    return _places
+
+
+# ---------- IP GEOLOCATION (cached) ----------
+_geoip = {"value": None, "expires": 0.0, "error": None}
+_geoip_lock = threading.Lock()
+
+
+def locate_by_ip() -> dict:
     """
-    Opens Google Maps in browser showing hospitals near the given location.
-    Returns a status message for the chat window.
+    {"city", "region", "country", "lat", "lon"} for this machine's public IP.
+    Successful lookups are cached for GEOIP_TTL seconds, failures for
+    GEOIP_FAILURE_TTL. Raises LookupError if the location is unknown.
     """
-    query = f"hospitals near {location}"
-    url = "https://www.google.com/maps/search/" + query.replace(" ", "+")
-    webbrowser.open(url)
-    return f"Opening hospitals near <b>{location}</b> in your browser..."
+    with _geoip_lock:
+        if time.monotonic() < _geoip["expires"]:
+            if _geoip["error"]:
+                raise LookupError(_geoip["error"])
+            return dict(_geoip["value"])
 
-def auto_detect_and_open() -> str:
+        try:
+            # Imported here: only this lookup needs it, and it is slow to import
+            import requests
+            resp = requests.get(IPINFO_URL, timeout=5)
+            if resp.status_code != 200:
+                raise LookupError("location service returned HTTP %d" % resp.status_code)
+            data = resp.json()
+            location = {
+                "city": data.get("city", ""),
+                "region": data.get("region", ""),
+                "country": data.get("country", ""),
+                "lat": None,
+                "lon": None,
+            }
+            if data.get("loc"):
+                lat, lon = data["loc"].split(",")
+                location["lat"], location["lon"] = float(lat), float(lon)
+            if not location["city"] and not location["region"] and location["lat"] is None:
+                raise LookupError("location info is incomplete")
+        except Exception as e:
+            _geoip.update(value=None, error=str(e), expires=time.monotonic() + GEOIP_FAILURE_TTL)
+            raise LookupError(str(e))
+
+        _geoip.update(value=location, error=None, expires=time.monotonic() + GEOIP_TTL)
+        return dict(location)
+
+
+# ---------- SEARCH ----------
+def find_hospitals(query: str = None, lat: float = None, lon: float = None,
+                   k: int = DEFAULT_K, max_km: float = None) -> dict:
+    """
+    The k nearest hospitals within max_km (default DEFAULT_MAX_KM) of a
+    point given as coordinates, as a city / pincode (`query`), or, when
+    neither is given, to the IP location.
+    Returns {"location": {...}, "hospitals": [...], "max_km": ...,
+    "nearest_km": ..., "search_ms": ...}; nearest_km is the distance to the
+    closest known hospital when none is within max_km, else None.
+    Raises LookupError if the location cannot be resolved.
     """
-    Uses IP-based geolocation to approximate user's city.
-    Then opens hospitals near that city on Google Maps.
+    if max_km is None:
+        max_km = DEFAULT_MAX_KM
+    if lat is not None and lon is not None:
+        location = {"lat": lat, "lon": lon, "source": "coordinates"}
+    elif query:
+        point = get_places().lookup(query)
+        if point is None:
+            raise LookupError("Unknown city or pincode: %s" % query)
+        location = {"lat": point[0], "lon": point[1], "source": "place", "query": query}
+    else:
+        found = locate_by_ip()
+        point = (found["lat"], found["lon"])
+        if point[0] is None:
+            point = get_places().lookup(found["city"])
+        if point is None:
+            raise LookupError("Could not place %s on the map" % (found["city"] or found["region"]))
+        location = dict(found, lat=point[0], lon=point[1], source="ip")
+
+    index = get_index()
+    t0 = time.perf_counter()
+    hospitals = index.nearest(location["lat"], location["lon"], k, max_km)
+    nearest_km = None
+    if not hospitals:
+        closest = index.nearest(location["lat"], location["lon"], 1)
+        nearest_km = closest[0]["distance_km"] if closest else None
+    return {
+        "location": location,
+        "hospitals": hospitals,
+        "max_km": max_km,
+        "nearest_km": nearest_km,
+        "search_ms": round((time.perf_counter() - t0) * 1000, 3),
+    }
+
+
+def parse_hospital_query(args) -> dict:
+    """
+    find_hospitals() keyword arguments from request parameters:
+    q (city or pincode) or lat + lon, and optional k / max_km.
+    Raises ValueError for missing or malformed values.
     """
+    query = (args.get("q") or "").strip()
     try:
-        resp = requests.get(IPINFO_URL, timeout=5)
-        if resp.status_code != 200:
-            return "Sorry, I could not detect your location automatically. Please try manual city/pincode."
+        lat = float(args["lat"]) if args.get("lat") not in (None, "") else None
+        lon = float(args["lon"]) if args.get("lon") not in (None, "") else None
+        k = int(args.get("k") or DEFAULT_K)
+        max_km = float(args["max_km"]) if args.get("max_km") not in (None, "") else None
+    except (TypeError, ValueError):
+        raise ValueError("lat, lon, k and max_km must be numbers.")
 
-        data = resp.json()
-        city = data.get("city", "")
-        region = data.get("region", "")
-        country = data.get("country", "")
+    if (lat is None) != (lon is None):
+        raise ValueError("Give both lat and lon.")
+    if lat is None and not query:
+        raise ValueError("Give a city or pincode (q) or coordinates (lat, lon).")
+    if lat is not None and not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Coordinates out of range.")
+    if max_km is not None and not max_km > 0:
+        raise ValueError("max_km must be greater than 0.")
+    return {"query": query or None, "lat": lat, "lon": lon, "k": max(1, min(k, 50)), "max_km": max_km}
 
-        if not city and not region:
-            return "Sorry, automatic location info is incomplete. Please try manual city/pincode."
 
-        location_str = ", ".join([p for p in [city, region, country] if p])
-        return open_hospitals_near(location_str)
+def format_hospitals(result) -> str:
+    """HTML list of a find_hospitals() result for the chat window."""
+    hospitals = result["hospitals"]
+    if not hospitals:
+        text = "🏥 No hospital in my list within %.0f km" % result["max_km"]
+        if result.get("nearest_km") is not None:
+            text += "; the nearest one is %.0f km away" % result["nearest_km"]
+        return text + "."
+    lines = ["🏥 <b>Nearest hospitals</b> (straight-line distance):"]
+    for h in hospitals:
+        lines.append("• %s, %s – %.1f km%s" % (
+            html.escape(h["name"]), html.escape(h["city"]), h["distance_km"],
+            " (24x7 emergency)" if h["emergency"] else ""))
+    return "<br>".join(lines)
+
+
+def maps_url(location: str) -> str:
+    query = f"hospitals near {location}"
+    return "https://www.google.com/maps/search/" + query.replace(" ", "+")
 
+
+def open_hospitals_near(location: str) -> str:
+    """
+    Lists the nearest known hospitals and opens Google Maps in the browser
+    showing hospitals near the given location.
+    Returns a status message for the chat window.
+    """
+    webbrowser.open(maps_url(location))
+    message = f"Opening hospitals near <b>{html.escape(location)}</b> in your browser..."
+    try:
+        result = find_hospitals(query=location)
+    except LookupError:
+        return message
+    return format_hospitals(result) + "<br><br>" + message
+
+
+def auto_detect_and_open() -> str:
+    """
+    Uses IP-based geolocation (cached) to approximate the user's location,
+    lists the nearest hospitals and opens hospitals near that city on Google Maps.
+    """
+    try:
+        result = find_hospitals()
     except Exception as e:
-        return f"Automatic location failed ({e}). Please enter your city or pincode manually."
+        return f"Automatic location failed ({html.escape(str(e))}). Please enter your city or pincode manually."
+
+    location = result["location"]
+    location_str = ", ".join([p for p in [location.get("city"), location.get("region"), location.get("country")] if p])
+    webbrowser.open(maps_url(location_str or "%f,%f" % (location["lat"], location["lon"])))
+    return (format_hospitals(result) + "<br><br>"
+            + f"Opening hospitals near <b>{html.escape(location_str or 'you')}</b> in your browser...")
@@ -0,0 +1,315 @@
+# kb_compiler.py
+"""
+Compiles the knowledge base source (kb/conditions.json) into the compact
+binary artifact read by kb_store.py.
+
+Usage:
+    python kb_compiler.py                       # kb/conditions.json -> kb/conditions.kb
+    python kb_compiler.py SOURCE.json OUT.kb
+
+Source format:
+    {"format": 1,
+     "labels": {"<Language>": {"title": "...", "condition": "...", ...}},
+     "conditions": [
+        {"id": "...", "name": "...", "keywords": ["..."],
+         "symptoms": "...", "first_aid": "...", "see_doctor": "...",
+         "i18n": {"<Language>": {"name": "...", "keywords": ["..."], ...}}},
+        ...
+    ]}
+
+English fields are required; every "i18n" field is optional and falls back
+to English. Non-English keywords should cover the native script and common
+romanized spellings (e.g. "बुखार" and "bukhar").
+
+Rebuilds are incremental. The artifact keeps a digest of each condition's
+keywords (all languages) next to the base indexes built from them. The
+next build copies those base indexes unchanged and only indexes the
+conditions whose digest differs, into small per-language patch indexes;
+at runtime a patched condition is looked up in the patch and its stale
+base postings are ignored (kb_store.KnowledgeBase.match). Changes are
+counted against the base, so the patch holds every condition edited since
+the last full build, and once that passes MAX_PATCHED of the KB the next
+build is a full one again. Editing a condition's text re-indexes nothing.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from array import array
+
+import fuzzy_index
+from kb_store import (
+    DEFAULT_LANGUAGE, DIR_ENTRY, FORMAT_VERSION, FUZZY_TABLE_NAMES, HEADER, LANGUAGE_CODES, MAGIC, TABLE_NAMES,
+    KnowledgeBase,
+)
+from symptom_matcher import KeywordMatcher
+
+KB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb")
+DEFAULT_SOURCE = os.path.join(KB_DIR, "conditions.json")
+DEFAULT_OUTPUT = os.path.join(KB_DIR, "conditions.kb")
+
+REQUIRED_FIELDS = ("id", "name", "keywords", "symptoms", "first_aid", "see_doctor")
+
+# Past this many changed conditions (at least MIN_PATCHED, or this share of
+# the KB), the patch indexes are folded back into a full rebuild
+MIN_PATCHED = 64
+MAX_PATCHED = 0.02
+
+
+def load_source(path: str):
+    """Reads and validates the source file. Returns (conditions, labels, raw bytes)."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = json.loads(raw.decode("utf-8"))
+    conditions = data["conditions"] if isinstance(data, dict) else data
+    labels = data.get("labels", {}) if isinstance(data, dict) else {}
+
+    seen = set()
+    for i, cond in enumerate(conditions):
+        missing = [k for k in REQUIRED_FIELDS if k not in cond]
+        if missing:
+            raise ValueError("condition #%d is missing %s" % (i, ", ".join(missing)))
+        if cond["id"] in seen:
+            raise ValueError("duplicate condition id %r" % cond["id"])
+        seen.add(cond["id"])
+        unknown = set(cond.get("i18n", {})) - set(LANGUAGE_CODES)
+        if unknown:
+            raise ValueError("condition %r: unsupported language(s) %s" % (cond["id"], ", ".join(sorted(unknown))))
+    return conditions, labels, raw
+
+
+def source_languages(conditions):
+    """English first, then every language that has translations."""
+    found = {lang for cond in conditions for lang in cond.get("i18n", {})}
+    return [DEFAULT_LANGUAGE] + [lang for lang in LANGUAGE_CODES if lang in found and lang != DEFAULT_LANGUAGE]
+
+
+def keyword_pairs(conditions, language: str, indexes=None):
+    """(keyword, condition index) pairs for one language's index, optionally only for `indexes`."""
+    for idx in range(len(conditions)) if indexes is None else indexes:
+        cond = conditions[idx]
+        for kw in cond["keywords"]:
+            yield kw, idx
+        if language != DEFAULT_LANGUAGE:
+            for kw in cond.get("i18n", {}).get(language, {}).get("keywords", []):
+                yield kw, idx
+
+
+def _digest(items) -> str:
+    return hashlib.sha256(json.dumps(items, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def keyword_digests(conditions, languages) -> bytes:
+    """8 bytes per condition: a digest of every keyword it adds to the indexes."""
+    out = bytearray()
+    for cond in conditions:
+        i18n = cond.get("i18n", {})
+        keys = [cond["keywords"]] + [i18n.get(lang, {}).get("keywords", []) for lang in languages[1:]]
+        out += hashlib.blake2b(json.dumps(keys, ensure_ascii=False).encode("utf-8"), digest_size=8).digest()
+    return bytes(out)
+
+
+def changed_conditions(previous, digests: bytes, base_key: str):
+    """
+    Indexes of the conditions whose keywords differ from `previous`'s base
+    indexes (including conditions added or removed since), or None if the
+    base cannot be patched: no previous build, other languages or typo
+    distance, or more than MAX_PATCHED of the KB changed.
+    """
+    if previous is None or previous.meta.get("base_key") != base_key:
+        return None
+    old = previous.section_bytes("kw.digests")
+    count, old_count = len(digests) // 8, len(old) // 8
+    changed = [i for i in range(min(count, old_count)) if digests[8 * i:8 * i + 8] != old[8 * i:8 * i + 8]]
+    changed.extend(range(min(count, old_count), max(count, old_count)))
+    if len(changed) > max(MIN_PATCHED, int(count * MAX_PATCHED)):
+        return None
+    return changed
+
+
+def build_sections(conditions, kb_version: str, source_name: str = "", labels=None,
+                   previous=None, memo=None, reused=None):
+    """
+    Returns the (name, bytes) sections of the artifact, in file order.
+
+    previous: the KnowledgeBase of the last build; its base indexes are
+        copied, and only the conditions whose keywords changed since they
+        were built are indexed again (see the module docstring).
+    memo: {word: delete hashes} kept between builds (see fuzzy_index.build_tables);
+        a full build leaves it holding just the words of the new indexes.
+    reused: if given, the names of the copied indexes are appended to it.
+    """
+    if memo is None:
+        memo = {}
+    used_words = set()
+    split_cache = {}  # keyword -> its words; most keywords are in every language's index
+    records = [
+        json.dumps(c, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for c in conditions
+    ]
+    offsets = array("I", [0])
+    for rec in records:
+        offsets.append(offsets[-1] + len(rec))
+
+    languages = source_languages(conditions)
+    base_key = _digest([fuzzy_index.MAX_DISTANCE, languages])
+    digests = keyword_digests(conditions, languages)
+    changed = changed_conditions(previous, digests, base_key)
+    meta = {
+        "kb_version": kb_version,
+        "count": len(conditions),
+        "languages": languages,
+        "labels": labels or {},
+        "source": source_name,
+        "built_at": int(time.time()),
+        "fuzzy_distance": fuzzy_index.MAX_DISTANCE,
+        "base_key": base_key,
+        "patched": changed or [],
+    }
+    sections = [
+        ("meta", json.dumps(meta, ensure_ascii=False).encode("utf-8")),
+        ("rec.offsets", offsets.tobytes()),
+        ("rec.data", b"".join(records)),
+        # Digests of the conditions the base indexes were built from
+        ("kw.digests", digests if changed is None else previous.section_bytes("kw.digests")),
+    ]
+
+    def keyword_index(prefix, pairs):
+        tables, keyword_blob = KeywordMatcher(pairs).to_tables()
+        return [(prefix + "kw.text", keyword_blob)] + [(prefix + name, tables[name].tobytes()) for name in TABLE_NAMES]
+
+    def keyword_words(pairs):
+        words = set()
+        for kw in {kw.strip().lower() for kw, _ in pairs}:
+            found = split_cache.get(kw)
+            if found is None:
+                found = split_cache[kw] = [kw[a:b] for a, b in fuzzy_index.split_words(kw)]
+            words.update(found)
+        return words
+
+    def fuzzy_tables(prefix, pairs):
+        words = keyword_words(pairs)
+        used_words.update(words)
+        tables, word_blob = fuzzy_index.build_tables(words, memo=memo)
+        return [(prefix + "fz.words", word_blob)] + [(prefix + name, tables[name].tobytes()) for name in FUZZY_TABLE_NAMES]
+
+    # Removed conditions are patched too, with nothing to index
+    patch = [idx for idx in changed or () if idx < len(conditions)]
+    for language in languages:
+        code = LANGUAGE_CODES[language]
+        if changed is None:
+            pairs = list(keyword_pairs(conditions, language))
+            sections.extend(keyword_index(code + "/", pairs))
+            sections.extend(fuzzy_tables(code + "/", pairs))
+            continue
+        names = [code + "/kw.text"] + [code + "/" + name for name in TABLE_NAMES]
+        names += [code + "/fz.words"] + [code + "/" + name for name in FUZZY_TABLE_NAMES]
+        sections.extend((name, previous.section_bytes(name)) for name in names)
+        if reused is not None:
+            reused.extend([code + "/kw", code + "/fz"])
+        if changed:
+            pairs = list(keyword_pairs(conditions, language, patch))
+            sections.extend(keyword_index(code + "/patch/", pairs))
+            sections.extend(fuzzy_tables(code + "/patch/", pairs))
+            # Base words no keyword uses any more, so typos are not corrected into them
+            dropped = set(_index_words(previous, code + "/")) - keyword_words(keyword_pairs(conditions, language))
+            sections.append((code + "/patch/fz.dropped", "\n".join(sorted(dropped)).encode("utf-8")))
+
+    if changed is None:
+        for word in [w for w in memo if w not in used_words]:
+            del memo[word]
+    return sections
+
+
+def _index_words(kb, prefix):
+    """The words of a typo index in `kb`'s file."""
+    blob = kb.section_bytes(prefix + "fz.words")
+    start = memoryview(kb.section_bytes(prefix + "fz.word_start")).cast("I")
+    return [blob[a:b].decode("utf-8") for a, b in zip(start, start[1:])]
+
+
+def write_artifact(path: str, sections):
+    """Writes the sections to `path` atomically (temp file + rename)."""
+    header_size = HEADER.size + DIR_ENTRY.size * len(sections)
+    pos = _align(header_size)
+    directory = []
+    for name, blob in sections:
+        directory.append((name, pos, len(blob)))
+        pos = _align(pos + len(blob))
+
+    out_dir = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".kb-", dir=out_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == "little", 0, len(sections)))
+            for name, offset, length in directory:
+                f.write(DIR_ENTRY.pack(name.encode("ascii"), offset, length))
+            for (name, blob), (_, offset, _) in zip(sections, directory):
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(blob)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+
+def open_previous(output: str):
+    """The artifact currently at `output`, or None if there is no usable one."""
+    try:
+        return KnowledgeBase(output)
+    except (OSError, ValueError):  # missing, or KBFormatError
+        return None
+
+
+def compile_kb(source: str = DEFAULT_SOURCE, output: str = DEFAULT_OUTPUT, previous=None, memo=None) -> dict:
+    """
+    Compiles `source` into `output`, reusing the unchanged indexes of
+    `previous` (by default the artifact already at `output`). Returns a
+    short summary.
+    """
+    conditions, labels, raw = load_source(source)
+    kb_version = hashlib.sha256(raw).hexdigest()[:12]
+    if previous is None:
+        previous = open_previous(output)
+    reused = []
+    sections = build_sections(conditions, kb_version, os.path.basename(source), labels, previous, memo, reused)
+    # Let go of our own mapping of the old file before replacing it
+    previous = None
+    write_artifact(output, sections)
+    return {
+        "kb_version": kb_version,
+        "conditions": len(conditions),
+        "languages": len(source_languages(conditions)),
+        "bytes": os.path.getsize(output),
+        "reused": reused,
+        "indexes": 2 * len(source_languages(conditions)),
+        "patched": len(json.loads(sections[0][1].decode("utf-8"))["patched"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the MediBot knowledge base.")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument("output", nargs="?", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    summary = compile_kb(args.source, args.output)
+    print("✅ Compiled %(conditions)d conditions / %(languages)d languages "
+          "into %(bytes)d bytes (version %(kb_version)s)" % summary,
+          "in %.1f ms" % ((time.perf_counter() - t0) * 1000),
+          "– %d of %d indexes reused, %d conditions patched" % (
+              len(summary["reused"]), summary["indexes"], summary["patched"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# kb_reloader.py
+"""
+Hot reload of the knowledge base, without a restart.
+
+Every process that answers chats holds one KBReloader. When a request asks
+for the KB and MEDIBOT_KB_CHECK_INTERVAL seconds have passed since the last
+look, it stats the source and the artifact (two os.stat calls). If either
+changed, a background thread
+    1. recompiles the artifact if the source is newer, re-indexing only the
+       conditions whose keywords changed (see kb_compiler.py); one process
+       at a time, under a lock file, while the others keep serving and pick
+       up its result,
+    2. maps the new artifact and lets `prepare` build what derives from it
+       (medical_db builds its BM25 ranker there, off the request path),
+    3. swaps it in with a single assignment.
+Requests that already hold the old KB finish with it; later ones get the new
+one. None are dropped, and none see a half-built index.
+
+Workers share one copy of the indexes: the artifact is memory-mapped
+read-only, so every process mapping the same file uses the same physical
+pages, and a reload in one worker costs the others only a remap. With
+`gunicorn --preload` the master maps it once before forking.
+
+Settings (environment variables, read by medical_db):
+    MEDIBOT_KB_CHECK_INTERVAL  seconds between checks for a changed KB (default 2; 0 turns reloading off)
+"""
+import os
+import threading
+import time
+
+from kb_store import KnowledgeBase, compile_lock, file_id, is_stale, load_kb
+
+
+def _stat_id(path):
+    try:
+        return file_id(os.stat(path))
+    except OSError:
+        return None
+
+
+class KBReloader:
+    def __init__(self, path: str, source: str = None, interval: float = 2.0, prepare=None, on_swap=None):
+        """
+        path, source: the artifact and the JSON it is compiled from.
+        interval: seconds between checks; 0 only reloads on reload().
+        prepare: called with a freshly loaded KB before it is swapped in.
+        on_swap: called with the new KB right after the swap.
+        """
+        self.path = path
+        self.source = source
+        self.interval = interval
+        self._prepare = prepare
+        self._on_swap = on_swap
+
+        self.kb = load_kb(path, source)
+        self._lock = threading.Lock()  # one reload at a time in this process
+        self._thread = None
+        self._next_check = time.monotonic() + interval
+        self._memo = {}                # fuzzy index hashes, reused between compiles
+        self._failed_source = None     # source version that did not compile
+        self._stats = {"reloads": 0, "compiles": 0, "failures": 0}
+        self.last_error = None
+        self.loaded_at = time.time()
+
+    # ---------- CHECK ----------
+    def current(self) -> KnowledgeBase:
+        """The live KB. Starts a background reload if the files have changed."""
+        if self.interval > 0:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.interval
+                if self.changed():
+                    self.reload_later()
+        return self.kb
+
+    def changed(self) -> bool:
+        if _stat_id(self.path) != self.kb.file_id:
+            return True
+        return self._source_pending()
+
+    def _source_pending(self):
+        if not self.source or not os.path.exists(self.source):
+            return False
+        return is_stale(self.source, self.path) and _stat_id(self.source) != self._failed_source
+
+    def reload_later(self):
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.reload, name="kb-reload", daemon=True)
+        self._thread.start()
+
+    # ---------- RELOAD ----------
+    def reload(self) -> bool:
+        """Recompiles if needed and swaps in the artifact. True if a new KB was swapped in."""
+        with self._lock:
+            try:
+                if self._source_pending():
+                    self._compile()
+                if _stat_id(self.path) == self.kb.file_id:
+                    return False
+                kb = KnowledgeBase(self.path)
+                if self._prepare is not None:
+                    self._prepare(kb)
+            except Exception as e:
+                # Whatever went wrong, the old KB stays in service
+                self._stats["failures"] += 1
+                self.last_error = str(e)
+                print("⚠ KB reload failed:", e)
+                return False
+
+            old, self.kb = self.kb, kb
+            self.loaded_at = time.time()
+            self.last_error = None
+            self._stats["reloads"] += 1
+            if self._on_swap is not None:
+                self._on_swap(kb)
+            if kb.version != old.version:
+                print("✅ KB reloaded: %s -> %s (%d conditions)" % (old.version, kb.version, len(kb)))
+            return True
+
+    def _compile(self):
+        from kb_compiler import compile_kb
+        with compile_lock(self.path, blocking=False) as locked:
+            # Someone else is compiling; their artifact shows up on a later check
+            if not locked or not is_stale(self.source, self.path):
+                return
+            source_id = _stat_id(self.source)
+            t0 = time.perf_counter()
+            try:
+                summary = compile_kb(self.source, self.path, previous=self.kb, memo=self._memo)
+            except Exception as e:
+                # e.g. a broken edit (bad JSON, a field of the wrong type): keep serving the last good KB until the source changes again
+                self._failed_source = source_id
+                raise ValueError("%s: %s" % (self.source, e))
+            self._stats["compiles"] += 1
+            print("📊 KB compiled in %.1f ms, %d of %d indexes reused, %d conditions patched" % (
+                (time.perf_counter() - t0) * 1000, len(summary["reused"]), summary["indexes"], summary["patched"]))
+
+    # ---------- STATS ----------
+    def stats(self) -> dict:
+        kb = self.kb
+        return dict(self._stats, kb_version=kb.version, conditions=len(kb), languages=kb.languages,
+                    loaded_at=int(self.loaded_at), last_error=self.last_error)
@@ -0,0 +1,280 @@
+# kb_store.py
+"""
+Runtime side of the compiled knowledge base (see kb_compiler.py).
+
+The .kb artifact is memory-mapped read-only. The keyword automaton is used
+in place from the mapped pages and condition records are decoded only when
+they are looked at, so opening the KB costs the same whatever its size, and
+every process that maps the file shares the same physical pages.
+
+File layout (all integers in the builder's native byte order):
+    header     "<4sHBBI"  magic, format version, little-endian flag, pad, section count
+    directory  "<32sQQ"   section name, offset, length   (one per section)
+    sections   8-byte aligned blobs:
+        meta             JSON: kb_version, count, languages, labels, source, built_at,
+                         base_key, patched (condition indexes in the patch indexes)
+        rec.offsets      uint32[count + 1] byte offsets into rec.data
+        rec.data         one compact JSON object per condition (incl. "i18n")
+        kw.digests       8 bytes per condition the base indexes were built from
+        <lang>/kw.text   UTF-8 keyword text (see symptom_matcher.TableMatcher)
+        <lang>/ac.* ...  uint32 automaton and keyword tables
+        <lang>/fz.* ...  typo-tolerant index of keyword words (see fuzzy_index.py)
+        <lang>/patch/... the same two indexes for the patched conditions only, and
+                         fz.dropped: base index words no keyword uses any more
+
+There is one keyword index per language (<lang> is a LANGUAGE_CODES value).
+Each one holds that language's keywords, in native script and common
+romanized spellings, plus the English keywords, since users mix the two.
+Conditions edited since the last full build are indexed again in the
+patch indexes, and their postings in the base index are ignored
+(see kb_compiler.py).
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: compiles are not serialized between processes
+    fcntl = None
+
+from fuzzy_index import FuzzyIndex, StackedFuzzyIndex, TABLE_NAMES as FUZZY_TABLE_NAMES
+from symptom_matcher import TableMatcher
+
+MAGIC = b"MBKB"
+FORMAT_VERSION = 4
+HEADER = struct.Struct("<4sHBBI")
+DIR_ENTRY = struct.Struct("<32sQQ")
+
+LANGUAGE_CODES = {"English": "en", "Hindi": "hi", "Tamil": "ta", "Telugu": "te"}
+DEFAULT_LANGUAGE = "English"
+
+TABLE_NAMES = (
+    "ac.edge_start", "ac.edge_char", "ac.edge_target", "ac.fail",
+    "ac.out_start", "ac.out", "kw.len", "kw.text_start",
+    "kw.post_start", "kw.post",
+)
+
+
+class KBFormatError(ValueError):
+    pass
+
+
+class ConditionRecords(Sequence):
+    """
+    Read-only list of condition dicts, decoded from the mapped file on access.
+    Shared by request threads, so the LRU of decoded records is locked.
+    """
+
+    def __init__(self, data, offsets, cache_size=256):
+        self._data = data
+        self._offsets = offsets
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("condition index out of range")
+
+        with self._lock:
+            record = self._cache.get(idx)
+            if record is not None:
+                self._cache.move_to_end(idx)
+                return record
+        # Decoded outside the lock; two threads may both decode a record, which is harmless
+        raw = self._data[self._offsets[idx]:self._offsets[idx + 1]]
+        record = json.loads(bytes(raw).decode("utf-8"))
+        with self._lock:
+            self._cache[idx] = record
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return record
+
+
+class PatchedMatcher:
+    """
+    A base keyword index with the patched conditions' postings dropped,
+    plus the patch index that holds those conditions' current keywords.
+    """
+
+    def __init__(self, base, patch, patched):
+        self.base = base
+        self.patch = patch
+        self.patched = patched
+
+    def __len__(self):
+        return len(self.base) + len(self.patch)
+
+    def match(self, text: str) -> dict:
+        found = {idx: kws for idx, kws in self.base.match(text).items() if idx not in self.patched}
+        found.update(self.patch.match(text))
+        return found
+
+
+class KnowledgeBase:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.file_id = file_id(os.fstat(f.fileno()))
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        self._sections = self._read_directory()
+
+        self.meta = json.loads(bytes(self._section("meta")).decode("utf-8"))
+        self.version = self.meta["kb_version"]
+        self.languages = self.meta["languages"]
+        self.labels = self.meta.get("labels", {})
+        self.conditions = ConditionRecords(self._section("rec.data"), self._u32("rec.offsets"))
+        self.patched = frozenset(self.meta.get("patched", ()))
+        self._matchers = {}
+        self._fuzzy = {}
+        for language in self.languages:
+            code = LANGUAGE_CODES[language]
+            self._matchers[language] = self._matcher(code + "/")
+            self._fuzzy[language] = self._fuzzy_index(code + "/")
+            if self.patched:
+                self._matchers[language] = PatchedMatcher(
+                    self._matchers[language], self._matcher(code + "/patch/"), self.patched)
+                dropped = bytes(self._section(code + "/patch/fz.dropped")).decode("utf-8")
+                self._fuzzy[language] = StackedFuzzyIndex([
+                    self._fuzzy_index(code + "/", frozenset(dropped.split("\n")) - {""}),
+                    self._fuzzy_index(code + "/patch/"),
+                ])
+        self.matcher = self._matchers[DEFAULT_LANGUAGE]
+
+    def _read_directory(self):
+        if len(self._view) < HEADER.size:
+            raise KBFormatError("%s: file too short" % self.path)
+        magic, version, little, _, count = HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise KBFormatError("%s: not a MediBot KB file" % self.path)
+        if version != FORMAT_VERSION:
+            raise KBFormatError("%s: format %d, expected %d" % (self.path, version, FORMAT_VERSION))
+        if bool(little) != (sys.byteorder == "little"):
+            raise KBFormatError("%s: built on a machine with another byte order" % self.path)
+
+        sections = {}
+        pos = HEADER.size
+        for _ in range(count):
+            name, offset, length = DIR_ENTRY.unpack_from(self._view, pos)
+            sections[name.rstrip(b"\0").decode("ascii")] = (offset, length)
+            pos += DIR_ENTRY.size
+        return sections
+
+    def _section(self, name):
+        try:
+            offset, length = self._sections[name]
+        except KeyError:
+            raise KBFormatError("%s: missing section %r" % (self.path, name))
+        return self._view[offset:offset + length]
+
+    def _u32(self, name):
+        return self._section(name).cast("I")
+
+    def _matcher(self, prefix):
+        return TableMatcher({name: self._u32(prefix + name) for name in TABLE_NAMES}, self._section(prefix + "kw.text"))
+
+    def _fuzzy_index(self, prefix, exclude=frozenset()):
+        return FuzzyIndex({name: self._u32(prefix + name) for name in FUZZY_TABLE_NAMES},
+                          self._section(prefix + "fz.words"), exclude)
+
+    def section_bytes(self, name: str) -> bytes:
+        """A copy of one raw section (kb_compiler reuses unchanged ones)."""
+        return bytes(self._section(name))
+
+    def __len__(self):
+        return len(self.conditions)
+
+    def matcher_for(self, language: str = DEFAULT_LANGUAGE):
+        """Keyword index for `language`; unknown languages use the English one."""
+        return self._matchers.get(language, self.matcher)
+
+    def fuzzy_for(self, language: str = DEFAULT_LANGUAGE):
+        """Typo-tolerant index of the words in `language`'s keywords."""
+        return self._fuzzy.get(language, self._fuzzy[DEFAULT_LANGUAGE])
+
+    def match(self, text: str, language: str = DEFAULT_LANGUAGE) -> dict:
+        """{condition index: [matched keywords]}"""
+        return self.matcher_for(language).match(text)
+
+
+def file_id(st) -> tuple:
+    """Identity of a file version from its os.stat() result; changes when it is replaced."""
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def is_stale(source: str, path: str) -> bool:
+    """True if the artifact at `path` is missing or older than `source`."""
+    return not os.path.exists(path) or os.path.getmtime(source) > os.path.getmtime(path)
+
+
+@contextmanager
+def compile_lock(path: str, blocking: bool = True):
+    """
+    Lock file next to the artifact, so that of several processes (gunicorn
+    workers) only one compiles it. Yields False if `blocking` is off and
+    another process holds the lock.
+    """
+    if fcntl is None:
+        yield True
+        return
+    try:
+        f = open(path + ".lock", "a")
+    except OSError:
+        # Read-only install dir: nobody can compile here anyway
+        yield True
+        return
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_kb(path: str, source: str = None) -> KnowledgeBase:
+    """
+    Opens the compiled KB at `path`. If `source` is given and the artifact is
+    missing, older than the source, or from an incompatible build, it is
+    compiled first.
+    """
+    if source and os.path.exists(source):
+        if is_stale(source, path):
+            _rebuild(source, path)
+        try:
+            return KnowledgeBase(path)
+        except KBFormatError as e:
+            print("⚠ %s – rebuilding" % e)
+            _rebuild(source, path, force=True)
+    return KnowledgeBase(path)
+
+
+def _rebuild(source, path, force=False):
+    from kb_compiler import compile_kb
+    with compile_lock(path):
+        # Another worker may have compiled it while we waited for the lock
+        if not force and not is_stale(source, path):
+            return
+        try:
+            compile_kb(source, path)
+        except OSError as e:
+            # e.g. read-only install dir; fall back to whatever artifact exists
+            print("⚠ Could not compile KB:", e)
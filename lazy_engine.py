@@ -0,0 +1,56 @@
+# lazy_engine.py
+"""
+Deferred construction for the heavy engines (MediAI, VoiceEngine).
+
+A LazyEngine stands in for the real object: the factory runs on first
+attribute access, or ahead of time in a background thread via warm().
+Coroutines use aget(), which builds it in a worker thread so the event
+loop is never blocked by the factory. If the factory fails, that access
+raises its error (MediAI raises MediAIError) and the next one tries again.
+"""
+import asyncio
+import threading
+
+from startup_timing import timed
+
+
+class LazyEngine:
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._instance is not None
+
+    def get(self):
+        """Returns the engine, building it now if nobody has yet."""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    with timed("init " + self._name):
+                        self._instance = self._factory()
+        return self._instance
+
+    async def aget(self):
+        """get() for coroutines: the engine is built in a worker thread, off the event loop."""
+        if self._instance is None:
+            return await asyncio.to_thread(self.get)
+        return self._instance
+
+    def warm(self, on_done=None):
+        """Builds the engine in a background thread. Errors are reported, not raised."""
+        def run():
+            try:
+                self.get()
+            except Exception as e:
+                print("❌ %s init failed: %s" % (self._name, getattr(e, "detail", "") or e))
+            if on_done:
+                on_done()
+
+        threading.Thread(target=run, name="warm-" + self._name, daemon=True).start()
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
@@ -0,0 +1,328 @@
+# llm_transport.py
+"""
+Resilient calls to the OpenAI API, used by MediAI and AsyncMediAI.
+
+Every question goes through a Transport, which adds:
+    deadline         a time budget for the whole question, shared by all its
+                     attempts; each attempt gets what is left as its timeout
+    retries          timeouts, connection errors, 429s and 5xx responses are
+                     retried with exponential backoff and full jitter
+    hedging          optional: when an attempt has not answered after
+                     `hedge_after` seconds a second one is started, and the
+                     first answer wins
+    circuit breaker  after `failure_threshold` questions in a row fail on
+                     upstream errors, calls fail fast (kind "circuit_open")
+                     for `reset_timeout` seconds; then a single trial call
+                     decides whether to close the circuit again
+
+Failures are raised as MediAIError, whose `kind` says what went wrong and
+whose message is safe to show to the user.
+
+Settings (environment variables):
+    MEDIBOT_LLM_DEADLINE      seconds per question (default 30)
+    MEDIBOT_LLM_RETRIES       extra attempts after a retryable failure (default 2)
+    MEDIBOT_LLM_HEDGE_AFTER   seconds before a hedged attempt, 0 = off (default 0)
+    MEDIBOT_BREAKER_FAILURES  failures in a row that open the circuit (default 5)
+    MEDIBOT_BREAKER_RESET     seconds the circuit stays open (default 30)
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import ERRORS
+
+# MediAIError kinds
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+RATE_LIMITED = "rate_limited"
+UPSTREAM = "upstream"
+CIRCUIT_OPEN = "circuit_open"
+AUTH = "auth"
+BAD_REQUEST = "bad_request"
+INTERNAL = "internal"
+OVERLOADED = "overloaded"  # turned away by admission control (admission.py), never sent upstream
+
+RETRYABLE = frozenset((TIMEOUT, CONNECTION, RATE_LIMITED, UPSTREAM, OVERLOADED))
+
+_USER_MESSAGES = {
+    TIMEOUT: "Sorry, the answer is taking too long. Please try again.",
+    CONNECTION: "Could not reach the AI service. Please check the connection and try again.",
+    RATE_LIMITED: "The AI service is busy right now. Please try again in a moment.",
+    UPSTREAM: "The AI service is having trouble right now. Please try again later.",
+    CIRCUIT_OPEN: "The AI service is unavailable right now. Please use the offline guidance, "
+                  "or try again in a little while.",
+    AUTH: "The AI service is not configured correctly.",
+    BAD_REQUEST: "The AI service could not process this question.",
+    INTERNAL: "Something went wrong while preparing the answer.",
+    OVERLOADED: "The server is busy right now. Please use the offline guidance, or try again in a moment.",
+}
+
+_HTTP_STATUS = {
+    TIMEOUT: 504, CONNECTION: 502, RATE_LIMITED: 503, UPSTREAM: 502,
+    CIRCUIT_OPEN: 503, AUTH: 500, BAD_REQUEST: 400, INTERNAL: 500, OVERLOADED: 503,
+}
+
+
+class MediAIError(Exception):
+    """A failed question. str() is the user-facing message; `detail` is for logs."""
+
+    def __init__(self, kind: str, detail: str = "", message: str = None, attempts: int = 0):
+        super().__init__(message or _USER_MESSAGES.get(kind, _USER_MESSAGES[INTERNAL]))
+        self.kind = kind
+        self.detail = detail
+        self.attempts = attempts
+
+    @property
+    def message(self) -> str:
+        return str(self)
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind in RETRYABLE
+
+    @property
+    def http_status(self) -> int:
+        return _HTTP_STATUS.get(self.kind, 500)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "message": self.message,
+            "retryable": self.retryable,
+            "attempts": self.attempts,
+        }
+
+
+def classify(exc: BaseException) -> MediAIError:
+    """Maps an exception from the OpenAI client (or anything else) to a MediAIError."""
+    if isinstance(exc, MediAIError):
+        return exc
+
+    # Matched by name and status code, so the openai package is not imported here
+    name = type(exc).__name__
+    status = getattr(exc, "status_code", None)
+    if name == "APITimeoutError" or isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        kind = TIMEOUT
+    elif name == "APIConnectionError" or isinstance(exc, ConnectionError):
+        kind = CONNECTION
+    elif status == 429:
+        kind = RATE_LIMITED
+    elif status in (401, 403):
+        kind = AUTH
+    elif status is not None and (status >= 500 or status in (408, 409)):
+        kind = UPSTREAM
+    elif status is not None:
+        kind = BAD_REQUEST
+    else:
+        kind = INTERNAL
+    return MediAIError(kind, "%s: %s" % (name, exc))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """May a call go upstream now? In half-open state only one trial call may."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # Open, or half-open with a trial that never reported back
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("✅ OpenAI circuit closed")
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print("⚠ OpenAI circuit open for %gs after %d failures" % (self.reset_timeout, self._failures))
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "failures": self._failures}
+
+
+# Threads for hedged attempts of the blocking client
+_hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="medibot-hedge")
+
+
+class Transport:
+    def __init__(self, deadline: float = 30.0, retries: int = 2, backoff: float = 0.5,
+                 max_backoff: float = 8.0, hedge_after: float = 0.0, breaker: CircuitBreaker = None):
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "failures": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "fast_fails": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            deadline=float(os.getenv("MEDIBOT_LLM_DEADLINE", "30")),
+            retries=int(os.getenv("MEDIBOT_LLM_RETRIES", "2")),
+            hedge_after=float(os.getenv("MEDIBOT_LLM_HEDGE_AFTER", "0")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("MEDIBOT_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("MEDIBOT_BREAKER_RESET", "30")),
+            ),
+        )
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+        data["breaker"] = self.breaker.stats()
+        return data
+
+    def _start(self) -> float:
+        """Checks the breaker and returns the question's deadline (monotonic)."""
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("fast_fails")
+            ERRORS.inc(kind=CIRCUIT_OPEN)
+            raise MediAIError(CIRCUIT_OPEN, "circuit breaker is open")
+        return time.monotonic() + self.deadline
+
+    def _give_up(self, exc, attempt: int, end: float):
+        """Returns the backoff delay before the next attempt, or raises MediAIError."""
+        err = classify(exc)
+        err.attempts = attempt
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if err.retryable and attempt <= self.retries and time.monotonic() + delay < end:
+            self._count("retries")
+            return delay
+
+        self._count("failures")
+        ERRORS.inc(kind=err.kind)
+        # Only upstream trouble counts against the circuit; a rejected question
+        # still proves the service is up
+        if err.retryable:
+            self.breaker.record_failure()
+        elif err.kind != INTERNAL:
+            self.breaker.record_success()
+        print("❌ OpenAI call failed (%s after %d attempt(s)): %s" % (err.kind, attempt, err.detail))
+        raise err from (None if exc is err else exc)
+
+    def call(self, attempt_fn, hedge: bool = True):
+        """
+        Runs attempt_fn(timeout) until it succeeds or the policy gives up;
+        raises MediAIError. `hedge=False` for calls that must not run twice
+        (e.g. opening a stream).
+        """
+        end = self._start()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise MediAIError(TIMEOUT, "deadline of %gs exceeded" % self.deadline)
+                if hedge and 0 < self.hedge_after < remaining:
+                    result = self._hedged(attempt_fn, remaining)
+                else:
+                    result = attempt_fn(remaining)
+            except Exception as e:
+                time.sleep(self._give_up(e, attempt, end))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _hedged(self, attempt_fn, timeout):
+        first = _hedge_pool.submit(attempt_fn, timeout)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self._count("hedges")
+        second = _hedge_pool.submit(attempt_fn, timeout - self.hedge_after)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    # The loser cannot be interrupted mid-request; its answer is dropped
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def call_async(self, attempt_fn, hedge: bool = True):
+        """call() for coroutines: attempt_fn(timeout) returns an awaitable."""
+        end = self._start()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise MediAIError(TIMEOUT, "deadline of %gs exceeded" % self.deadline)
+                if hedge and 0 < self.hedge_after < remaining:
+                    result = await self._hedged_async(attempt_fn, remaining)
+                else:
+                    result = await asyncio.wait_for(attempt_fn(remaining), remaining)
+            except Exception as e:
+                await asyncio.sleep(self._give_up(e, attempt, end))
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def _hedged_async(self, attempt_fn, timeout):
+        first = asyncio.ensure_future(attempt_fn(timeout))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if done:
+                return first.result()
+
+            self._count("hedges")
+            second = asyncio.ensure_future(attempt_fn(timeout - self.hedge_after))
+            tasks.append(second)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    raise MediAIError(TIMEOUT, "hedged attempts timed out")
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
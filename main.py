@@ -1,11 +1,23 @@
-from ai_engine import MediAI
-from voice_engine import VoiceEngine
-from medi_ui import start_ui
+from startup_timing import mark, timed
+
+with timed("import engines"):
+    from ai_engine import MediAI
+    from audio_cache import AudioCache
+    from lazy_engine import LazyEngine
+    from metrics import start_stats_log
+    from response_cache import ResponseCache, default_path
+    from voice_engine import VoiceEngine
+with timed("import ui"):
+    from medi_ui import start_ui
 
 if __name__ == "__main__":
-    # Create AI + Voice engines
-    ai = MediAI()                   # Uses API_KEY from ai_engine.py
-    voice = VoiceEngine("English")  # Default: English, Indian male
+    # AI + Voice engines are built after the window is shown (see start_ui)
+    ai = LazyEngine("MediAI", lambda: MediAI(cache=ResponseCache.from_env(default_db=default_path())))  # Uses API_KEY from ai_engine.py
+    voice = LazyEngine("VoiceEngine", lambda: VoiceEngine("English", cache=AudioCache.from_env()))  # Default: English, Indian male
+    mark("engines created (lazy)")
+
+    # Optional periodic stats line / JSONL (MEDIBOT_STATS_LOG)
+    start_stats_log()
 
     # Launch UI
     start_ui(ai, voice)
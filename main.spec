@@ -1,16 +1,30 @@
 # -*- mode: python ; coding: utf-8 -*-
+# Desktop build. One-folder mode: the exe starts straight from disk instead of
+# unpacking every library to a temp dir on each launch, and UPX is off so DLLs
+# don't need decompressing at load time. Build with: pyinstaller main.spec
+import sys
 
+# Ship the compiled, memory-mappable KB rather than compiling it on first run
+sys.path.insert(0, SPECPATH)
+from kb_compiler import compile_kb
+compile_kb()
 
 a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[],
-    hiddenimports=[],
+    datas=[('kb/conditions.kb', 'kb'), ('geo/hospitals.csv', 'geo'), ('geo/places.csv', 'geo')],
+    # pyttsx3 picks its driver at runtime, so PyInstaller can't see it
+    hiddenimports=['pyttsx3.drivers', 'pyttsx3.drivers.sapi5'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Server-only and unused modules; keeps the bundle (and its load time) small
+    excludes=[
+        'flask', 'quart', 'uvicorn', 'gunicorn', 'tkinter', 'unittest', 'pydoc',
+        'PyQt5.QtWebEngineWidgets', 'PyQt5.QtWebEngineCore', 'PyQt5.QtQml',
+        'PyQt5.QtQuick', 'PyQt5.QtMultimedia', 'PyQt5.QtNetwork', 'PyQt5.QtSql',
+    ],
     noarchive=False,
     optimize=0,
 )
@@ -19,16 +33,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='main',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +47,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main',
+)
@@ -1,10 +1,19 @@
-from PyQt5.QtWidgets import *
-from PyQt5.QtGui import *
-from PyQt5.QtCore import *
+from PyQt5.QtWidgets import (
+    QApplication, QCheckBox, QComboBox, QFrame, QHBoxLayout, QInputDialog, QLabel,
+    QLineEdit, QMainWindow, QMessageBox, QPushButton, QVBoxLayout, QWidget,
+)
+from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt, QThreadPool, QTimer
 import sys
+from collections import deque
 
+from chat_view import ChatMessage, ChatView
 from medical_db import analyze_symptoms
 from hospital_finder import open_hospitals_near, auto_detect_and_open
+from qt_workers import Task
+from router import ROUTE_LOCAL, local_reply, route_message, spoken_texts
+from session_store import SessionStore, new_session_id
+from startup_timing import mark, report
 
 class MediBotUI(QMainWindow):
     def __init__(self, ai_engine, voice_engine):
@@ -16,6 +25,19 @@ class MediBotUI(QMainWindow):
         self.current_language = "English"
         self.voice_enabled = True
 
+        # Background work: AI requests run on the shared pool.
+        # Speech has its own thread inside VoiceEngine.
+        self.pool = QThreadPool.globalInstance()
+        self.tasks = set()              # keeps running tasks (and their signals) alive
+        self.current_request = None     # Task streaming the current AI reply
+        self.reply_message = None       # ChatMessage the current reply is written into
+        self.reply_started = False
+        self.pending_messages = deque() # (text, language) typed while a reply is pending
+
+        # One conversation per window: recent turns go with each question
+        self.sessions = SessionStore.from_env()
+        self.session_id = new_session_id()
+
         self.setWindowTitle("MediBot Pro - AI Health Assistant")
         self.setGeometry(200, 100, 1000, 600)
         self.setStyleSheet("background-color: #E3F2FD;")
@@ -134,9 +156,9 @@ class MediBotUI(QMainWindow):
         right.setStyleSheet("background-color: #f5faff;")
         vbox = QVBoxLayout(right)
 
-        self.chat_box = QTextEdit()
-        self.chat_box.setReadOnly(True)
-        self.chat_box.setStyleSheet("""
+        # Model/view list: only visible messages are laid out, old ones are archived
+        self.chat_view = ChatView()
+        self.chat_view.setStyleSheet("""
             background-color: white;
             font-size: 14px;
             border: 1px solid #90caf9;
@@ -162,36 +184,78 @@ class MediBotUI(QMainWindow):
         """)
         send_btn.clicked.connect(self.send_message)
 
+        self.stop_btn = QPushButton("■")
+        self.stop_btn.setFixedSize(45, 45)
+        self.stop_btn.setToolTip("Stop the current reply")
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.setStyleSheet("""
+            background-color: #90a4ae;
+            color: white;
+            border-radius: 10px;
+            font-size: 18px;
+        """)
+        self.stop_btn.clicked.connect(self.cancel_request)
+
         hbox = QHBoxLayout()
         hbox.addWidget(self.input_box)
         hbox.addWidget(send_btn)
+        hbox.addWidget(self.stop_btn)
 
-        vbox.addWidget(self.chat_box)
+        vbox.addWidget(self.chat_view)
         vbox.addLayout(hbox)
 
         self.layout.addWidget(right)
 
-        self.append_message("MediBot Pro",
-                            "Hello! I'm your AI health assistant.\n"
-                            "You can:\n"
-                            "• Type symptoms (e.g., 'I have headache and fever').\n"
-                            "• Click 'Symptom Check (Offline DB)' for quick info.\n"
-                            "• Click 'Find Nearby Hospital' to open hospitals in Google Maps.\n"
-                            "I only provide general information, not a medical diagnosis.")
+        self.append_message("MediBot Pro", local_reply("welcome", "English"))
 
     # ---------- CHAT HELPERS ----------
-    def append_message(self, sender, msg):
+    def _sender_html(self, sender):
         color = "#0d47a1" if sender == "MediBot Pro" else "#1e88e5"
-        formatted = "<p><b style='color:%s'>%s:</b> %s</p>" % (color, sender, msg)
-        self.chat_box.append(formatted)
+        return "<b style='color:%s'>%s:</b>" % (color, sender)
+
+    def append_message(self, sender, msg):
+        return self.chat_view.add_message(ChatMessage(self._sender_html(sender), msg))
+
+    def start_streamed_message(self, sender, placeholder):
+        """
+        Appends a message showing the placeholder and returns it. The first
+        text written to it replaces the placeholder; it stays in this message
+        even if other messages are appended below it meanwhile.
+        """
+        return self.chat_view.add_message(ChatMessage(self._sender_html(sender), plain=placeholder, placeholder=True))
+
+    def write_streamed_text(self, message, text):
+        self.chat_view.write(message, text)
+
+    def run_task(self, task):
+        self.tasks.add(task)
+        for sig in (task.signals.finished, task.signals.error, task.signals.cancelled):
+            sig.connect(lambda *_, t=task: self.tasks.discard(t))
+        self.pool.start(task)
 
     def change_language(self, lang_text):
         self.current_language = lang_text
         self.voice_engine.set_language(lang_text)
-        self.append_message("MediBot Pro", "Language set to %s." % lang_text)
+        msg = local_reply("language_set", lang_text) % lang_text
+        self.append_message("MediBot Pro", msg)
+        if self.voice_enabled and self.current_request is None:
+            self.voice_engine.speak(msg)
+        self.prerender_speech()
+
+    def prerender_speech(self):
+        """Has the voice engine render this language's fixed texts while it is idle (see audio_cache.py)."""
+        self.voice_engine.prerender(spoken_texts(self.current_language), self.current_language)
+
+    def greet(self):
+        """Reads out the welcome message once the window is up."""
+        if self.voice_enabled:
+            self.voice_engine.speak(local_reply("welcome", self.current_language))
+        self.prerender_speech()
 
     def toggle_voice(self, state):
         self.voice_enabled = (state == Qt.Checked)
+        if not self.voice_enabled:
+            self.voice_engine.cancel()
         status = "enabled" if self.voice_enabled else "disabled"
         self.append_message("MediBot Pro", "Voice output %s." % status)
 
@@ -208,7 +272,7 @@ class MediBotUI(QMainWindow):
         user_text = text.strip()
         self.append_message("You (Offline Symptom Check)", user_text)
 
-        result_html = analyze_symptoms(user_text)
+        result_html = analyze_symptoms(user_text, self.current_language)
         if result_html:
             self.append_message("MediBot Pro (Offline DB)", result_html)
         else:
@@ -232,8 +296,12 @@ class MediBotUI(QMainWindow):
             return
 
         if choice == QMessageBox.Yes:
-            msg = auto_detect_and_open()
-            self.append_message("MediBot Pro", msg)
+            # IP lookup is a network call; keep it off the GUI thread
+            self.append_message("MediBot Pro", "Detecting your approximate location...")
+            task = Task(auto_detect_and_open)
+            task.signals.finished.connect(lambda msg: self.append_message("MediBot Pro", msg))
+            task.signals.error.connect(lambda err: self.append_message("MediBot Pro", "Location lookup failed: %s" % err))
+            self.run_task(task)
         else:
             # Manual city / pincode input
             location, ok = QInputDialog.getText(
@@ -255,24 +323,119 @@ class MediBotUI(QMainWindow):
         self.append_message("You", user_msg)
         self.input_box.clear()
 
-        # First, show offline suggestion if any
-        offline_result = analyze_symptoms(user_msg)
-        if offline_result:
-            self.append_message("MediBot Pro (Offline DB)", offline_result)
-
-        # Then call AI engine
-        self.append_message("MediBot Pro", "Thinking...")
-        QApplication.processEvents()
+        if self.current_request is not None:
+            # A reply is still streaming; answer this one right after it
+            self.pending_messages.append((user_msg, self.current_language))
+            self.append_message("MediBot Pro", "(Queued – I'll answer this after the current reply.)")
+            return
 
-        reply = self.ai_engine.get_response(user_msg, self.current_language)
-        self.append_message("MediBot Pro", reply)
+        self.start_request(user_msg, self.current_language)
+
+    def start_request(self, user_msg, language):
+        # Barge-in: stop reading out the previous reply
+        self.voice_engine.cancel()
+
+        # First, show offline suggestion if any (local and fast)
+        route = route_message(user_msg, language)
+        if route.offline_html:
+            self.append_message("MediBot Pro (Offline DB)", route.offline_html)
+
+        # Local answer right away; "local" routes stop here, "local+refine"
+        # routes still ask the AI below
+        if route.local_reply:
+            self.append_message("MediBot Pro", route.local_reply)
+            if self.voice_enabled:
+                self.voice_engine.speak(route.spoken_reply)
+        if route.tier == ROUTE_LOCAL:
+            self.sessions.record(self.session_id, user_msg, route.local_reply)
+            if self.pending_messages:
+                QTimer.singleShot(0, lambda: self.start_request(*self.pending_messages.popleft()))
+            return
 
+        # Then stream the AI reply from a worker thread
+        self.reply_message = self.start_streamed_message("MediBot Pro", "Thinking...")
+        self.reply_started = False
+
+        # Resolve the engine inside the worker: with a LazyEngine that may
+        # still be warming up, the first request waits there, not on the GUI.
+        history = self.sessions.history(self.session_id)
+        task = Task(lambda m, l, h: self.ai_engine.stream_response(m, l, h, route), user_msg, language, history)
+        task.signals.chunk.connect(lambda chunk, t=task: self.on_reply_chunk(t, chunk))
+        task.signals.finished.connect(lambda reply, t=task: self.on_reply_finished(t, reply))
+        task.signals.error.connect(lambda err, t=task: self.on_reply_finished(t, "⚠ %s" % err, failed=True))
+        task.signals.cancelled.connect(lambda t=task: self.on_reply_finished(t, None))
+
+        self.current_request = task
+        self.stop_btn.setEnabled(True)
+        self.run_task(task)
+
+    def on_reply_chunk(self, task, chunk):
+        if task is not self.current_request:
+            return
+        if not self.reply_started:
+            chunk = chunk.lstrip()
+            self.reply_started = True
+        self.write_streamed_text(self.reply_message, chunk)
         if self.voice_enabled:
-            self.voice_engine.speak(reply)
+            # Speech starts as soon as the first sentence is complete
+            self.voice_engine.feed(chunk)
+
+    def on_reply_finished(self, task, reply, failed=False):
+        if task is not self.current_request:
+            return
+        if failed or not self.reply_started:
+            self.write_streamed_text(self.reply_message, reply or "")
+
+        self.current_request = None
+        self.reply_message = None
+        self.stop_btn.setEnabled(False)
+
+        if reply and not failed:
+            self.sessions.record(self.session_id, task.args[0], reply)
+            if self.voice_enabled:
+                self.voice_engine.finish()
+
+        if self.pending_messages:
+            user_msg, language = self.pending_messages.popleft()
+            self.start_request(user_msg, language)
+
+    def cancel_request(self):
+        task = self.current_request
+        if task is None:
+            return
+        task.cancel()
+        self.voice_engine.cancel()
+        self.write_streamed_text(self.reply_message, " [stopped]")
+        # Release the UI now; the worker drops the rest of the stream
+        self.on_reply_finished(task, None)
 
 
 def start_ui(ai_engine, voice_engine):
     app = QApplication(sys.argv)
     window = MediBotUI(ai_engine, voice_engine)
     window.show()
-    sys.exit(app.exec_())
+    mark("window shown")
+
+    # Once the first frame is painted, build the engines in the background
+    def warm_engines():
+        mark("event loop running")
+        engines = [e for e in (ai_engine, voice_engine) if hasattr(e, "warm")]
+        remaining = [len(engines)]
+
+        def done():
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                mark("engines warm")
+                report()
+
+        for engine in engines:
+            engine.warm(on_done=done)
+        if not engines:
+            report()
+        # Only queues work for the speech thread
+        window.greet()
+
+    QTimer.singleShot(0, warm_engines)
+    code = app.exec_()
+    QThreadPool.globalInstance().waitForDone(2000)
+    sys.exit(code)
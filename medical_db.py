@@ -5,135 +5,290 @@ This is NOT a diagnosis tool. It only gives general info + first-aid style advic
 Always tell user to see a real doctor.
 """
 
-CONDITIONS = [
-    {
-        "name": "Common Cold / Viral Infection",
-        "keywords": ["cold", "runny nose", "sneezing", "sneeze", "blocked nose", "stuffy nose"],
-        "symptoms": "Sneezing, runny or blocked nose, mild throat irritation, sometimes low-grade fever.",
-        "first_aid": (
-            "• Rest well and drink plenty of warm fluids.\n"
-            "• You can use saline nasal drops or steam inhalation for blocked nose.\n"
-            "• Simple paracetamol can help for fever or body pain (if not allergic and as per package/doctor)."
-        ),
-        "see_doctor": (
-            "• If high fever lasts more than 3 days,\n"
-            "• If you have breathing difficulty,\n"
-            "• If chest pain or very bad throat pain develops."
-        ),
-    },
-    {
-        "name": "Fever (General)",
-        "keywords": ["fever", "temperature", "high temperature"],
-        "symptoms": "Rise in body temperature, may have chills, body pain, headache, tiredness.",
-        "first_aid": (
-            "• Check temperature with a thermometer every few hours.\n"
-            "• Drink plenty of water and oral fluids.\n"
-            "• Use light clothing and keep the room cool.\n"
-            "• Paracetamol in correct dose may be used for relief (if not allergic and as per package/doctor)."
-        ),
-        "see_doctor": (
-            "• If fever is more than 101°F (38.3°C) and persists more than 2–3 days,\n"
-            "• If associated with rash, breathing difficulty, chest pain, confusion, or severe weakness."
-        ),
-    },
-    {
-        "name": "Migraine / Headache (Common)",
-        "keywords": ["headache", "migraine", "head pain"],
-        "symptoms": "Pain in head, sometimes with nausea, sensitivity to light or sound.",
-        "first_aid": (
-            "• Rest in a quiet, dark room.\n"
-            "• Drink water; dehydration can worsen headache.\n"
-            "• You may use simple pain relievers (like paracetamol) if not allergic and as per doctor/package.\n"
-        ),
-        "see_doctor": (
-            "• If headache is sudden and very severe,\n"
-            "• If associated with weakness, vision changes, confusion, or difficulty speaking,\n"
-            "• If headache occurs after head injury or with high fever and neck stiffness."
-        ),
-    },
-    {
-        "name": "Gastric Acidity / Indigestion",
-        "keywords": ["acidity", "gastric", "gas", "indigestion", "heartburn"],
-        "symptoms": "Burning in chest or upper abdomen, sour taste, bloating, discomfort after meals.",
-        "first_aid": (
-            "• Avoid spicy, oily, and heavy meals for some time.\n"
-            "• Eat smaller, more frequent meals.\n"
-            "• Do not lie down immediately after eating.\n"
-            "• Simple antacid syrups or tablets (as per doctor’s advice) can give relief."
-        ),
-        "see_doctor": (
-            "• If pain is very severe or radiates to arm/jaw (could be heart-related),\n"
-            "• If vomiting, weight loss, or black stools appear,\n"
-            "• If chest pain occurs with sweating or breathlessness – this is an emergency."
-        ),
-    },
-    {
-        "name": "Possible Respiratory Infection",
-        "keywords": ["cough", "breathless", "breathing", "shortness of breath", "sputum", "phlegm"],
-        "symptoms": "Cough, sometimes with mucus, chest discomfort, sometimes fever or breathlessness.",
-        "first_aid": (
-            "• Sip warm water or herbal teas to soothe throat.\n"
-            "• Avoid smoking and dusty areas.\n"
-            "• Simple cough lozenges may give short relief (if not allergic)."
-        ),
-        "see_doctor": (
-            "• If you have fast or difficult breathing,\n"
-            "• If lips/face look bluish,\n"
-            "• If high fever persists,\n"
-            "• If chest pain or coughing blood is present.\n"
-            "These signs need urgent medical attention."
-        ),
-    },
-    {
-        "name": "Possible Dehydration",
-        "keywords": ["vomit", "vomiting", "loose motion", "diarrhea", "diarrhoea", "dehydrated", "dry mouth"],
-        "symptoms": "Dry mouth, feeling very thirsty, passing very little urine, dizziness, weakness.",
-        "first_aid": (
-            "• Take frequent sips of ORS (oral rehydration solution) or salted-sugary fluids.\n"
-            "• Avoid heavy, oily, and spicy food.\n"
-            "• Rest in a cool place."
-        ),
-        "see_doctor": (
-            "• If vomiting or loose motions are frequent and severe,\n"
-            "• If there is blood in stool or vomit,\n"
-            "• If very little or no urine is passed,\n"
-            "• If the person is very drowsy or confused."
-        ),
-    },
-]
-
-def analyze_symptoms(user_text: str) -> str:
-    """
-    Very naive keyword-based matcher. Returns a formatted string if something matches,
-    otherwise returns empty string.
-    """
-    text = user_text.lower()
-    results = []
-
-    for cond in CONDITIONS:
-        for kw in cond["keywords"]:
-            if kw in text:
-                results.append(cond)
-                break  # avoid duplicate adds for same condition
+import html
+import os
+import sys
+import threading
+import weakref
+from functools import partial
+
+from kb_reloader import KBReloader
+from metrics import stage
+
+# The KB itself lives in kb/conditions.json and is compiled to kb/conditions.kb
+# (see kb_compiler.py). The compiled file is memory-mapped, so opening it is
+# cheap whatever its size and all processes share its pages. Edits to either
+# file are picked up while running (see kb_reloader.py).
+_BASE_DIR = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+KB_SOURCE = os.getenv("MEDIBOT_KB_SOURCE", os.path.join(_BASE_DIR, "kb", "conditions.json"))
+KB_PATH = os.getenv("MEDIBOT_KB_PATH", os.path.join(_BASE_DIR, "kb", "conditions.kb"))
+KB_CHECK_INTERVAL = float(os.getenv("MEDIBOT_KB_CHECK_INTERVAL", "2"))
+
+# How many matched conditions the offline block shows, best first
+TOP_K = int(os.getenv("MEDIBOT_TOP_K", "3"))
+
+# Typos tolerated per word ("hedache"), at most 2; 0 turns correction off.
+# Short words get fewer (see fuzzy_index.py).
+FUZZY_DISTANCE = int(os.getenv("MEDIBOT_FUZZY_DISTANCE", "2"))
+
+# One ranker per KB version, dropped with it
+_rankers = weakref.WeakKeyDictionary()
+_ranker_lock = threading.Lock()
+
+
+def get_ranker(kb=None):
+    """BM25 ranker over the conditions of `kb` (see ranker.py), built on first use."""
+    if kb is None:
+        kb = KB
+    ranker = _rankers.get(kb)
+    if ranker is None:
+        with _ranker_lock:
+            ranker = _rankers.get(kb)
+            if ranker is None:
+                # NumPy is imported here, not at startup
+                from ranker import Ranker
+                ranker = _rankers[kb] = Ranker(kb.conditions)
+    return ranker
+
+
+def _prepare(kb):
+    # Build the new version's ranker before the swap, if this process uses one
+    if KB in _rankers:
+        get_ranker(kb)
+
+
+def _swap(kb):
+    global KB, CONDITIONS
+    KB, CONDITIONS = kb, kb.conditions
+
+
+_reloader = KBReloader(KB_PATH, KB_SOURCE, KB_CHECK_INTERVAL, prepare=_prepare, on_swap=_swap)
+
+KB = _reloader.kb
+
+# Sequence of condition dicts, decoded lazily from the mapped file
+CONDITIONS = KB.conditions
+
+
+def current_kb():
+    """
+    The live KB. Callers that make several calls on it should take it once,
+    so a reload in between cannot mix two versions.
+    """
+    _reloader.current()
+    return KB
+
+
+def reload_kb() -> bool:
+    """Picks up a changed KB now rather than on the next check. True if it changed."""
+    return _reloader.reload()
+
+
+def kb_stats() -> dict:
+    return _reloader.stats()
+
+
+# Fallback labels if the KB file has none for a language
+_DEFAULT_LABELS = {
+    "title": "🔎 *Offline Symptom Check (Not a diagnosis)*",
+    "condition": "📌 Possible related condition:",
+    "symptoms": "• Typical symptoms:",
+    "first_aid": "🩹 First-aid style guidance:",
+    "see_doctor": "⚠ When you should see a doctor:",
+    "disclaimer": "❗ This is only general information. Please consult a qualified doctor for proper diagnosis and treatment.",
+    "corrected": "🔤 Showing results for:",
+}
+
+
+def localize(cond: dict, language: str = "English") -> dict:
+    """The condition with its text fields in `language`, falling back to English."""
+    translated = cond.get("i18n", {}).get(language)
+    if not translated:
+        return cond
+    merged = dict(cond)
+    for field in ("name", "symptoms", "first_aid", "see_doctor"):
+        if translated.get(field):
+            merged[field] = translated[field]
+    return merged
+
+
+def correct_spelling(user_text: str, language: str = "English", kb=None):
+    """
+    (corrected text, {typed word: correction}) for misspelled keyword words,
+    e.g. "hedache" -> "headache". The text is returned lower-cased.
+    """
+    if kb is None:
+        kb = current_kb()
+    return kb.fuzzy_for(language).correct(user_text, FUZZY_DISTANCE)
+
+
+def find_conditions(user_text: str, language: str = "English", top_k: int = None, kb=None):
+    """
+    Returns ([(condition, matched_keywords)], corrections), most relevant
+    first. Misspelled keyword words are corrected first (corrections maps
+    each typed word to the word it was read as). The message is then
+    scanned once with the keyword index for `language` (its native and
+    romanized keywords plus the English ones), and the conditions it finds
+    are ordered by their BM25 score for the whole message. `kb` defaults
+    to the live KB.
+    """
+    if kb is None:
+        kb = current_kb()
+    text, corrections = correct_spelling(user_text, language, kb)
+    found = kb.match(text, language)
+    order = sorted(found)
+    if len(order) > 1:
+        scores = get_ranker(kb).score(text)
+        order.sort(key=lambda idx: -scores[idx])
+    if top_k:
+        order = order[:top_k]
+    return [(kb.conditions[idx], found[idx]) for idx in order], corrections
+
+
+def match_conditions(user_text: str, language: str = "English", top_k: int = None, kb=None):
+    """find_conditions without the corrections: [(condition, matched_keywords)]."""
+    return find_conditions(user_text, language, top_k, kb)[0]
+
+
+def rank_conditions(user_text: str, k: int = TOP_K):
+    """
+    [(condition, score)] for the k best-scoring conditions, whether or not
+    one of their keywords matched exactly.
+    """
+    kb = current_kb()
+    return [(kb.conditions[idx], score) for idx, score in get_ranker(kb).top_k(user_text, k)]
+
+
+def analyze_symptoms(user_text: str, language: str = "English", top_k: int = TOP_K) -> str:
+    """
+    Keyword-based matcher. Returns a formatted string if something matches,
+    otherwise returns empty string. The answer is written in `language`
+    where the KB has a translation, and shows the `top_k` most relevant
+    conditions.
+    """
+    with stage("analyze_symptoms"):
+        kb = current_kb()
+        results, corrections = find_conditions(user_text, language, top_k, kb)
+        return format_conditions([cond for cond, _ in results], language, corrections, kb)
+
+
+def analyze_symptoms_batch(items, top_k: int = TOP_K, chunk: int = 256, with_counts: bool = False):
+    """
+    analyze_symptoms for many (user_text, language) pairs. Messages that
+    match more than one condition are ranked together, `chunk` at a time,
+    with one batch scoring call each.
+    with_counts: return (html list, number of conditions each message matched).
+    """
+    kb = current_kb()
+    corrected, found = _match_batch(items, kb)
+    ranked = [sorted(f) for f in found]
+
+    multi = [i for i, f in enumerate(found) if len(f) > 1]
+    for start in range(0, len(multi), chunk):
+        part = multi[start:start + chunk]
+        scores = get_ranker(kb).score_batch([corrected[i][0] for i in part])
+        for row, i in zip(scores, part):
+            ranked[i].sort(key=lambda idx: -row[idx])
+
+    html = [
+        format_conditions([kb.conditions[idx] for idx in order[:top_k]], language, corrections, kb)
+        for order, (_, language), (_, corrections) in zip(ranked, items, corrected)
+    ]
+    if with_counts:
+        return html, [len(f) for f in found]
+    return html
+
+
+def _match_batch(items, kb):
+    corrected = [correct_spelling(text, language, kb) for text, language in items]
+    found = [kb.match(text, language) for (text, _), (_, language) in zip(corrected, items)]
+    return corrected, found
+
+
+def triage_batch(items, top_k: int = None, chunk: int = 256):
+    """
+    find_conditions for many (user_text, language) pairs, as plain data for
+    bulk analysis (see bulk_triage.py). One dict per item:
+        {"matches": [{"id": ..., "keywords": [...], "score": 4.21}, ...],
+         "corrections": {typed word: correction}}
+    best match first; score is the condition's BM25 score for the message.
+    Messages with a match are scored `chunk` at a time.
+    """
+    kb = current_kb()
+    corrected, found = _match_batch(items, kb)
+    results = [{"matches": [], "corrections": corrections} for _, corrections in corrected]
+
+    hits = [i for i, f in enumerate(found) if f]
+    for start in range(0, len(hits), chunk):
+        part = hits[start:start + chunk]
+        scores = get_ranker(kb).score_batch([corrected[i][0] for i in part])
+        for row, i in zip(scores, part):
+            order = sorted(found[i], key=lambda idx: (-row[idx], idx))
+            results[i]["matches"] = [
+                {"id": kb.conditions[idx]["id"], "keywords": found[i][idx], "score": round(float(row[idx]), 4)}
+                for idx in order[:top_k or None]
+            ]
+    return results
+
+
+def _labels(language, kb=None):
+    labels = dict(_DEFAULT_LABELS)
+    labels.update((KB if kb is None else kb).labels.get(language, {}))
+    return labels
+
+
+def _spoken_label(label):
+    # "🩹 First-aid style guidance:" -> "First-aid style guidance:"
+    i = 0
+    while i < len(label) and not label[i].isalnum():
+        i += 1
+    return label[i:]
+
+
+def spoken_guidance(cond: dict, language: str = "English", kb=None) -> str:
+    """A condition's name, first-aid and see-a-doctor advice as plain text to read out."""
+    cond = localize(cond, language)
+    labels = _labels(language, kb)
+    return "\n".join([
+        cond["name"],
+        _spoken_label(labels["first_aid"]), cond["first_aid"],
+        _spoken_label(labels["see_doctor"]), cond["see_doctor"],
+    ])
+
+
+def format_conditions(conditions, language: str = "English", corrections=None, kb=None) -> str:
+    """
+    Renders matched conditions as the offline HTML block ("" if none).
+    corrections ({typed word: correction}) are listed under the title;
+    labels come from `kb` (default: the live KB). Condition text and the
+    typed words are escaped; labels may hold markup.
+    """
+    results = [localize(cond, language) for cond in conditions]
+    esc = partial(html.escape, quote=False)
 
     if not results:
         return ""
 
+    labels = _labels(language, kb)
+
     lines = []
-    lines.append("🔎 *Offline Symptom Check (Not a diagnosis)*")
+    lines.append(labels["title"])
+    if corrections:
+        lines.append("%s %s" % (labels["corrected"], ", ".join(
+            "<b>%s</b> (%s)" % (esc(fixed), esc(typed)) for typed, fixed in corrections.items())))
     for cond in results:
         lines.append("")
-        lines.append("📌 Possible related condition: <b>%s</b>" % cond["name"])
-        lines.append("• Typical symptoms: %s" % cond["symptoms"])
+        lines.append("%s <b>%s</b>" % (labels["condition"], esc(cond["name"])))
+        lines.append("%s %s" % (labels["symptoms"], esc(cond["symptoms"])))
         lines.append("")
-        lines.append("🩹 First-aid style guidance:")
-        lines.append(cond["first_aid"])
+        lines.append(labels["first_aid"])
+        lines.append(esc(cond["first_aid"]))
         lines.append("")
-        lines.append("⚠ When you should see a doctor:")
-        lines.append(cond["see_doctor"])
+        lines.append(labels["see_doctor"])
+        lines.append(esc(cond["see_doctor"]))
 
     lines.append("")
-    lines.append("❗ This is only general information. Please consult a qualified doctor for proper diagnosis and treatment.")
+    lines.append(labels["disclaimer"])
 
     # Join with <br> so that QTextEdit renders nicely as HTML
     return "<br>".join(lines)
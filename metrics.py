@@ -0,0 +1,301 @@
+# metrics.py
+"""
+In-process metrics: counters, gauges and histograms.
+
+Recording a value is a dict update under a lock (about a microsecond), so
+stages can be timed on the hot path. The servers expose everything in
+Prometheus text format on /metrics; the desktop app can log a summary
+periodically:
+
+    MEDIBOT_STATS_LOG=1            print a stats line every MEDIBOT_STATS_INTERVAL seconds
+    MEDIBOT_STATS_LOG=stats.jsonl  append one JSON line per interval to that file
+    MEDIBOT_STATS_INTERVAL         seconds between lines (default 60)
+
+Metrics:
+    medibot_stage_seconds{stage}        time per stage (analyze_symptoms, route,
+                                        llm, llm_first_token, render_index, tts_sentence...)
+    medibot_requests_total{endpoint,status}
+    medibot_request_seconds{endpoint}   time until the response (first byte for streams)
+    medibot_inflight_requests{endpoint}
+    medibot_errors_total{kind}          MediAIError kinds, plus "exception"
+    medibot_tokens_total{type}          prompt / completion tokens reported by OpenAI
+    medibot_request_tokens              total tokens per LLM call
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; from cache hits (sub-ms) to slow LLM answers
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200, 6400)
+
+_registry = []
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s %s" % (self.name, self.kind)]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append("%s%s %s" % (self.name, _format_labels(self.labelnames, key), _format_value(value)))
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return {",".join(key) or "": value for key, value in self._values.items()}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """+1 while the block runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class CallbackGauge(_Metric):
+    """A gauge read from fn() at scrape time; fn returns a number or {label value: number}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn, labelname: str = None):
+        super().__init__(name, help, (labelname,) if labelname else ())
+        self._fn = fn
+
+    def _read(self):
+        try:
+            value = self._fn()
+        except Exception:
+            return {}
+        if isinstance(value, dict):
+            return {(str(k),): v for k, v in value.items()}
+        return {(): value} if value is not None else {}
+
+    def render(self):
+        with self._lock:
+            self._values = self._read()
+        return super().render()
+
+    def snapshot(self):
+        with self._lock:
+            self._values = self._read()
+        return super().snapshot()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        # Bucket counts are stored per bucket and summed when rendered
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes how long the block took, in seconds."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s histogram" % self.name]
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        for key, (counts, count, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                lines.append("%s_bucket%s %d" % (
+                    self.name, _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))]), cumulative))
+            lines.append("%s_sum%s %r" % (self.name, _format_labels(self.labelnames, key), total))
+            lines.append("%s_count%s %d" % (self.name, _format_labels(self.labelnames, key), count))
+        return lines
+
+    def quantile(self, q: float, **labels):
+        """Estimated from the buckets (linear within a bucket); None if empty."""
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None or not state[1]:
+                return None
+            counts, count = list(state[0]), state[1]
+        return _bucket_quantile(self.buckets, counts, count, q)
+
+    def snapshot(self):
+        with self._lock:
+            items = [(key, list(s[0]), s[1], s[2]) for key, s in self._values.items()]
+        return {
+            ",".join(key): {
+                "count": count,
+                "mean": total / count if count else 0.0,
+                "p50": _bucket_quantile(self.buckets, counts, count, 0.5),
+                "p95": _bucket_quantile(self.buckets, counts, count, 0.95),
+            }
+            for key, counts, count, total in items
+        }
+
+
+def _bucket_quantile(buckets, counts, count, q):
+    rank = q * count
+    cumulative = 0
+    lower = 0.0
+    for bound, n in zip(buckets + (buckets[-1],), counts):
+        if n and cumulative + n >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / n
+        cumulative += n
+        lower = bound
+    return buckets[-1]
+
+
+# ---------- METRICS ----------
+STAGE_SECONDS = Histogram("medibot_stage_seconds", "Time spent per processing stage.", ("stage",))
+REQUESTS = Counter("medibot_requests_total", "HTTP requests handled.", ("endpoint", "status"))
+REQUEST_SECONDS = Histogram("medibot_request_seconds", "Time until the response was returned.", ("endpoint",))
+INFLIGHT = Gauge("medibot_inflight_requests", "Requests being processed.", ("endpoint",))
+ERRORS = Counter("medibot_errors_total", "Errors by kind.", ("kind",))
+TOKENS = Counter("medibot_tokens_total", "OpenAI tokens used.", ("type",))
+REQUEST_TOKENS = Histogram("medibot_request_tokens", "Total tokens per LLM call.", buckets=TOKEN_BUCKETS)
+
+
+def stage(name: str):
+    """Context manager timing one stage: `with stage("llm"): ...`"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def record_usage(usage):
+    """Counts the tokens of an OpenAI `usage` object (None is ignored)."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    TOKENS.inc(prompt, type="prompt")
+    TOKENS.inc(completion, type="completion")
+    REQUEST_TOKENS.observe(prompt + completion)
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def snapshot() -> dict:
+    return {metric.name: metric.snapshot() for metric in _registry}
+
+
+# ---------- PERIODIC STATS LOG (desktop) ----------
+def format_stats() -> str:
+    parts = []
+    for stage_name, s in sorted(STAGE_SECONDS.snapshot().items()):
+        parts.append("%s n=%d p50=%.1fms p95=%.1fms" % (stage_name, s["count"], s["p50"] * 1000, s["p95"] * 1000))
+    tokens = TOKENS.snapshot()
+    if tokens:
+        parts.append("tokens=%d" % sum(tokens.values()))
+    errors = ERRORS.snapshot()
+    if errors:
+        parts.append("errors=" + ",".join("%s:%d" % kv for kv in sorted(errors.items())))
+    return "📊 " + ("; ".join(parts) if parts else "no activity yet")
+
+
+def start_stats_log():
+    """Starts the periodic stats log if MEDIBOT_STATS_LOG is set. Returns the thread or None."""
+    target = os.getenv("MEDIBOT_STATS_LOG", "").strip()
+    if not target:
+        return None
+    interval = float(os.getenv("MEDIBOT_STATS_INTERVAL", "60"))
+
+    def run():
+        while True:
+            time.sleep(interval)
+            if target == "1":
+                print(format_stats())
+                continue
+            try:
+                with open(target, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(snapshot(), time=time.time())) + "\n")
+            except OSError as e:
+                print("⚠ Could not write stats log:", e)
+
+    thread = threading.Thread(target=run, name="stats-log", daemon=True)
+    thread.start()
+    return thread
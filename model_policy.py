@@ -0,0 +1,306 @@
+# model_policy.py
+"""
+Model tier and output budget for each LLM request.
+
+A one-word "thanks" does not need the same model, or room for the same
+answer length, as a long description of several symptoms. Every request is
+classified first (classify_request):
+    intent      emergency | smalltalk (greeting, thanks, bye) | medication | symptoms | general
+    words       length of the message
+    conditions  KB conditions it matches offline
+    language    the answer language
+    follow_up   earlier turns were sent with it
+and the first matching rule of the policy picks a tier. Each tier is a
+model with an output budget (max_tokens) and a word limit put in the
+prompt, so answers end well before the budget instead of being cut off.
+Budgets are set for English and multiplied by the language's factor:
+Indic scripts take more tokens per word.
+
+Default tiers and rules (DEFAULT_POLICY):
+    small     gpt-4.1-nano  160 tokens   greetings, thanks and goodbyes only
+    standard  gpt-4.1-mini  450 tokens   every health question, matched in the KB or not;
+                                         short medicine questions with 300 tokens
+    large     gpt-4.1       700 tokens   emergencies, 60+ words, 3+ matched conditions,
+                                         long follow-ups
+
+MEDIBOT_MODEL_POLICY names a JSON file that changes any of it:
+    {"tiers": {"small": {"model": "gpt-4.1-nano", "max_tokens": 160, "words": 80}, ...},
+     "language_factor": {"Hindi": 2.0},
+     "rules": [{"intent": "smalltalk", "tier": "small", "max_tokens": 120},
+               {"min_words": 60, "tier": "large", "max_tokens": 900},
+               {"tier": "standard"}]}
+Tiers and language factors are merged into the defaults; "rules", if
+given, replace them. A rule matches when all of its conditions hold:
+intent and language (a value or a list), min_words / max_words,
+min_conditions / max_conditions, follow_up (true / false). The last rule
+should have no conditions.
+
+Every request is recorded: tier, model, intent, budget, tokens used,
+latency and whether the answer hit the budget. Totals and recent
+requests are in ModelPolicy.stats() (/api/llm/stats) and in
+medibot_llm_* metrics.
+
+Settings (environment variables):
+    MEDIBOT_MODEL_POLICY  JSON policy file (see above)
+    MEDIBOT_MODEL         one model for every request, without output limits (turns tiering off)
+"""
+import copy
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+from symptom_matcher import KeywordMatcher
+
+DEFAULT_POLICY = {
+    "tiers": {
+        "small": {"model": "gpt-4.1-nano", "max_tokens": 160, "words": 80},
+        "standard": {"model": "gpt-4.1-mini", "max_tokens": 450, "words": 250},
+        "large": {"model": "gpt-4.1", "max_tokens": 700, "words": 350},
+    },
+    # Tokens per word relative to English
+    "language_factor": {"English": 1.0, "Hindi": 2.0, "Tamil": 2.5, "Telugu": 2.5},
+    "rules": [
+        {"intent": "emergency", "tier": "large"},
+        {"intent": "smalltalk", "tier": "small"},
+        {"min_words": 60, "tier": "large"},
+        {"min_conditions": 3, "tier": "large"},
+        {"follow_up": True, "min_words": 30, "tier": "large"},
+        {"intent": "medication", "max_words": 25, "tier": "standard", "max_tokens": 300, "words": 150},
+        {"tier": "standard"},
+    ],
+}
+
+RULE_CONDITIONS = ("intent", "language", "min_words", "max_words", "min_conditions", "max_conditions", "follow_up")
+RULE_SETTINGS = ("tier", "max_tokens", "words")
+
+INTENTS = ("emergency", "smalltalk", "medication", "symptoms", "general")
+
+MEDICATION_KEYWORDS = [
+    "medicine", "medication", "tablet", "tablets", "capsule", "syrup", "dose", "dosage", "mg",
+    "paracetamol", "ibuprofen", "antibiotic", "antibiotics", "side effect", "side effects",
+    "can i take", "how much should i take", "ointment", "injection",
+    # Hindi
+    "दवा", "दवाई", "गोली", "खुराक", "dawa", "dawai", "goli", "khurak",
+    # Tamil
+    "மருந்து", "மாத்திரை", "marundhu", "maathirai",
+    # Telugu
+    "మందు", "మాత్ర", "mandu", "maatra",
+]
+_MEDICATION = KeywordMatcher((kw, "medication") for kw in MEDICATION_KEYWORDS)
+
+# Requests kept for stats()
+RECENT_REQUESTS = 50
+LATENCY_SAMPLES = 1024
+
+LLM_REQUESTS = metrics.Counter("medibot_llm_requests_total", "LLM calls by model tier and request intent.",
+                               ("tier", "intent", "outcome"))
+LLM_SECONDS = metrics.Histogram("medibot_llm_seconds", "LLM call latency by model tier.", ("tier",))
+LLM_TOKENS = metrics.Counter("medibot_llm_tokens_total", "LLM tokens by model tier.", ("tier", "type"))
+
+
+class RequestProfile:
+    __slots__ = ("intent", "words", "conditions", "language", "follow_up")
+
+    def __init__(self, intent, words, conditions, language, follow_up):
+        self.intent = intent
+        self.words = words
+        self.conditions = conditions
+        self.language = language
+        self.follow_up = follow_up
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Plan:
+    """What one request is sent with."""
+    __slots__ = ("tier", "model", "max_tokens", "words", "profile", "started")
+
+    def __init__(self, tier, model, max_tokens, words, profile):
+        self.tier = tier
+        self.model = model
+        self.max_tokens = max_tokens  # None: no limit
+        self.words = words            # answer length asked for in the prompt, or None
+        self.profile = profile
+        self.started = time.perf_counter()
+
+
+def classify_request(user_text: str, language: str = "English", history=None, route=None,
+                     conditions: int = None) -> RequestProfile:
+    """
+    route: the message's router.Route, if it was routed already; its intent
+    and matched conditions are used instead of matching the message again.
+    conditions: without a route, how many KB conditions the message matches,
+    if a bulk pass already knows (see chat_batch.py).
+    """
+    text = user_text or ""
+    words = len(text.split())
+    if route is not None:
+        intent = route.intent
+        conditions = len(route.matched)
+    else:
+        # Imported here: router loads the KB
+        from medical_db import find_conditions
+        from router import message_intent
+
+        intent = message_intent(text)
+        if intent == "emergency":
+            conditions = 0
+        elif conditions is None:
+            conditions = len(find_conditions(text, language)[0])
+    if intent != "emergency":
+        if intent and not conditions:
+            intent = "smalltalk"
+        elif _MEDICATION.match(text.lower()):
+            intent = "medication"
+        else:
+            intent = "symptoms" if conditions else "general"
+    return RequestProfile(intent, words, conditions, language, bool(history))
+
+
+def _as_set(value):
+    return {value} if isinstance(value, (str, bool)) else set(value)
+
+
+def _rule_matches(rule, profile):
+    if "intent" in rule and profile.intent not in _as_set(rule["intent"]):
+        return False
+    if "language" in rule and profile.language not in _as_set(rule["language"]):
+        return False
+    if "follow_up" in rule and profile.follow_up != rule["follow_up"]:
+        return False
+    if profile.words < rule.get("min_words", 0) or profile.words > rule.get("max_words", profile.words):
+        return False
+    if profile.conditions < rule.get("min_conditions", 0) or \
+            profile.conditions > rule.get("max_conditions", profile.conditions):
+        return False
+    return True
+
+
+class ModelPolicy:
+    def __init__(self, policy: dict = None, fixed_model: str = None):
+        """
+        policy: DEFAULT_POLICY-shaped dict, merged into the defaults (see module docstring).
+        fixed_model: send everything to this model with no output limit instead.
+        """
+        merged = copy.deepcopy(DEFAULT_POLICY)
+        if policy:
+            for name, tier in policy.get("tiers", {}).items():
+                merged["tiers"].setdefault(name, {}).update(tier)
+            merged["language_factor"].update(policy.get("language_factor", {}))
+            if "rules" in policy:
+                merged["rules"] = list(policy["rules"])
+        self._validate(merged)
+        self.tiers = merged["tiers"]
+        self.language_factor = merged["language_factor"]
+        self.rules = merged["rules"]
+        self.fixed_model = fixed_model
+
+        self._lock = threading.Lock()
+        self._totals = {}    # tier -> counters
+        self._latency = {}   # tier -> recent latencies (seconds)
+        self._recent = deque(maxlen=RECENT_REQUESTS)
+
+    @classmethod
+    def from_env(cls, default_model: str = None):
+        """MEDIBOT_MODEL / default_model fixes the model; otherwise MEDIBOT_MODEL_POLICY or the defaults."""
+        fixed = os.getenv("MEDIBOT_MODEL") or default_model
+        if fixed:
+            return cls(fixed_model=fixed)
+        path = os.getenv("MEDIBOT_MODEL_POLICY")
+        if not path:
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _validate(policy):
+        for name, tier in policy["tiers"].items():
+            if not tier.get("model"):
+                raise ValueError("model policy: tier %r has no model" % name)
+        if not policy["rules"]:
+            raise ValueError("model policy: no rules")
+        for rule in policy["rules"]:
+            unknown = set(rule) - set(RULE_CONDITIONS) - set(RULE_SETTINGS)
+            if unknown:
+                raise ValueError("model policy: unknown rule field(s) %s" % ", ".join(sorted(unknown)))
+            if rule.get("tier") not in policy["tiers"]:
+                raise ValueError("model policy: rule %r names an unknown tier" % rule)
+            if "intent" in rule and not _as_set(rule["intent"]) <= set(INTENTS):
+                raise ValueError("model policy: rule %r has an unknown intent" % rule)
+
+    # ---------- CHOOSE ----------
+    def plan(self, user_text: str, language: str = "English", history=None, route=None,
+             conditions: int = None) -> Plan:
+        """Classifies the request (see classify_request) and picks its tier, model and budget."""
+        if self.fixed_model:
+            return Plan("fixed", self.fixed_model, None, None, None)
+        return self.choose(classify_request(user_text, language, history, route, conditions))
+
+    def choose(self, profile: RequestProfile) -> Plan:
+        rule = next((r for r in self.rules if _rule_matches(r, profile)), self.rules[-1])
+        tier = self.tiers[rule["tier"]]
+        max_tokens = rule.get("max_tokens", tier.get("max_tokens"))
+        if max_tokens:
+            max_tokens = int(max_tokens * self.language_factor.get(profile.language, 1.0))
+        return Plan(rule["tier"], tier["model"], max_tokens, rule.get("words", tier.get("words")), profile)
+
+    # ---------- RECORD ----------
+    def record(self, plan: Plan, usage=None, truncated: bool = False, error: str = None):
+        """After the call (or its failure): tokens from the OpenAI `usage` object, latency since plan()."""
+        seconds = time.perf_counter() - plan.started
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        intent = plan.profile.intent if plan.profile else ""
+        outcome = "error" if error else "truncated" if truncated else "ok"
+
+        LLM_REQUESTS.inc(tier=plan.tier, intent=intent, outcome=outcome)
+        LLM_SECONDS.observe(seconds, tier=plan.tier)
+        LLM_TOKENS.inc(prompt, tier=plan.tier, type="prompt")
+        LLM_TOKENS.inc(completion, tier=plan.tier, type="completion")
+
+        entry = {
+            "time": int(time.time()),
+            "tier": plan.tier,
+            "model": plan.model,
+            "max_tokens": plan.max_tokens,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "latency_ms": round(seconds * 1000, 1),
+            "outcome": outcome,
+        }
+        if plan.profile:
+            entry.update(plan.profile.to_dict())
+        if error:
+            entry["error"] = error
+        with self._lock:
+            totals = self._totals.setdefault(plan.tier, {
+                "model": plan.model, "requests": 0, "errors": 0, "truncated": 0,
+                "prompt_tokens": 0, "completion_tokens": 0})
+            totals["requests"] += 1
+            totals["errors"] += bool(error)
+            totals["truncated"] += bool(truncated)
+            totals["prompt_tokens"] += prompt
+            totals["completion_tokens"] += completion
+            self._latency.setdefault(plan.tier, deque(maxlen=LATENCY_SAMPLES)).append(seconds)
+            self._recent.append(entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            tiers = {name: dict(totals) for name, totals in self._totals.items()}
+            latencies = {name: sorted(samples) for name, samples in self._latency.items()}
+            recent = list(self._recent)
+        # Latency over the last LATENCY_SAMPLES calls of each tier
+        for name, samples in latencies.items():
+            tiers[name]["latency_ms"] = {
+                "p50": round(samples[len(samples) // 2] * 1000, 1),
+                "p95": round(samples[min(len(samples) - 1, len(samples) * 95 // 100)] * 1000, 1),
+            }
+        return {
+            "fixed_model": self.fixed_model,
+            "tiers": tiers,
+            "recent": recent[::-1],
+        }
@@ -0,0 +1,65 @@
+# qt_workers.py
+"""
+Background tasks for the desktop UI.
+
+Slow work (OpenAI calls, text-to-speech, IP geolocation) runs on a
+QThreadPool and reports back through Qt signals, so the GUI thread never
+blocks. Signals are delivered to the GUI thread by Qt's queued connections.
+"""
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
+
+
+class TaskSignals(QObject):
+    chunk = pyqtSignal(str)         # one piece of a streamed result
+    finished = pyqtSignal(object)   # final result
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Task(QRunnable):
+    """
+    Runs fn(*args) on a pool thread.
+
+    If fn returns an iterator (e.g. MediAI.stream_response), every item is
+    emitted through `chunk` and `finished` receives the joined text.
+    cancel() is checked between chunks, so a streamed request stops at the
+    next token; a plain call can only be dropped once it returns.
+    """
+
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = TaskSignals()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def is_cancelled(self):
+        return self._cancelled
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+
+            if hasattr(result, "__next__"):
+                parts = []
+                for chunk in result:
+                    if self._cancelled:
+                        if hasattr(result, "close"):
+                            result.close()
+                        break
+                    parts.append(chunk)
+                    self.signals.chunk.emit(chunk)
+                result = "".join(parts)
+
+            if self._cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+
+        except Exception as e:
+            self.signals.error.emit(str(e))
@@ -0,0 +1,153 @@
+# ranker.py
+"""
+Relevance ranking for offline symptom matches (BM25).
+
+Each condition is indexed as a bag of terms: its keywords in every language
+(counted KEYWORD_BOOST times, they are the strongest signal) plus the words
+of its symptom text. The BM25 weight of every (condition, term) pair is
+computed once, with NumPy, into a sparse condition-term matrix stored
+column-wise (per term: the conditions it occurs in and their weights).
+
+Scoring a message is then a sum of a few matrix columns, and scoring a batch
+of messages is one product of the (messages x terms) query matrix with it:
+
+    ranker = Ranker(CONDITIONS)
+    ranker.top_k("fever with headache", k=3)      -> [(condition index, score), ...]
+    ranker.score_batch(messages)                  -> array, messages x conditions
+    ranker.top_k_batch(messages, k=3)             -> [[(index, score), ...], ...]
+
+The matrix is sparse (scipy is not a dependency) so it stays small for a KB
+of tens of thousands of conditions.
+"""
+import re
+
+import numpy as np
+
+K1 = 1.2
+B = 0.75
+KEYWORD_BOOST = 3
+
+# \w plus the Indic blocks, whose vowel signs are not \w
+_TOKEN = re.compile(r"[\wऀ-ൿ]+")
+
+STOPWORDS = frozenset("""
+a an the and or but with without of in on at to for from by is are was were be been
+i im me my mine have has had having am feel feeling felt get getting got very some
+it its this that these those since after before also too not no can could do does
+""".split())
+
+
+def tokenize(text: str):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def condition_terms(cond: dict):
+    """The indexed terms of one condition, keywords repeated KEYWORD_BOOST times."""
+    keywords = list(cond.get("keywords", []))
+    texts = [cond.get("symptoms", "")]
+    for translated in cond.get("i18n", {}).values():
+        keywords += translated.get("keywords", [])
+        texts.append(translated.get("symptoms", ""))
+
+    terms = []
+    for kw in keywords:
+        terms += tokenize(kw) * KEYWORD_BOOST
+    for text in texts:
+        terms += tokenize(text)
+    return terms
+
+
+class Ranker:
+    def __init__(self, conditions, k1: float = K1, b: float = B):
+        self.vocab = {}
+        rows, cols = [], []
+        for idx, cond in enumerate(conditions):
+            for term in condition_terms(cond):
+                rows.append(idx)
+                cols.append(self.vocab.setdefault(term, len(self.vocab)))
+
+        n_conditions = self.n_conditions = len(conditions)
+        n_terms = len(self.vocab)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+
+        # Term frequencies, sorted by term then condition
+        pairs, tf = np.unique(cols * max(n_conditions, 1) + rows, return_counts=True)
+        term = pairs // max(n_conditions, 1)
+        cond = pairs % max(n_conditions, 1)
+
+        doc_len = np.bincount(rows, minlength=n_conditions)
+        avg_len = doc_len.mean() if n_conditions else 1.0
+        df = np.bincount(term, minlength=n_terms)
+        idf = np.log1p((n_conditions - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * doc_len[cond] / avg_len)
+
+        self._weights = (idf[term] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        self._conds = cond
+        self._starts = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=self._starts[1:])
+
+    def __len__(self):
+        return self.n_conditions
+
+    def _query(self, text: str):
+        """Vocabulary ids of the message's distinct terms."""
+        ids = {self.vocab.get(t) for t in tokenize(text)}
+        ids.discard(None)
+        return np.fromiter(ids, dtype=np.int64, count=len(ids))
+
+    def _postings(self, msg_ids, term_ids):
+        """(score cell, weight) for every posting of every (message, term) pair."""
+        starts = self._starts[term_ids]
+        lengths = self._starts[term_ids + 1] - starts
+        # Position of every posting of every pair, without a Python loop
+        first = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        postings = first + np.arange(first.size)
+        cells = np.repeat(msg_ids, lengths) * self.n_conditions + self._conds[postings]
+        return cells, self._weights[postings]
+
+    def _batch_query(self, texts):
+        terms = [self._query(t) for t in texts]
+        msg_ids = np.repeat(np.arange(len(terms)), [len(t) for t in terms])
+        term_ids = np.concatenate(terms) if terms else np.zeros(0, dtype=np.int64)
+        return msg_ids, term_ids
+
+    def score(self, text: str):
+        """BM25 score of every condition for one message."""
+        terms = self._query(text)
+        cells, weights = self._postings(np.zeros(len(terms), dtype=np.int64), terms)
+        return np.bincount(cells, weights=weights, minlength=self.n_conditions)
+
+    def score_batch(self, texts):
+        """Scores for many messages at once: a dense len(texts) x conditions array."""
+        texts = list(texts)
+        cells, weights = self._postings(*self._batch_query(texts))
+        scores = np.bincount(cells, weights=weights, minlength=len(texts) * self.n_conditions)
+        return scores.reshape(len(texts), self.n_conditions)
+
+    def top_k(self, text: str, k: int = 3):
+        """[(condition index, score)] best first, conditions that score 0 left out."""
+        return self.top_k_batch([text], k)[0]
+
+    def top_k_batch(self, texts, k: int = 3):
+        """
+        top_k for every message. Only the (message, condition) cells that some
+        term actually hits are summed and sorted, never the full score matrix.
+        """
+        texts = list(texts)
+        results = [[] for _ in texts]
+        if k <= 0 or not texts:
+            return results
+        cells, weights = self._postings(*self._batch_query(texts))
+        cells, inverse = np.unique(cells, return_inverse=True)
+        sums = np.bincount(inverse, weights=weights)
+        msgs, conds = np.divmod(cells, self.n_conditions)
+
+        # Per message: highest score first, ties in KB order; keep the first k
+        order = np.lexsort((conds, -sums, msgs))
+        msgs, conds, sums = msgs[order], conds[order], sums[order]
+        group_start = np.searchsorted(msgs, msgs)
+        keep = np.arange(msgs.size) - group_start < k
+        for m, c, s in zip(msgs[keep].tolist(), conds[keep].tolist(), sums[keep].tolist()):
+            results[m].append((c, s))
+        return results
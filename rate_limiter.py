@@ -0,0 +1,45 @@
+# rate_limiter.py
+"""
+Token-bucket rate limiter for upstream (OpenAI) calls.
+
+One limiter can be shared by threads and by coroutines: callers reserve a
+token under a short lock and then sleep (time.sleep or asyncio.sleep) until
+their turn, so waiting never holds the lock.
+"""
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = None):
+        """`rate` calls per second on average, up to `burst` at once (rate <= 0: no limit)."""
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token; returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            # A negative balance is the queue of callers already waiting
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        if self.rate <= 0:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
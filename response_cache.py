@@ -0,0 +1,236 @@
+# response_cache.py
+"""
+Two-tier cache for MediAI answers.
+
+Tier 1 is an in-process LRU with a TTL. Tier 2 is a SQLite file, so all
+gunicorn workers on a host share answers. Concurrent misses for the same key
+inside one process are coalesced into a single upstream call. If the SQLite
+file cannot be created or opened (e.g. a read-only install directory), the
+cache runs from memory only.
+
+The desktop app keeps its file in a per-user data directory (default_path()).
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    text = _SPACES.sub(" ", (text or "").lower()).strip()
+    return text.rstrip(" ?!.")
+
+
+def make_key(text: str, language: str, model: str) -> str:
+    raw = "\x00".join([model, (language or "").lower(), normalize_question(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def default_path() -> str:
+    base = os.getenv("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "MediBot", "responses.sqlite3")
+
+
+class _InflightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 24 * 3600, db_path: str = None):
+        """
+        max_entries: size of the in-process LRU tier.
+        ttl: seconds an answer stays valid, in both tiers.
+        db_path: SQLite file for the shared tier, or None for memory only.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # key -> (stored_at, value)
+        self._inflight = {}            # key -> _InflightCall
+        self._local = threading.local()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                conn = self._conn()
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+                conn.commit()
+            except (OSError, sqlite3.Error) as e:
+                print("⚠ Cache file %s unavailable, caching in memory only: %s" % (db_path, e))
+                conn = getattr(self._local, "conn", None)
+                if conn is not None:
+                    conn.close()
+                    self._local.conn = None
+                self.db_path = None
+
+    @classmethod
+    def from_env(cls, default_db="medibot_cache.sqlite3"):
+        """Builds a cache from MEDIBOT_CACHE_SIZE / MEDIBOT_CACHE_TTL / MEDIBOT_CACHE_DB."""
+        return cls(
+            max_entries=int(os.getenv("MEDIBOT_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("MEDIBOT_CACHE_TTL", str(24 * 3600))),
+            db_path=os.getenv("MEDIBOT_CACHE_DB", default_db) or None,
+        )
+
+    # ---------- SQLITE TIER ----------
+    def _conn(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key):
+        try:
+            row = self._conn().execute(
+                "SELECT value, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print("⚠ Cache read failed:", e)
+            return None
+        if row is None:
+            return None
+        value, stored_at = row
+        if time.time() - stored_at > self.ttl:
+            self._bump("expirations")
+            return None
+        return stored_at, value
+
+    def _disk_set(self, key, value, stored_at):
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, value, stored_at),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print("⚠ Cache write failed:", e)
+
+    def purge_expired(self) -> int:
+        """Deletes expired rows from the SQLite tier. Returns rows removed."""
+        if not self.db_path:
+            return 0
+        conn = self._conn()
+        cur = conn.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl,))
+        conn.commit()
+        return cur.rowcount
+
+    # ---------- MEMORY TIER ----------
+    def _bump(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _memory_put(self, key, stored_at, value):
+        with self._lock:
+            self._memory[key] = (stored_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    # ---------- PUBLIC API ----------
+    def get(self, key):
+        """Returns the cached answer or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+                self._stats["expirations"] += 1
+
+        if self.db_path:
+            found = self._disk_get(key)
+            if found is not None:
+                stored_at, value = found
+                self._memory_put(key, stored_at, value)
+                self._bump("disk_hits")
+                return value
+
+        self._bump("misses")
+        return None
+
+    def set(self, key, value):
+        stored_at = time.time()
+        self._memory_put(key, stored_at, value)
+        if self.db_path:
+            self._disk_set(key, value, stored_at)
+
+    def get_or_compute(self, key, compute, cacheable=None, lookup=True):
+        """
+        Returns the cached answer, or calls compute() and caches its result.
+        If several threads miss on the same key at once, only one of them
+        calls compute(); the others wait and share its result (or exception).
+        Exceptions are never cached, nor are results cacheable(result) rejects.
+        lookup=False: the caller has just missed on get(key), so skip it here.
+        """
+        if lookup:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _InflightCall()
+                self._inflight[key] = call
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+            if cacheable is None or cacheable(call.value):
+                self.set(key, call.value)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data["memory_entries"] = len(self._memory)
+            data["inflight"] = len(self._inflight)
+        lookups = data["memory_hits"] + data["disk_hits"] + data["misses"]
+        data["hit_ratio"] = round((data["memory_hits"] + data["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return data
@@ -0,0 +1,275 @@
+# router.py
+"""
+Offline-first routing for chat messages.
+
+Decides per message whether the offline KB is enough:
+    local         answer from the KB / canned replies only, no LLM call
+    local+refine  answer locally right away, then refine with the LLM
+    llm           go to the LLM (the offline block is still shown if any)
+
+Rules, in order: emergency keywords, simple FAQ intents (greetings, thanks)
+when the message is nothing else, then a confidence score for the offline match: the share of the message's
+content words that are covered by matched KB keywords.
+
+Thresholds (environment variables):
+    MEDIBOT_ROUTE_LOCAL   confidence needed to answer locally (default 0.8)
+    MEDIBOT_ROUTE_REFINE  confidence needed for local+refine (default 0.4)
+"""
+import os
+import re
+import time
+
+from metrics import STAGE_SECONDS
+from medical_db import TOP_K, current_kb, find_conditions, format_conditions, spoken_guidance
+from symptom_matcher import KeywordMatcher
+
+ROUTE_LOCAL = "local"
+ROUTE_LOCAL_REFINE = "local+refine"
+ROUTE_LLM = "llm"
+
+LOCAL_THRESHOLD = float(os.getenv("MEDIBOT_ROUTE_LOCAL", "0.8"))
+REFINE_THRESHOLD = float(os.getenv("MEDIBOT_ROUTE_REFINE", "0.4"))
+
+# Longest message (in words) that can still be a pure FAQ intent
+FAQ_MAX_WORDS = 6
+
+EMERGENCY_KEYWORDS = [
+    "chest pain", "heart attack", "can't breathe", "cannot breathe", "cant breathe",
+    "not breathing", "trouble breathing", "difficulty breathing", "severe bleeding",
+    "bleeding heavily", "unconscious", "fainted", "not responding", "seizure",
+    "stroke", "face drooping", "slurred speech", "suicide", "kill myself", "overdose",
+    "poisoning", "snake bite", "severe burn", "passed out", "unresponsive", "choking",
+    # Hindi
+    "सीने में दर्द", "छाती में दर्द", "सांस नहीं", "बेहोश", "दौरा", "ज़हर", "सांप ने काटा",
+    "seene mein dard", "chhati mein dard", "saans nahi", "behosh",
+    # Tamil
+    "நெஞ்சு வலி", "மூச்சு விட முடியவில்லை", "மயக்கம்", "வலிப்பு", "பாம்பு கடி",
+    "nenju vali", "mayakkam",
+    # Telugu
+    "ఛాతీ నొప్పి", "శ్వాస ఆడటం లేదు", "స్పృహ లేదు", "మూర్ఛ", "పాము కాటు",
+    "chaati noppi", "spruha ledu",
+]
+
+FAQ_KEYWORDS = {
+    "greeting": ["hi", "hello", "hey", "good morning", "good evening", "namaste", "namaskar",
+                 "vanakkam", "namaskaram", "नमस्ते", "வணக்கம்", "నమస్కారం"],
+    "thanks": ["thanks", "thank you", "thank u", "thx", "dhanyavaad", "shukriya", "nandri",
+               "dhanyavadalu", "धन्यवाद", "शुक्रिया", "நன்றி", "ధన్యవాదాలు"],
+    "bye": ["bye", "goodbye", "see you", "alvida", "अलविदा", "போய் வருகிறேன்", "వెళ్ళొస్తాను"],
+}
+
+LOCAL_REPLIES = {
+    "emergency": {
+        "English": "⚠ This may be an emergency. Please call your local emergency number (108 / 112 in India) "
+                   "or go to the nearest hospital immediately. Do not wait for an online answer.",
+        "Hindi": "⚠ यह आपातकाल हो सकता है। कृपया तुरंत अपने स्थानीय आपातकालीन नंबर (भारत में 108 / 112) पर "
+                 "कॉल करें या नज़दीकी अस्पताल जाएँ। ऑनलाइन जवाब का इंतज़ार न करें।",
+        "Tamil": "⚠ இது அவசரநிலையாக இருக்கலாம். உடனே உங்கள் உள்ளூர் அவசர எண்ணை (இந்தியாவில் 108 / 112) "
+                 "அழைக்கவும் அல்லது அருகிலுள்ள மருத்துவமனைக்குச் செல்லவும். ஆன்லைன் பதிலுக்காகக் காத்திருக்க வேண்டாம்.",
+        "Telugu": "⚠ ఇది అత్యవసర పరిస్థితి కావచ్చు. వెంటనే మీ స్థానిక అత్యవసర నంబర్‌కు (భారతదేశంలో 108 / 112) "
+                  "కాల్ చేయండి లేదా దగ్గరలోని ఆసుపత్రికి వెళ్ళండి. ఆన్‌లైన్ సమాధానం కోసం ఎదురుచూడకండి.",
+    },
+    "greeting": {
+        "English": "Hello! Tell me your symptoms or your health question.",
+        "Hindi": "नमस्ते! अपने लक्षण या स्वास्थ्य से जुड़ा सवाल बताइए।",
+        "Tamil": "வணக்கம்! உங்கள் அறிகுறிகள் அல்லது உடல்நலக் கேள்வியைச் சொல்லுங்கள்.",
+        "Telugu": "నమస్కారం! మీ లక్షణాలు లేదా ఆరోగ్య ప్రశ్నను చెప్పండి.",
+    },
+    "thanks": {
+        "English": "You're welcome! Take care, and see a doctor if things don't improve.",
+        "Hindi": "आपका स्वागत है! अपना ध्यान रखें, और आराम न मिले तो डॉक्टर को दिखाएँ।",
+        "Tamil": "மகிழ்ச்சி! உடல்நலத்தைக் கவனித்துக் கொள்ளுங்கள்; சரியாகவில்லை என்றால் மருத்துவரைப் பாருங்கள்.",
+        "Telugu": "సంతోషం! జాగ్రత్తగా ఉండండి, తగ్గకపోతే డాక్టర్‌ను కలవండి.",
+    },
+    "bye": {
+        "English": "Goodbye! Take care of your health.",
+        "Hindi": "अलविदा! अपनी सेहत का ध्यान रखें।",
+        "Tamil": "சென்று வாருங்கள்! உடல்நலத்தைக் கவனித்துக் கொள்ளுங்கள்.",
+        "Telugu": "వెళ్ళి రండి! మీ ఆరోగ్యం జాగ్రత్త.",
+    },
+    "welcome": {
+        "English": "Hello! I'm your AI health assistant.\n"
+                   "You can:\n"
+                   "• Type symptoms (e.g., 'I have headache and fever').\n"
+                   "• Click 'Symptom Check (Offline DB)' for quick info.\n"
+                   "• Click 'Find Nearby Hospital' to list the nearest hospitals and open them in Google Maps.\n"
+                   "I only provide general information, not a medical diagnosis.",
+    },
+    "language_set": {
+        "English": "Language set to %s.",
+    },
+    "kb": {
+        "English": "I found general information for this in my offline guide (shown above).",
+        "Hindi": "इसके लिए मेरी ऑफ़लाइन गाइड में सामान्य जानकारी मिली है (ऊपर देखें)।",
+        "Tamil": "இதற்கான பொதுவான தகவல் என் ஆஃப்லைன் வழிகாட்டியில் உள்ளது (மேலே பார்க்கவும்).",
+        "Telugu": "దీనికి సంబంధించిన సాధారణ సమాచారం నా ఆఫ్‌లైన్ గైడ్‌లో ఉంది (పైన చూడండి).",
+    },
+}
+
+# Filler words that don't need to be "explained" by a KB keyword
+STOPWORDS = set("""
+i im i'm me my have has having had am is are was were be been feel feeling felt got getting
+a an the and or with since from for of in on at to my some very bit little lot also too
+today yesterday night morning days day week since now still
+mujhe mujhko mera meri hai hain ho raha rahi rahe aur bhi se ka ki ke bahut thoda
+enakku ennaku irukku iruku matrum romba konjam
+naaku naku undi unnadi mariyu chala konchem
+मुझे मेरा मेरी है हैं हो रहा रही और भी से का की के बहुत थोड़ा
+எனக்கு இருக்கு இருக்கிறது மற்றும் ரொம்ப கொஞ்சம்
+నాకు ఉంది ఉన్నది మరియు చాలా కొంచెం
+""".split())
+
+# Words that may come with a greeting or thanks ("thank you so much", "hi doctor")
+FAQ_FILLER = set("so much many again all lot ok okay there doc doctor sir madam ji bot".split())
+
+_TOKEN = re.compile(r"[^\s.,;:!?()\[\]\"/\-]+")
+
+_EMERGENCY = KeywordMatcher((kw, "emergency") for kw in EMERGENCY_KEYWORDS)
+_FAQ = KeywordMatcher((kw, intent) for intent, kws in FAQ_KEYWORDS.items() for kw in kws)
+
+
+class Route:
+    def __init__(self, tier, reason, confidence=0.0, matched=None,
+                 offline_html="", local_reply="", route_ms=0.0):
+        self.tier = tier
+        self.reason = reason
+        self.confidence = confidence
+        self.matched = matched or []      # condition ids
+        self.offline_html = offline_html  # analyze_symptoms-style block, or ""
+        self.local_reply = local_reply    # immediate reply for local tiers
+        self.spoken_reply = local_reply   # what the desktop app reads out of it
+        self.route_ms = route_ms
+        self.corrections = {}             # typed word -> KB word it was read as
+        self.kb_version = ""              # KB the message was matched against
+
+    @property
+    def needs_llm(self):
+        return self.tier != ROUTE_LOCAL
+
+    @property
+    def intent(self):
+        """What message_intent() says about the message: "emergency", a FAQ intent or ""."""
+        if self.reason == "emergency" or self.reason.startswith("faq:"):
+            return self.reason.split(":")[-1]
+        return ""
+
+    def to_dict(self):
+        return {
+            "tier": self.tier,
+            "reason": self.reason,
+            "confidence": round(self.confidence, 3),
+            "matched": self.matched,
+            "corrections": self.corrections,
+            "kb_version": self.kb_version,
+            "route_ms": round(self.route_ms, 3),
+        }
+
+
+def local_reply(kind: str, language: str) -> str:
+    replies = LOCAL_REPLIES[kind]
+    return replies.get(language, replies["English"])
+
+
+def spoken_texts(language: str, kb=None):
+    """
+    Every fixed text the desktop app may speak in `language`: the local
+    replies and each condition's spoken_guidance. audio_cache.py pre-renders them.
+    """
+    if kb is None:
+        kb = current_kb()
+    texts = [local_reply(kind, language) for kind in LOCAL_REPLIES if kind != "language_set"]
+    texts.append(local_reply("language_set", language) % language)
+    texts += [spoken_guidance(cond, language, kb) for cond in kb.conditions]
+    return texts
+
+
+def faq_intent(text: str) -> str:
+    """
+    The FAQ intent ("greeting", "thanks", "bye") of a message that is only
+    that: every word belongs to a FAQ keyword or is filler. Otherwise "".
+    """
+    text = text.lower()
+    tokens = _TOKEN.findall(text)
+    if len(tokens) > FAQ_MAX_WORDS:
+        return ""
+    intents = _FAQ.match(text)
+    if not intents:
+        return ""
+    covered = set()
+    for kws in intents.values():
+        for kw in kws:
+            covered.update(_TOKEN.findall(kw))
+    if all(t in covered or t in STOPWORDS or t in FAQ_FILLER for t in tokens):
+        return next(iter(intents))
+    return ""
+
+
+def message_intent(text: str) -> str:
+    """"emergency", a FAQ intent for a message that is only a greeting, thanks or goodbye, or ""."""
+    if _EMERGENCY.match(text.lower()):
+        return "emergency"
+    return faq_intent(text)
+
+
+def _content_tokens(text: str):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def match_confidence(text: str, matched_keywords, corrections=None) -> float:
+    """
+    Share of the message's content words covered by matched KB keywords;
+    misspelled words count as their corrections.
+    """
+    tokens = _content_tokens(text)
+    if corrections:
+        tokens = [corrections.get(t, t) for t in tokens]
+    if not tokens:
+        return 0.0
+    covered = set()
+    for kw in matched_keywords:
+        covered.update(_TOKEN.findall(kw))
+    return sum(1 for t in tokens if t in covered) / len(tokens)
+
+
+def route_message(message: str, language: str = "English") -> Route:
+    t0 = time.perf_counter()
+    text = message.lower()
+
+    # One KB version for the whole decision, even if a reload lands meanwhile
+    kb = current_kb()
+    results, corrections = find_conditions(message, language, kb=kb)
+    offline_html = format_conditions([c for c, _ in results[:TOP_K]], language, corrections, kb)
+    matched = [c["id"] for c, _ in results]
+
+    if _EMERGENCY.match(text):
+        route = Route(ROUTE_LOCAL_REFINE, "emergency", 1.0, matched, offline_html,
+                      local_reply("emergency", language))
+    else:
+        intent = faq_intent(text)
+        if intent and not results:
+            route = Route(ROUTE_LOCAL, "faq:" + intent, 1.0, [], "", local_reply(intent, language))
+        elif results:
+            keywords = [kw for _, kws in results for kw in kws]
+            confidence = match_confidence(message, keywords, corrections)
+            if confidence >= LOCAL_THRESHOLD:
+                tier = ROUTE_LOCAL
+            elif confidence >= REFINE_THRESHOLD:
+                tier = ROUTE_LOCAL_REFINE
+            else:
+                tier = ROUTE_LLM
+            route = Route(tier, "kb", confidence, matched, offline_html,
+                          local_reply("kb", language) if tier != ROUTE_LLM else "")
+            if tier == ROUTE_LOCAL:
+                # No LLM reply will follow: read out the best match's advice
+                route.spoken_reply = "\n".join([route.local_reply, spoken_guidance(results[0][0], language, kb)])
+        else:
+            route = Route(ROUTE_LLM, "no-match", 0.0)
+
+    if results:
+        route.corrections = corrections
+    route.kb_version = kb.version
+    elapsed = time.perf_counter() - t0
+    route.route_ms = elapsed * 1000
+    STAGE_SECONDS.observe(elapsed, stage="route")
+    return route
+
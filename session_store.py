@@ -0,0 +1,199 @@
+# session_store.py
+"""
+Server-side conversation sessions, so follow-up questions keep their context.
+
+Each session keeps its most recent turns verbatim and folds older turns into
+a short rolling summary, so the history sent to the model stays within a
+fixed token budget however long the conversation gets:
+
+    [summary of older turns]  +  [recent turns, verbatim]  +  [new question]
+
+Sessions are evicted after MEDIBOT_SESSION_IDLE seconds without a message,
+and least-recently-used first once all of them together exceed
+MEDIBOT_SESSION_MAX_MB.
+
+Settings (environment variables):
+    MEDIBOT_SESSION_BUDGET          history tokens per request (default 1200)
+    MEDIBOT_SESSION_SUMMARY_TOKENS  part of the budget for the summary (default 300)
+    MEDIBOT_SESSION_IDLE            idle seconds before a session is dropped (default 1800)
+    MEDIBOT_SESSION_MAX_MB          memory cap for all sessions (default 64)
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Good enough for budgeting English and Indic text without a tokenizer
+CHARS_PER_TOKEN = 4
+# Per-session bookkeeping on top of the text itself
+SESSION_OVERHEAD_BYTES = 512
+
+SUMMARY_HEADER = "Summary of the earlier conversation (for context only):"
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_TAGS = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    text = _SPACES.sub(" ", _TAGS.sub(" ", text or "")).strip()
+    text = _SENTENCE_END.split(text, 1)[0]
+    if len(text) > max_chars:
+        text = text[:max_chars - 1].rstrip() + "…"
+    return text
+
+
+def compact_turn(user_text: str, reply: str) -> str:
+    """One summary line for a (question, answer) turn."""
+    return "- User: %s → MediBot: %s" % (_first_sentence(user_text, 160), _first_sentence(reply, 160))
+
+
+class Session:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.turns = []           # [(user_text, reply, tokens)], oldest first
+        self.turn_tokens = 0
+        self.summary = []         # compact_turn() lines, oldest first
+        self.summary_tokens = 0
+        self.last_seen = time.monotonic()
+
+    @property
+    def size_bytes(self) -> int:
+        text = sum(len(u) + len(r) for u, r, _ in self.turns) + sum(len(s) for s in self.summary)
+        return SESSION_OVERHEAD_BYTES + 2 * text  # CPython str: >= 1 byte/char, 2 for most Indic text
+
+    def messages(self):
+        """Chat messages for the history: summary first, then the recent turns."""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": "\n".join([SUMMARY_HEADER] + self.summary)})
+        for user_text, reply, _ in self.turns:
+            messages.append({"role": "user", "content": user_text})
+            messages.append({"role": "assistant", "content": reply})
+        return messages
+
+
+class SessionStore:
+    def __init__(self, budget_tokens: int = 1200, summary_tokens: int = 300,
+                 idle_timeout: float = 1800, max_bytes: int = 64 * 1024 * 1024):
+        """
+        budget_tokens: history tokens sent with each question (summary + turns).
+        summary_tokens: the part of the budget the rolling summary may use.
+        idle_timeout: seconds without a message before a session is dropped.
+        max_bytes: approximate memory cap for all sessions together.
+        """
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = min(summary_tokens, budget_tokens // 2)
+        self.idle_timeout = idle_timeout
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # id -> Session, least recently used first
+        self._bytes = 0
+        self._stats = {"created": 0, "compacted_turns": 0, "idle_evictions": 0, "memory_evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            budget_tokens=int(os.getenv("MEDIBOT_SESSION_BUDGET", "1200")),
+            summary_tokens=int(os.getenv("MEDIBOT_SESSION_SUMMARY_TOKENS", "300")),
+            idle_timeout=float(os.getenv("MEDIBOT_SESSION_IDLE", "1800")),
+            max_bytes=int(float(os.getenv("MEDIBOT_SESSION_MAX_MB", "64")) * 1024 * 1024),
+        )
+
+    @staticmethod
+    def normalize_id(session_id) -> str:
+        """The client's id if it is well-formed, else a fresh one."""
+        if isinstance(session_id, str) and _SESSION_ID.match(session_id):
+            return session_id
+        return new_session_id()
+
+    # ---------- READ ----------
+    def history(self, session_id: str):
+        """Chat messages to send before the new question ([] for a new session)."""
+        with self._lock:
+            self._evict(time.monotonic())
+            session = self._sessions.get(session_id)
+            return session.messages() if session is not None else []
+
+    # ---------- WRITE ----------
+    def record(self, session_id: str, user_text: str, reply: str):
+        """Adds a finished turn, compacting older turns to stay within budget."""
+        if not user_text or not reply:
+            return
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+                self._stats["created"] += 1
+            else:
+                self._sessions.move_to_end(session_id)
+                self._bytes -= session.size_bytes
+            session.last_seen = now
+
+            turn_budget = self.budget_tokens - self.summary_tokens
+            # The newest turn stays verbatim, so both sides are clipped to fit:
+            # the question may use what the answer leaves, but at least half
+            user_text = self._clip(user_text, turn_budget - min(estimate_tokens(reply), turn_budget // 2))
+            reply = self._clip(reply, turn_budget - estimate_tokens(user_text))
+            tokens = estimate_tokens(user_text) + estimate_tokens(reply)
+            session.turns.append((user_text, reply, tokens))
+            session.turn_tokens += tokens
+            self._compact(session, turn_budget)
+
+            self._bytes += session.size_bytes
+            self._evict(now)
+
+    def forget(self, session_id: str):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._bytes -= session.size_bytes
+
+    def _clip(self, text, tokens):
+        max_chars = max(tokens, 32) * CHARS_PER_TOKEN
+        return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+    def _compact(self, session, turn_budget):
+        # Oldest turns move into the summary; the newest one always stays verbatim
+        while session.turn_tokens > turn_budget and len(session.turns) > 1:
+            user_text, reply, tokens = session.turns.pop(0)
+            session.turn_tokens -= tokens
+            line = compact_turn(user_text, reply)
+            session.summary.append(line)
+            session.summary_tokens += estimate_tokens(line)
+            self._stats["compacted_turns"] += 1
+        while session.summary_tokens > self.summary_tokens and session.summary:
+            session.summary_tokens -= estimate_tokens(session.summary.pop(0))
+
+    def _evict(self, now):
+        # Least recently used first, so idle sessions are always at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen > self.idle_timeout:
+                self._stats["idle_evictions"] += 1
+            elif self._bytes > self.max_bytes:
+                self._stats["memory_evictions"] += 1
+            else:
+                break
+            del self._sessions[session.id]
+            self._bytes -= session.size_bytes
+
+    # ---------- STATS ----------
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict(time.monotonic())
+            return dict(self._stats, sessions=len(self._sessions), bytes=self._bytes,
+                        budget_tokens=self.budget_tokens)
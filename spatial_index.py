@@ -0,0 +1,94 @@
+# spatial_index.py
+"""
+Nearest-neighbour search over (lat, lon) points.
+
+Points are stored as 3D unit vectors in an implicit KD-tree (one sorted
+index list, median splits). On the unit sphere the straight-line distance
+between two points grows with their great-circle distance, so the k nearest
+by Euclidean distance are exactly the k nearest on the map, without any
+trigonometry during the search.
+"""
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _to_xyz(lat: float, lon: float):
+    lat, lon = math.radians(lat), math.radians(lon)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    a, b = _to_xyz(lat1, lon1), _to_xyz(lat2, lon2)
+    return chord_to_km(math.sqrt(sum((p - q) ** 2 for p, q in zip(a, b))))
+
+
+class KDTree:
+    def __init__(self, points):
+        """`points`: sequence of (lat, lon)."""
+        self._xyz = [_to_xyz(lat, lon) for lat, lon in points]
+        self._order = list(range(len(self._xyz)))
+        self._axis = [0] * len(self._xyz)
+        self._build(0, len(self._order))
+
+    def __len__(self):
+        return len(self._xyz)
+
+    def _build(self, lo, hi):
+        if hi - lo < 2:
+            return
+        xyz = self._xyz
+        segment = self._order[lo:hi]
+        # Split on the axis where this box is widest
+        spreads = [max(xyz[i][a] for i in segment) - min(xyz[i][a] for i in segment) for a in range(3)]
+        axis = spreads.index(max(spreads))
+        segment.sort(key=lambda i: xyz[i][axis])
+        self._order[lo:hi] = segment
+
+        mid = (lo + hi) // 2
+        self._axis[mid] = axis
+        self._build(lo, mid)
+        self._build(mid + 1, hi)
+
+    def nearest(self, lat: float, lon: float, k: int = 5, max_km: float = None):
+        """[(point index, distance in km)], closest first."""
+        if k <= 0 or not self._xyz:
+            return []
+        query = _to_xyz(lat, lon)
+        heap = []  # (-squared chord, index): the k best so far, worst on top
+        limit = km_to_chord(max_km) ** 2 if max_km is not None else float("inf")
+        self._search(0, len(self._order), query, k, heap, limit)
+        return [(i, chord_to_km(math.sqrt(-d2))) for d2, i in sorted(heap, reverse=True)]
+
+    def _search(self, lo, hi, query, k, heap, limit):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        idx = self._order[mid]
+        point = self._xyz[idx]
+        d2 = (query[0] - point[0]) ** 2 + (query[1] - point[1]) ** 2 + (query[2] - point[2]) ** 2
+        if d2 <= limit:
+            if len(heap) < k:
+                heapq.heappush(heap, (-d2, idx))
+            elif d2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-d2, idx))
+
+        axis = self._axis[mid]
+        diff = query[axis] - point[axis]
+        near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+        self._search(near[0], near[1], query, k, heap, limit)
+
+        # The other side can only help if the splitting plane is close enough
+        worst = -heap[0][0] if len(heap) == k else limit
+        if diff * diff < min(worst, limit):
+            self._search(far[0], far[1], query, k, heap, limit)
@@ -0,0 +1,77 @@
+# startup_timing.py
+"""
+Cold-start timing for the server and the desktop app.
+
+Import this module first; it records how long each startup step takes
+(imports, engine construction, first window paint...).
+
+Set MEDIBOT_STARTUP_REPORT to get the breakdown:
+    MEDIBOT_STARTUP_REPORT=1             print it to stdout
+    MEDIBOT_STARTUP_REPORT=startup.jsonl append one JSON line per run to that file
+                                         (useful for the windowed exe, which has no console)
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_START = time.perf_counter()
+_lock = threading.Lock()
+_steps = []    # (name, seconds)
+_marks = []    # (name, seconds since start)
+
+
+@contextmanager
+def timed(name: str):
+    """Records how long the block took under `name`."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _steps.append((name, time.perf_counter() - t0))
+
+
+def mark(name: str):
+    """Records a milestone, measured from process start."""
+    with _lock:
+        _marks.append((name, time.perf_counter() - _START))
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "app": os.path.basename(sys.argv[0] or "python"),
+            "frozen": bool(getattr(sys, "frozen", False)),
+            "steps_ms": {name: round(sec * 1000, 1) for name, sec in _steps},
+            "marks_ms": {name: round(sec * 1000, 1) for name, sec in _marks},
+        }
+
+
+def format_report() -> str:
+    data = snapshot()
+    lines = ["Startup timing (%s%s):" % (data["app"], ", frozen" if data["frozen"] else "")]
+    for name, ms in data["steps_ms"].items():
+        lines.append("  %-32s %8.1f ms" % (name, ms))
+    for name, ms in data["marks_ms"].items():
+        lines.append("  @ %-30s %8.1f ms" % (name, ms))
+    return "\n".join(lines)
+
+
+def report():
+    """Writes the report if MEDIBOT_STARTUP_REPORT is set. Safe to call more than once."""
+    target = os.getenv("MEDIBOT_STARTUP_REPORT", "").strip()
+    if not target:
+        return
+    if target == "1":
+        print(format_report())
+        return
+    try:
+        data = snapshot()
+        data["time"] = time.time()
+        with open(target, "a", encoding="utf-8") as f:
+            f.write(json.dumps(data) + "\n")
+    except OSError as e:
+        print("⚠ Could not write startup report:", e)
@@ -0,0 +1,241 @@
+# symptom_matcher.py
+"""
+Compiled multi-keyword matcher for the offline knowledge base.
+
+All keywords are compiled once into an Aho-Corasick automaton, so a message is
+scanned in a single pass no matter how many conditions the KB holds.
+Matches are only reported on word boundaries, so "gas" does not match "gasping".
+
+KeywordMatcher builds the automaton in memory. TableMatcher runs the same
+automaton from flat uint32 tables (KeywordMatcher.to_tables), e.g. straight
+out of a memory-mapped KB file.
+"""
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+
+def is_word_char(ch: str) -> bool:
+    # Combining marks (Devanagari/Tamil/Telugu vowel signs, viramas) are part
+    # of the word even though str.isalnum() is False for them.
+    return ch.isalnum() or ch == "_" or unicodedata.category(ch) in ("Mn", "Mc")
+
+
+class _MatchMixin:
+    def match(self, text: str) -> dict:
+        """
+        Returns {payload: [matched keywords, in order of first occurrence]}.
+        """
+        found = {}
+        for _, _, kw_id in self.find_all(text.lower()):
+            kw = self.keyword(kw_id)
+            for payload in self.payloads_of(kw_id):
+                hits = found.setdefault(payload, [])
+                if kw not in hits:
+                    hits.append(kw)
+        return found
+
+
+class KeywordMatcher(_MatchMixin):
+    def __init__(self, keywords):
+        """
+        keywords: iterable of (keyword, payload) pairs.
+        The same keyword may be given several times with different payloads
+        (e.g. when two conditions share a keyword).
+        """
+        self._goto = [{}]     # node -> {char: next node}
+        self._fail = [0]      # node -> failure link
+        self._out = [()]      # node -> keyword ids that end here (incl. via failure links)
+
+        self.keywords = []    # keyword id -> keyword text
+        self.payloads = []    # keyword id -> list of payloads
+        self._kw_ids = {}
+
+        for kw, payload in keywords:
+            kw = (kw or "").strip().lower()
+            if kw:
+                self._add(kw, payload)
+
+        self._build()
+
+    @classmethod
+    def from_conditions(cls, conditions):
+        """Builds a matcher whose payloads are indexes into `conditions`."""
+        return cls(
+            (kw, idx)
+            for idx, cond in enumerate(conditions)
+            for kw in cond["keywords"]
+        )
+
+    def __len__(self):
+        return len(self.keywords)
+
+    # ---------- BUILD ----------
+    def _add(self, kw: str, payload):
+        kw_id = self._kw_ids.get(kw)
+        if kw_id is not None:
+            if payload not in self.payloads[kw_id]:
+                self.payloads[kw_id].append(payload)
+            return
+
+        kw_id = len(self.keywords)
+        self._kw_ids[kw] = kw_id
+        self.keywords.append(kw)
+        self.payloads.append([payload])
+
+        node = 0
+        for ch in kw:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = self._out[node] + (kw_id,)
+
+    def _build(self):
+        # Breadth-first pass to set failure links and merge outputs,
+        # so the scan never has to walk the failure chain to collect matches.
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                if self._out[self._fail[child]]:
+                    self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    # ---------- SEARCH ----------
+    def find_all(self, text: str):
+        """
+        Yields (start, end, keyword_id) for every whole-word keyword occurrence
+        in `text`. `text` is expected to be lower-cased already.
+        """
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self.keywords
+        n = len(text)
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            if end < n and is_word_char(text[end]):
+                continue
+            for kw_id in out[node]:
+                start = end - len(keywords[kw_id])
+                if start > 0 and is_word_char(text[start - 1]):
+                    continue
+                yield start, end, kw_id
+
+    def keyword(self, kw_id: int) -> str:
+        return self.keywords[kw_id]
+
+    def payloads_of(self, kw_id: int):
+        return self.payloads[kw_id]
+
+    # ---------- EXPORT ----------
+    def to_tables(self):
+        """
+        Flattens the automaton into uint32 arrays (CSR layout) for TableMatcher.
+        Payloads must be non-negative ints. Returns (tables, keyword_blob).
+        """
+        tables = {name: array("I") for name in (
+            "ac.edge_start", "ac.edge_char", "ac.edge_target", "ac.fail",
+            "ac.out_start", "ac.out", "kw.len", "kw.text_start",
+            "kw.post_start", "kw.post",
+        )}
+
+        for node, edges in enumerate(self._goto):
+            tables["ac.edge_start"].append(len(tables["ac.edge_char"]))
+            for ch in sorted(edges):
+                tables["ac.edge_char"].append(ord(ch))
+                tables["ac.edge_target"].append(edges[ch])
+            tables["ac.fail"].append(self._fail[node])
+            tables["ac.out_start"].append(len(tables["ac.out"]))
+            tables["ac.out"].extend(self._out[node])
+        tables["ac.edge_start"].append(len(tables["ac.edge_char"]))
+        tables["ac.out_start"].append(len(tables["ac.out"]))
+
+        blob = bytearray()
+        for kw_id, kw in enumerate(self.keywords):
+            tables["kw.len"].append(len(kw))
+            tables["kw.text_start"].append(len(blob))
+            blob += kw.encode("utf-8")
+            tables["kw.post_start"].append(len(tables["kw.post"]))
+            tables["kw.post"].extend(self.payloads[kw_id])
+        tables["kw.text_start"].append(len(blob))
+        tables["kw.post_start"].append(len(tables["kw.post"]))
+
+        return tables, bytes(blob)
+
+
+class TableMatcher(_MatchMixin):
+    """
+    Search-only matcher over the tables from KeywordMatcher.to_tables().
+    Tables can be any uint32 sequences, typically memoryviews over an mmap,
+    so nothing is copied or rebuilt at load time.
+    """
+
+    def __init__(self, tables, keyword_blob):
+        self._edge_start = tables["ac.edge_start"]
+        self._edge_char = tables["ac.edge_char"]
+        self._edge_target = tables["ac.edge_target"]
+        self._fail = tables["ac.fail"]
+        self._out_start = tables["ac.out_start"]
+        self._out = tables["ac.out"]
+        self._kw_len = tables["kw.len"]
+        self._kw_text_start = tables["kw.text_start"]
+        self._post_start = tables["kw.post_start"]
+        self._post = tables["kw.post"]
+        self._blob = keyword_blob
+
+    def __len__(self):
+        return len(self._kw_len)
+
+    def find_all(self, text: str):
+        """Same contract as KeywordMatcher.find_all."""
+        edge_start, edge_char, edge_target = self._edge_start, self._edge_char, self._edge_target
+        fail, out_start, out, kw_len = self._fail, self._out_start, self._out, self._kw_len
+        n = len(text)
+        node = 0
+        for i, ch in enumerate(text):
+            c = ord(ch)
+            while True:
+                lo, hi = edge_start[node], edge_start[node + 1]
+                j = bisect_left(edge_char, c, lo, hi)
+                if j < hi and edge_char[j] == c:
+                    node = edge_target[j]
+                    break
+                if node == 0:
+                    break
+                node = fail[node]
+
+            first, last = out_start[node], out_start[node + 1]
+            if first == last:
+                continue
+            end = i + 1
+            if end < n and is_word_char(text[end]):
+                continue
+            for k in range(first, last):
+                kw_id = out[k]
+                start = end - kw_len[kw_id]
+                if start > 0 and is_word_char(text[start - 1]):
+                    continue
+                yield start, end, kw_id
+
+    def keyword(self, kw_id: int) -> str:
+        a, b = self._kw_text_start[kw_id], self._kw_text_start[kw_id + 1]
+        return bytes(self._blob[a:b]).decode("utf-8")
+
+    def payloads_of(self, kw_id: int):
+        return self._post[self._post_start[kw_id]:self._post_start[kw_id + 1]].tolist()
@@ -0,0 +1,27 @@
+# tests/test_model_policy.py
+"""Tier choice of model_policy.ModelPolicy with the default policy."""
+import pytest
+
+from model_policy import ModelPolicy
+
+
+@pytest.fixture
+def policy():
+    return ModelPolicy()
+
+
+@pytest.mark.parametrize("message", ["hi", "thanks doctor", "ok bye"])
+def test_smalltalk_gets_the_small_tier(policy, message):
+    plan = policy.plan(message, "English")
+    assert (plan.profile.intent, plan.tier) == ("smalltalk", "small")
+
+
+@pytest.mark.parametrize("message", ["is it bad?", "what is diabetes", "my stomach feels weird"])
+def test_short_unmatched_health_questions_get_at_least_standard(policy, message):
+    plan = policy.plan(message, "English")
+    assert plan.profile.intent == "general"
+    assert plan.tier == "standard"
+
+
+def test_emergency_gets_the_large_tier(policy):
+    assert policy.plan("chest pain", "English").tier == "large"
@@ -0,0 +1,125 @@
+# tests/test_router.py
+"""
+Routing decisions of router.route_message against the bundled KB.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+
+import router
+from router import ROUTE_LLM, ROUTE_LOCAL, ROUTE_LOCAL_REFINE, route_message
+
+# (message, expected route reason)
+PROBES = [
+    ("hi", "faq:greeting"),
+    ("Hello there!", "faq:greeting"),
+    ("thank you so much", "faq:thanks"),
+    ("ok bye", "faq:bye"),
+    ("hi, is ibuprofen safe for kids?", "no-match"),
+    ("thanks, what about for a child?", "no-match"),
+    ("hello what is diabetes", "no-match"),
+    ("hi, I have chest pain", "emergency"),
+]
+
+
+@pytest.mark.parametrize("message, reason", PROBES)
+def test_probe_reason(message, reason):
+    assert route_message(message).reason == reason
+
+
+# ---------- EMERGENCY ----------
+@pytest.mark.parametrize("message, language", [
+    ("hi, I have chest pain", "English"),
+    ("thank you, he is not breathing", "English"),
+    ("chest pain and fever", "English"),
+    ("seene mein dard", "Hindi"),
+])
+def test_emergency_takes_precedence(message, language):
+    route = route_message(message, language)
+    assert route.reason == "emergency"
+    assert route.intent == "emergency"
+    assert route.tier == ROUTE_LOCAL_REFINE
+    assert route.local_reply == router.local_reply("emergency", language)
+
+
+def test_emergency_keeps_the_offline_match():
+    route = route_message("chest pain and fever")
+    assert "fever" in route.matched
+    assert route.offline_html
+
+
+# ---------- FAQ ----------
+@pytest.mark.parametrize("message, intent", [
+    ("hi", "greeting"),
+    ("Good morning doctor", "greeting"),
+    ("thanks!", "thanks"),
+    ("goodbye", "bye"),
+    ("नमस्ते", "greeting"),
+])
+def test_faq_only_messages_are_answered_locally(message, intent):
+    route = route_message(message)
+    assert route.tier == ROUTE_LOCAL
+    assert route.reason == "faq:" + intent
+    assert not route.needs_llm
+    assert route.matched == []
+
+
+@pytest.mark.parametrize("message", [
+    "hi I have fever",
+    "hello what is diabetes",
+    "thanks, what about for a child?",
+])
+def test_greeting_with_a_question_is_not_faq(message):
+    route = route_message(message)
+    assert not route.reason.startswith("faq:")
+    assert route.intent == ""
+
+
+# ---------- KB CONFIDENCE ----------
+def test_fully_covered_message_is_local():
+    route = route_message("I have fever and headache")
+    assert route.tier == ROUTE_LOCAL
+    assert route.reason == "kb"
+    assert route.confidence == 1.0
+    assert route.matched[:2] == ["fever", "headache"]
+    # No LLM reply follows, so the best match's advice is read out
+    assert route.spoken_reply.startswith(route.local_reply + "\n")
+
+
+def test_misspelled_keywords_count_as_their_corrections():
+    route = route_message("fevr and hedache")
+    assert route.tier == ROUTE_LOCAL
+    assert route.corrections == {"fevr": "fever", "hedache": "headache"}
+
+
+def test_partly_covered_message_is_refined():
+    route = route_message("hi I have fever")
+    assert route.confidence == pytest.approx(0.5)
+    assert route.tier == ROUTE_LOCAL_REFINE
+    assert route.local_reply
+
+
+def test_weak_match_goes_to_the_llm():
+    route = route_message("I have fever since my trip to the mountains last week")
+    assert route.confidence < router.REFINE_THRESHOLD
+    assert route.tier == ROUTE_LLM
+    assert route.local_reply == ""
+    assert route.offline_html
+
+
+def test_no_match_goes_to_the_llm():
+    route = route_message("what is the capital of france")
+    assert (route.tier, route.reason, route.matched) == (ROUTE_LLM, "no-match", [])
+
+
+@pytest.mark.parametrize("local, refine, tier", [
+    (0.8, 0.4, ROUTE_LOCAL_REFINE),
+    (0.5, 0.4, ROUTE_LOCAL),
+    (0.9, 0.6, ROUTE_LLM),
+])
+def test_thresholds(monkeypatch, local, refine, tier):
+    monkeypatch.setattr(router, "LOCAL_THRESHOLD", local)
+    monkeypatch.setattr(router, "REFINE_THRESHOLD", refine)
+    # confidence 0.5: "hi" is the one word no keyword covers
+    assert route_message("hi I have fever").tier == tier
@@ -1,55 +1,273 @@
-import pyttsx3
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+from metrics import stage
+
+# Sentence ends: . ! ? and the Devanagari danda, or a line break
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+|\n+")
+
+# How often a playing clip checks for barge-in, in seconds
+PLAY_POLL = 0.02
+
+# Voice id/name fragments to look for per language, best first
+LANGUAGE_VOICE_HINTS = {
+    "English": ["en-in", "india"],
+    "Hindi": ["hi-in", "hindi"],
+    "Tamil": ["ta-in", "tamil"],
+    "Telugu": ["te-in", "telugu"],
+}
+
+
+def split_sentences(text: str):
+    return [s.strip() for s in _SENTENCE_END.split(text or "") if s.strip()]
+
+
+class SentenceBuffer:
+    """
+    Collects streamed text and hands out complete sentences,
+    so speech can start before the whole reply is known.
+    """
+
+    def __init__(self):
+        self._buf = ""
+
+    def feed(self, chunk: str):
+        self._buf += chunk
+        parts = _SENTENCE_END.split(self._buf)
+        self._buf = parts.pop()
+        return [p.strip() for p in parts if p.strip()]
+
+    def flush(self):
+        rest = self._buf.strip()
+        self._buf = ""
+        return [rest] if rest else []
+
 
 class VoiceEngine:
-    def __init__(self, language_name: str = "English"):
-        self.engine = pyttsx3.init()
+    """
+    Text-to-speech on a dedicated worker thread.
+
+    pyttsx3 is created and driven only from that thread. speak() / feed()
+    just queue sentences and return immediately; cancel() drops everything
+    queued and interrupts the sentence being spoken (barge-in).
+
+    With an audio cache (see audio_cache.py), sentences that have a rendered
+    clip are played from it instead of being synthesized, and clips are
+    rendered while there is nothing to say.
+    """
+
+    def __init__(self, language_name: str = "English", cache=None):
+        self.engine = None
         self.language_name = language_name
-        self._select_voice()
+        self.rate = 170  # speaking speed
+        self.cache = cache         # audio_cache.AudioCache, or None to always synthesize
+
+        self._voices = None        # installed voices, enumerated once
+        self._voice_cache = {}     # language -> voice id (or None for default)
+        self._default_voice = None
+        self._voice_id = None      # voice in use, part of the clip key
+        self._renders = deque()    # (language, sentence) to render when idle; Events from wait_rendered()
+        self._queue = queue.Queue()
+        self._generation = 0       # bumped by cancel(); older items are skipped
+        self._speaking = None      # generation of the sentence being spoken
+        self._rendering = False
+        self._render_stopped = False
+        self._say_waiting = threading.Event()  # set when a sentence is queued
+        self._buffer = SentenceBuffer()
+
+        self._thread = threading.Thread(target=self._run, name="tts", daemon=True)
+        self._thread.start()
+
+    # ---------- WORKER THREAD ----------
+    def _run(self):
+        try:
+            import pyttsx3  # slow (enumerates drivers); keep it off the startup path
+            self.engine = pyttsx3.init()
+            self.engine.connect("started-word", self._on_word)
+            self._default_voice = self.engine.getProperty("voice")
+            self._select_voice()
+        except Exception as e:
+            print("TTS error:", e)
+            self.engine = None
+
+        while True:
+            try:
+                # Render only while nothing is waiting to be said
+                if self._renders:
+                    self._say_waiting.clear()
+                kind, generation, payload = self._queue.get(block=not self._renders)
+            except queue.Empty:
+                item = self._renders.popleft()
+                if isinstance(item, threading.Event):
+                    item.set()
+                else:
+                    self._render(*item)
+                continue
+            if kind == "flush":
+                self._renders.append(payload)
+                continue
+            if self.engine is None:
+                continue
+            if kind == "language":
+                self.language_name = payload
+                self._select_voice()
+                continue
+            if kind == "render":
+                if self.cache is not None:
+                    self._renders.extend(payload)
+                continue
+            if generation != self._generation:
+                continue  # cancelled while waiting in the queue
+            try:
+                self._speaking = generation
+                with stage("tts_sentence"):
+                    self._say(payload, generation)
+            except Exception as e:
+                print("TTS error:", e)
+            finally:
+                self._speaking = None
+
+    def _say(self, sentence, generation):
+        cache = self.cache
+        if cache is not None:
+            key = cache.key(sentence, self._voice_id, self.rate)
+            path = cache.lookup(key)
+            if path is not None:
+                try:
+                    self._play(path, generation)
+                    return
+                except Exception as e:
+                    print("TTS cache error:", e)
+            elif cache.note_miss(key):
+                self._renders.append((self.language_name, sentence))
+        self.engine.say(sentence)
+        self.engine.runAndWait()
+
+    def _play(self, path, generation):
+        playback = self.cache.play(path)
+        while playback.playing():
+            if generation != self._generation:
+                playback.stop()
+                return
+            time.sleep(PLAY_POLL)
+
+    def _render(self, language, sentence):
+        voice_id = self._voice_for(language or self.language_name) or self._default_voice
+        key = self.cache.key(sentence, voice_id, self.rate)
+        if key in self.cache:
+            return
+        temp = self.cache.temp_path(key)
+        try:
+            self._use_voice(voice_id)
+            self._rendering, self._render_stopped = True, False
+            with stage("tts_render"):
+                self.engine.save_to_file(sentence, temp)
+                self.engine.runAndWait()
+            if self._render_stopped:
+                # Half a clip; try again next time the thread is idle
+                self.cache.discard(temp)
+                self._renders.appendleft((language, sentence))
+            else:
+                self.cache.add(key, temp)
+        except Exception as e:
+            print("TTS render error:", e)
+        finally:
+            self._rendering = False
+            self._select_voice()
+
+    def _on_word(self, name, location, length):
+        # Runs inside runAndWait on the TTS thread, the only safe place to stop
+        if self._speaking is not None and self._speaking != self._generation:
+            self.engine.stop()
+        elif self._rendering and self._say_waiting.is_set():
+            # Something to say: a background render must not hold it up
+            self._render_stopped = True
+            self.engine.stop()
 
     def _select_voice(self):
         """
-        Try to select an Indian male English voice.
+        Pick a voice for the current language, preferring an Indian male voice.
         Actual voices depend on Windows installed TTS voices.
+        The result is cached per language, so voices are enumerated only once.
         """
-        voices = self.engine.getProperty("voices")
-        selected = None
-
-        for v in voices:
-            name = (v.name or "").lower()
-            id_ = (v.id or "").lower()
-            if ("india" in name or "en-in" in id_) and ("male" in name or "male" in id_):
-                selected = v
-                break
-
-        if not selected:
-            # Fallback: any Indian English voice
-            for v in voices:
-                name = (v.name or "").lower()
-                id_ = (v.id or "").lower()
-                if "india" in name or "en-in" in id_:
-                    selected = v
-                    break
+        self._use_voice(self._voice_for(self.language_name) or self._default_voice)
+
+    def _voice_for(self, lang):
+        if lang not in self._voice_cache:
+            if self._voices is None:
+                self._voices = self.engine.getProperty("voices")
+            self._voice_cache[lang] = self._find_voice(lang)
+        return self._voice_cache[lang]
+
+    def _use_voice(self, voice_id):
+        if voice_id and voice_id != self._voice_id:
+            self.engine.setProperty("voice", voice_id)
+        self.engine.setProperty("rate", self.rate)
+        self._voice_id = voice_id
+
+    def _find_voice(self, language_name):
+        hints = LANGUAGE_VOICE_HINTS.get(language_name, []) + LANGUAGE_VOICE_HINTS["English"]
+
+        def matches(v, hint):
+            return hint in (v.name or "").lower() or hint in (v.id or "").lower()
+
+        for hint in hints:
+            # Male voice for this hint first, then any voice for it
+            for v in self._voices:
+                if matches(v, hint) and matches(v, "male"):
+                    return v.id
+            for v in self._voices:
+                if matches(v, hint):
+                    return v.id
 
         # Final fallback: default voice
-        if selected:
-            self.engine.setProperty("voice", selected.id)
+        return None
 
-        self.engine.setProperty("rate", 170)  # speaking speed
+    def _put_say(self, sentence):
+        self._queue.put(("say", self._generation, sentence))
+        self._say_waiting.set()
 
+    # ---------- PUBLIC API ----------
     def set_language(self, language_name: str):
+        self._queue.put(("language", None, language_name))
+
+    def cancel(self):
+        """Stops the current sentence and drops everything queued."""
+        self._generation += 1
+        self._buffer = SentenceBuffer()
+
+    def speak(self, text: str):
+        """Interrupts any ongoing speech and speaks `text` sentence by sentence."""
+        self.cancel()
+        for sentence in split_sentences(text):
+            self._put_say(sentence)
+
+    def feed(self, chunk: str):
+        """Queues complete sentences from a streamed reply as they arrive."""
+        for sentence in self._buffer.feed(chunk):
+            self._put_say(sentence)
+
+    def finish(self):
+        """Speaks whatever is left of a streamed reply."""
+        for sentence in self._buffer.flush():
+            self._put_say(sentence)
+
+    def prerender(self, texts, language: str = None):
         """
-        Currently we always use the same TTS voice,
-        but this method allows future expansion.
+        Renders `texts` to the audio cache, sentence by sentence, with
+        `language`'s voice (default: the current one) while nothing is being
+        said. Sentences already cached are skipped.
         """
-        self.language_name = language_name
-        # If later you add specific regional voices, change them here.
-        self._select_voice()
+        if self.cache is None:
+            return
+        sentences = [(language, s) for text in texts for s in split_sentences(text)]
+        self._queue.put(("render", None, sentences))
 
-    def speak(self, text: str):
-        try:
-            self.engine.stop()
-            self.engine.say(text)
-            self.engine.runAndWait()
-        except Exception as e:
-            print("TTS error:", e)
-5
+    def wait_rendered(self, timeout: float = None) -> bool:
+        """Waits until everything prerender()ed so far is rendered. False on timeout."""
+        done = threading.Event()
+        self._queue.put(("flush", None, done))
+        return done.wait(timeout)